@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+from sessions import with_current
+from timing import timed
+
+# Eine Zelle pro (Spieler, Session, Kalendertag, Bank-Buchung ja/nein).
+# Das sind ein paar hundert Zeilen statt der kompletten Historie.
+# Summiert wird in ganzen Cent, nach außen gehen Euro.
+KEYS = ["Name", "Session_Date", "Day", "Bank"]
+# Bis zu so vielen Zeilen (einzelne Buchungen) direkt einrechnen, ohne groupby
+SMALL = 64
+
+
+def is_bank(aktion):
+    return aktion.str.contains("Bank", case=False, na=False)
+
+
+class AggregateIndex:
+    # Voraggregierte Summen für Leaderboard, Performance, Hall of Fame und
+    # Kassensturz. Wird vom LedgerCache mit jeder neuen Version inkrementell
+    # fortgeschrieben: die neuen Zeilen werden in die bestehenden Zellen
+    # eingerechnet (dict pro Schlüssel), nie alle Zellen neu gruppiert.
+    # Als DataFrame (cells) gibt es sie erst beim nächsten Lesen.
+
+    def __init__(self):
+        # (Name, Session_Date, Day, Bank) -> [Netto_ct, Count]; Datumswerte als
+        # int64-Nanosekunden (NaT inklusive), fehlender Name als None
+        self._cells = {}
+        self._frame = None
+        self.balance_ct = 0
+        self.rows = 0
+
+    @property
+    def balance(self):
+        return self.balance_ct / 100
+
+    @property
+    def cells(self):
+        if self._frame is None:
+            self._frame = self._to_frame()
+        return self._frame
+
+    @cells.setter
+    def cells(self, df):
+        self._cells = {}
+        self._frame = None
+        if not df.empty:
+            self._fold(df["Name"], df["Session_Date"], df["Day"], df["Bank"], df["Netto_ct"], df["Count"])
+
+    def _to_frame(self):
+        if not self._cells:
+            return pd.DataFrame(columns=KEYS + ["Netto_ct", "Count"])
+        names, sessions, days, bank = zip(*self._cells)
+        values = np.array(list(self._cells.values()), dtype="int64")
+        return pd.DataFrame({
+            "Name": pd.Series(names, dtype=object),
+            "Session_Date": np.array(sessions, dtype="int64").view("datetime64[ns]"),
+            "Day": np.array(days, dtype="int64").view("datetime64[ns]"),
+            "Bank": np.array(bank, dtype=bool),
+            "Netto_ct": values[:, 0],
+            "Count": values[:, 1],
+        })
+
+    def _fold(self, names, sessions, days, bank, netto, count, sign=1):
+        names = names.astype(object).where(names.notna(), None).to_numpy()
+        sessions = sessions.to_numpy("datetime64[ns]").view("int64").tolist()
+        days = days.to_numpy("datetime64[ns]").view("int64").tolist()
+        cells = self._cells
+        for key, n, c in zip(zip(names, sessions, days, bank.to_numpy(bool).tolist()),
+                             netto.to_numpy("int64").tolist(), count.to_numpy("int64").tolist()):
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [sign * n, sign * c]
+                continue
+            cell[0] += sign * n
+            cell[1] += sign * c
+            if cell[1] == 0:
+                del cells[key]
+        self._frame = None
+
+    @timed("aggregate.update")
+    def update(self, df, sign=1):
+        # sign=-1 nimmt Zeilen wieder heraus (z.B. verworfene Buchungen)
+        if df.empty:
+            return
+        names, sessions = df["Name"].astype(object), df["Session_Date"]
+        days, bank = df["Full_Date"].dt.normalize(), is_bank(df["Aktion"])
+        netto, count = df["Netto_ct"], pd.Series(1, index=df.index)
+        if len(df) > SMALL:
+            # Große Blöcke (Erstladen, Tail) erst in pandas gruppieren
+            part = pd.DataFrame({"Name": names, "Session_Date": sessions, "Day": days, "Bank": bank, "Netto_ct": netto})
+            g = part.groupby(KEYS, dropna=False, as_index=False)["Netto_ct"].agg(Netto_ct="sum", Count="size")
+            names, sessions, days, bank, netto, count = (g[c] for c in KEYS + ["Netto_ct", "Count"])
+        self._fold(names, sessions, days, bank, netto, count, sign)
+        self.balance_ct += sign * int(df["Netto_ct"].sum())
+        self.rows += sign * len(df)
+
+    def _view(self, now=None):
+        c = self.cells
+        if c.empty:
+            return c
+        # Zeilen ohne Datum zählen zur aktuellen Session (wie in Statistik)
+        return c.assign(Session_Date=with_current(c["Session_Date"], now))
+
+    @timed("aggregate.query")
+    def player_profit(self, include_bank=False, session_from=None, session_to=None, day_from=None, day_to=None, players=None):
+        # Gewinn pro Spieler (= -Netto aus Sicht der Bank), absteigend sortiert
+        c = self._view()
+        if c.empty:
+            return pd.Series(dtype=float, name="Netto")
+        m = c["Name"].notna()
+        if not include_bank:
+            m &= ~c["Bank"].astype(bool)
+        if session_from is not None:
+            m &= c["Session_Date"] >= pd.Timestamp(session_from)
+        if session_to is not None:
+            m &= c["Session_Date"] <= pd.Timestamp(session_to)
+        if day_from is not None:
+            m &= c["Day"] >= pd.Timestamp(day_from)
+        if day_to is not None:
+            m &= c["Day"] <= pd.Timestamp(day_to)
+        if players is not None:
+            m &= c["Name"].isin(players)
+        return c[m].groupby("Name")["Netto_ct"].sum().div(-100).rename("Netto").sort_values(ascending=False)
+
+    @timed("aggregate.query")
+    def player_sessions(self, name):
+        # Gewinn pro Session für einen Spieler (alle Buchungen, inkl. Bank)
+        c = self._view()
+        if c.empty:
+            return pd.Series(dtype=float, name="Netto")
+        return c[c["Name"] == name].groupby("Session_Date")["Netto_ct"].sum().div(-100).rename("Netto")
+
+    @timed("aggregate.query")
+    def session_players(self, session_from=None, session_to=None, players=None):
+        # Gewinn (Euro) und Anzahl Buchungen pro (Session, Spieler), inkl. Bank
+        c = self._view()
+        if c.empty:
+            return pd.DataFrame(columns=["Session_Date", "Name", "Gewinn", "Buchungen"])
+        m = c["Name"].notna()
+        if session_from is not None:
+            m &= c["Session_Date"] >= pd.Timestamp(session_from)
+        if session_to is not None:
+            m &= c["Session_Date"] <= pd.Timestamp(session_to)
+        if players is not None:
+            m &= c["Name"].isin(players)
+        g = c[m].groupby(["Session_Date", "Name"], as_index=False)[["Netto_ct", "Count"]].sum()
+        return pd.DataFrame({"Session_Date": g["Session_Date"], "Name": g["Name"],
+                             "Gewinn": g["Netto_ct"] / -100, "Buchungen": g["Count"]})
+
+    def session_balance(self):
+        # Laufender Kassenstand am Ende jeder Session
+        c = self._view()
+        if c.empty:
+            return pd.Series(dtype=float, name="Netto")
+        return c.groupby("Session_Date")["Netto_ct"].sum().sort_index().cumsum().div(100).rename("Netto")
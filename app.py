@@ -1,330 +1,487 @@
 import streamlit as st
 from streamlit_gsheets import GSheetsConnection
 import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
 import pytz
-import requests
-import urllib.parse
-import time
+import os
+from checkpoints import Checkpoints
+from charts import TIMELINE_POINTS, FigureCache, performance_figure, scope_key, timeline_figure
+from epc import payload_qr
+from ledger import GSheetsStore, LedgerCache, MirrorStore, SqliteStore, make_entry, validate_entry
+from journal import Journal
+from notify import Notifier
+from reports import FORMATS, KINDS, Reports
+from sessions import berlin_now, current_session
+from settlement import BANK, MODES, Settlements
+from snapshot import LedgerSnapshot
+from tenants import load_tables
+from timing import TIMINGS, PageRun, profiling_enabled, timed
 
 # --- 1. CORE CONFIG ---
 st.set_page_config(page_title="Blackjack Bank", page_icon="♠️", layout="centered")
 
 # Constants
-VALID_PLAYERS = sorted(["Tobi", "Alex", "Dani", "Fabi", "Schirgi", "Lüxn", "Domi"])
 CHIP_VALUES = [5, 10, 20, 50, 100]
-
-# --- SESSION STATE SETUP ---
-if 'trans_amount' not in st.session_state:
-    st.session_state.trans_amount = 10.0
-if 'selected_player' not in st.session_state:
-    st.session_state.selected_player = VALID_PLAYERS[0]
-
-def set_amount(val):
-    st.session_state.trans_amount = float(val)
-
-# --- 2. LUXURY CSS ENGINE ---
-st.markdown("""
-<style>
-    /* IMPORTS */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=JetBrains+Mono:wght@500;700&display=swap');
-
-    /* GLOBAL THEME */
-    .stApp {
-        background: radial-gradient(circle at top left, #F8FAFC, #E2E8F0);
-        font-family: 'Inter', sans-serif;
-        color: #0F172A;
-    }
-
-    /* GLASS CONTAINER */
-    div[data-testid="stVerticalBlockBorderWrapper"] {
-        background: rgba(255, 255, 255, 0.7);
-        backdrop-filter: blur(12px);
-        -webkit-backdrop-filter: blur(12px);
-        border: 1px solid rgba(255, 255, 255, 0.5);
-        border-radius: 24px;
-        box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.07);
-        padding: 24px !important;
-        margin-bottom: 20px;
-    }
-    div[data-testid="stVerticalBlockBorderWrapper"] > div {
-        padding: 0 !important;
-    }
-
-    /* GLASSMORPHISM CARD */
-    .glass-card {
-        background: rgba(255, 255, 255, 0.7);
-        backdrop-filter: blur(12px);
-        -webkit-backdrop-filter: blur(12px);
-        border: 1px solid rgba(255, 255, 255, 0.5);
-        border-radius: 24px;
-        padding: 24px;
-        box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.07);
-        margin-bottom: 20px;
-        transition: transform 0.2s;
-    }
-
-    /* VAULT DISPLAY */
-    .vault-display {
-        background: linear-gradient(135deg, #0F172A 0%, #1E293B 100%);
-        color: white;
-        padding: 35px 20px;
-        border-radius: 28px;
-        text-align: center;
-        margin-bottom: 25px;
-        box-shadow: 0 20px 40px -10px rgba(15, 23, 42, 0.4);
-    }
-    .vault-label {
-        text-transform: uppercase;
-        letter-spacing: 3px;
-        font-size: 11px;
-        opacity: 0.6;
-        margin-bottom: 8px;
-        font-weight: 700;
-    }
-    .vault-amount {
-        font-family: 'JetBrains Mono', monospace;
-        font-size: 60px;
-        font-weight: 700;
-        letter-spacing: -2px;
-    }
-
-    /* METRIC CARDS */
-    .metric-value {
-        font-family: 'JetBrains Mono', monospace;
-        font-size: 24px;
-        font-weight: 700;
-    }
-    .metric-label {
-        font-size: 12px;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-        opacity: 0.7;
-    }
-
-    /* CHIP BUTTONS */
-    div[data-testid="column"] button {
-        border-radius: 16px;
-        height: 50px;
-        width: 100%;
-        font-family: 'JetBrains Mono', monospace;
-        font-weight: 700;
-        border: 1px solid #E2E8F0;
-        background: white;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.02);
-        transition: all 0.2s;
-    }
-    div[data-testid="column"] button:hover {
-        border-color: #0F172A;
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-    }
-    div[data-testid="column"] button:focus {
-        background: #F1F5F9;
-        color: #0F172A;
-        border-color: #0F172A;
-    }
-
-    /* ACTION BUTTONS */
-    button[kind="primary"] {
-        border-radius: 16px;
-        height: 60px;
-        font-weight: 600;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-    }
-    button[kind="secondary"] {
-        border-radius: 16px;
-        height: 60px;
-        border: 1px solid #E2E8F0;
-        background: rgba(255,255,255,0.8);
-    }
-
-    /* HIDE DECORATIONS */
-    #MainMenu, footer {visibility: hidden;}
-
-/* Ensure menu toggle is always visible */
-header button[data-testid="baseButton-header"],
-[data-testid="stSidebarCollapsed"],
-[data-testid="stSidebar"] > div:first-child button {
-    visibility: visible !important;
-    opacity: 1 !important;
-    display: block !important;
-    z-index: 999999 !important;
-}
-
-/* Header background same as app background */
-.stApp > header {
-    background: radial-gradient(circle at top left, #F8FAFC, #E2E8F0) !important;
-    background-color: transparent !important;
-}
-
-/* HIDE top-right icons (GitHub, Share, etc.) but keep menu toggle */
-header .stButton button[title*="GitHub"],
-header .stButton button[title*="Share"],
-header button[kind="header"]:not([data-testid="baseButton-header"]) {
-    display: none !important;
-    visibility: hidden !important;
-}
-
-    /* TABS */
-    .stTabs [data-baseweb="tab-list"] {
-        background: rgba(255,255,255,0.5);
-        padding: 5px;
-        border-radius: 16px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 12px;
-        border: none;
-        font-weight: 600;
-    }
-    .stTabs [aria-selected="true"] {
-        background: white !important;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.05);
-    }
-/* iPad WEBAPP NAVIGATION FIX */
-@media (pointer: coarse) {
-    /* Always show hamburger menu on touch devices */
-    div[data-testid="stSidebarCollapsed"] {
+LEDGER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ledger")
+
+
+def main(page_run):
+    # Tisch (Tenant) aus der URL (?table=...), siehe tenants.py
+    TABLES = load_tables(st.secrets, LEDGER_DIR)
+    TABLE_ID = st.query_params.get("table", next(iter(TABLES)))
+    if TABLE_ID not in TABLES:
+        st.error(f"Unbekannter Tisch: {TABLE_ID}")
+        st.stop()
+    TABLE = TABLES[TABLE_ID]
+    VALID_PLAYERS = TABLE["players"]
+
+    # --- SESSION STATE SETUP ---
+    if st.session_state.get('table') != TABLE_ID:
+        # Tischwechsel: Auswahl und Batch gehören zum alten Tisch
+        for k in ['selected_player', 'player_select', 'batch', 'batch_report', 'batch_commit']:
+            st.session_state.pop(k, None)
+        st.session_state.table = TABLE_ID
+    if 'trans_amount' not in st.session_state:
+        st.session_state.trans_amount = 10.0
+    if 'selected_player' not in st.session_state:
+        st.session_state.selected_player = VALID_PLAYERS[0]
+    if 'batch' not in st.session_state:
+        st.session_state.batch = []
+    if 'batch_report' not in st.session_state:
+        st.session_state.batch_report = []
+    if 'batch_commit' not in st.session_state:
+        st.session_state.batch_commit = None
+
+    def set_amount(val):
+        st.session_state.trans_amount = float(val)
+
+    def remove_from_batch(i):
+        st.session_state.batch.pop(i)
+        st.session_state.batch_report = []
+        st.session_state.batch_commit = None
+
+    def clear_batch():
+        st.session_state.batch = []
+        st.session_state.batch_report = []
+        st.session_state.batch_commit = None
+
+    def switch_table():
+        st.query_params["table"] = st.session_state.table_select
+
+    def notify_on_commit(commit, notifier, name, typ, amount, tag):
+        # Notify (erst wenn das Sheet bestätigt hat)
+        if "Bank" in typ:
+            commit.add_done_callback(lambda f: f.result() and notifier.send(f"{name}: {amount}€", title=typ, tags=tag))
+
+    def commit_batch(table_id):
+        # Ganzen Batch vorab prüfen, dann in EINEM Schreibzugriff buchen
+        batch = st.session_state.batch
+        errors = [validate_entry(r["Spieler"], r["Typ"], r["Betrag"]) for r in batch]
+        if any(errors):
+            st.session_state.batch_report = [(r, e or "✅ OK") for r, e in zip(batch, errors)]
+            st.session_state.batch_commit = None
+            return
+        now = datetime.now(pytz.timezone('Europe/Berlin'))
+        bid, commit = get_ledger_cache(table_id).book([make_entry(r["Spieler"], r["Typ"], r["Betrag"], now) for r in batch])
+        for r in batch:
+            notify_on_commit(commit, get_notifier(table_id), r["Spieler"], r["Typ"], r["Betrag"], r["Tag"])
+        # Status pro Zeile kommt aus dem Commit-Future (siehe batch_status)
+        st.session_state.batch_report = [(r, None) for r in batch]
+        st.session_state.batch_commit = (bid, commit)
+        st.session_state.batch = []
+
+    def batch_status(table_id):
+        # ⏳ bis der Store bestätigt hat (mit letztem Fehler, es wird weiter versucht),
+        # dann ✅ oder ❌ wenn die Buchung verworfen wurde
+        bid, commit = st.session_state.batch_commit
+        if not commit.done():
+            err = get_ledger_cache(table_id).errors.get(bid)
+            return f"⏳ Wird gespeichert ({err})" if err else "⏳ Wird gespeichert"
+        return "✅ Gebucht" if commit.result() else "❌ Verworfen"
+
+    # --- 2. LUXURY CSS ENGINE ---
+    st.markdown("""
+    <style>
+        /* IMPORTS */
+        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=JetBrains+Mono:wght@500;700&display=swap');
+
+        /* GLOBAL THEME */
+        .stApp {
+            background: radial-gradient(circle at top left, #F8FAFC, #E2E8F0);
+            font-family: 'Inter', sans-serif;
+            color: #0F172A;
+        }
+
+        /* GLASS CONTAINER */
+        div[data-testid="stVerticalBlockBorderWrapper"] {
+            background: rgba(255, 255, 255, 0.7);
+            backdrop-filter: blur(12px);
+            -webkit-backdrop-filter: blur(12px);
+            border: 1px solid rgba(255, 255, 255, 0.5);
+            border-radius: 24px;
+            box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.07);
+            padding: 24px !important;
+            margin-bottom: 20px;
+        }
+        div[data-testid="stVerticalBlockBorderWrapper"] > div {
+            padding: 0 !important;
+        }
+
+        /* GLASSMORPHISM CARD */
+        .glass-card {
+            background: rgba(255, 255, 255, 0.7);
+            backdrop-filter: blur(12px);
+            -webkit-backdrop-filter: blur(12px);
+            border: 1px solid rgba(255, 255, 255, 0.5);
+            border-radius: 24px;
+            padding: 24px;
+            box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.07);
+            margin-bottom: 20px;
+            transition: transform 0.2s;
+        }
+
+        /* VAULT DISPLAY */
+        .vault-display {
+            background: linear-gradient(135deg, #0F172A 0%, #1E293B 100%);
+            color: white;
+            padding: 35px 20px;
+            border-radius: 28px;
+            text-align: center;
+            margin-bottom: 25px;
+            box-shadow: 0 20px 40px -10px rgba(15, 23, 42, 0.4);
+        }
+        .vault-label {
+            text-transform: uppercase;
+            letter-spacing: 3px;
+            font-size: 11px;
+            opacity: 0.6;
+            margin-bottom: 8px;
+            font-weight: 700;
+        }
+        .vault-amount {
+            font-family: 'JetBrains Mono', monospace;
+            font-size: 60px;
+            font-weight: 700;
+            letter-spacing: -2px;
+        }
+
+        /* METRIC CARDS */
+        .metric-value {
+            font-family: 'JetBrains Mono', monospace;
+            font-size: 24px;
+            font-weight: 700;
+        }
+        .metric-label {
+            font-size: 12px;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+            opacity: 0.7;
+        }
+
+        /* CHIP BUTTONS */
+        div[data-testid="column"] button {
+            border-radius: 16px;
+            height: 50px;
+            width: 100%;
+            font-family: 'JetBrains Mono', monospace;
+            font-weight: 700;
+            border: 1px solid #E2E8F0;
+            background: white;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.02);
+            transition: all 0.2s;
+        }
+        div[data-testid="column"] button:hover {
+            border-color: #0F172A;
+            transform: translateY(-2px);
+            box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+        }
+        div[data-testid="column"] button:focus {
+            background: #F1F5F9;
+            color: #0F172A;
+            border-color: #0F172A;
+        }
+
+        /* ACTION BUTTONS */
+        button[kind="primary"] {
+            border-radius: 16px;
+            height: 60px;
+            font-weight: 600;
+            box-shadow: 0 4px 12px rgba(0,0,0,0.1);
+        }
+        button[kind="secondary"] {
+            border-radius: 16px;
+            height: 60px;
+            border: 1px solid #E2E8F0;
+            background: rgba(255,255,255,0.8);
+        }
+
+        /* HIDE DECORATIONS */
+        #MainMenu, footer {visibility: hidden;}
+
+    /* Ensure menu toggle is always visible */
+    header button[data-testid="baseButton-header"],
+    [data-testid="stSidebarCollapsed"],
+    [data-testid="stSidebar"] > div:first-child button {
         visibility: visible !important;
-        width: auto !important;
-    }
-
-    /* Ensure toggle is always accessible */
-    button[kind="header"] {
+        opacity: 1 !important;
+        display: block !important;
         z-index: 999999 !important;
     }
 
-    /* Add padding-top to prevent content overlap */
-    .stApp {
-        padding-top: 60px;
+    /* Header background same as app background */
+    .stApp > header {
+        background: radial-gradient(circle at top left, #F8FAFC, #E2E8F0) !important;
+        background-color: transparent !important;
     }
-}
 
-/* Fix for iOS Safari standalone mode */
-@media display-mode: standalone {
-    .stApp {
-        padding-top: 70px !important;
-    }
-}
-/* iPad WEBAPP NAVIGATION FIX */
-@media (pointer: coarse) {
-    /* Always show hamburger menu on touch devices */
-    div[data-testid="stSidebarCollapsed"] {
-        visibility: visible !important;
-        width: auto !important;
+    /* HIDE top-right icons (GitHub, Share, etc.) but keep menu toggle */
+    header .stButton button[title*="GitHub"],
+    header .stButton button[title*="Share"],
+    header button[kind="header"]:not([data-testid="baseButton-header"]) {
+        display: none !important;
+        visibility: hidden !important;
     }
 
-    /* Ensure toggle is always accessible */
-    button[kind="header"] {
-        z-index: 999999 !important;
+        /* TABS */
+        .stTabs [data-baseweb="tab-list"] {
+            background: rgba(255,255,255,0.5);
+            padding: 5px;
+            border-radius: 16px;
+        }
+        .stTabs [data-baseweb="tab"] {
+            border-radius: 12px;
+            border: none;
+            font-weight: 600;
+        }
+        .stTabs [aria-selected="true"] {
+            background: white !important;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.05);
+        }
+    /* iPad WEBAPP NAVIGATION FIX */
+    @media (pointer: coarse) {
+        /* Always show hamburger menu on touch devices */
+        div[data-testid="stSidebarCollapsed"] {
+            visibility: visible !important;
+            width: auto !important;
+        }
+
+        /* Ensure toggle is always accessible */
+        button[kind="header"] {
+            z-index: 999999 !important;
+        }
+
+        /* Add padding-top to prevent content overlap */
+        .stApp {
+            padding-top: 60px;
+        }
     }
 
-    /* Add padding-top to prevent content overlap */
-    .stApp {
-        padding-top: 60px;
+    /* Fix for iOS Safari standalone mode */
+    @media display-mode: standalone {
+        .stApp {
+            padding-top: 70px !important;
+        }
+    }
+    /* iPad WEBAPP NAVIGATION FIX */
+    @media (pointer: coarse) {
+        /* Always show hamburger menu on touch devices */
+        div[data-testid="stSidebarCollapsed"] {
+            visibility: visible !important;
+            width: auto !important;
+        }
+
+        /* Ensure toggle is always accessible */
+        button[kind="header"] {
+            z-index: 999999 !important;
+        }
+
+        /* Add padding-top to prevent content overlap */
+        .stApp {
+            padding-top: 60px;
+        }
     }
-}
 
-/* Fix for iOS Safari standalone mode */
-@media display-mode: standalone {
-    .stApp {
-        padding-top: 70px !important;
+    /* Fix for iOS Safari standalone mode */
+    @media display-mode: standalone {
+        .stApp {
+            padding-top: 70px !important;
+        }
     }
-}
-</style>
-""", unsafe_allow_html=True)
-
-# --- 3. LOGIC & DATA ---
-
-def get_qr(name, iban, amount, purpose):
-    data = f"BCD\n002\n1\nSCT\n\n{name}\n{iban.replace(' ', '')}\nEUR{amount:.2f}\n\n\n{purpose}"
-    return f"https://api.qrserver.com/v1/create-qr-code/?size=300x300&data={urllib.parse.quote(data)}"
-
-def calc_netto(row):
-    b = row["Betrag"]
-    a = str(row["Aktion"]).lower()
-    return -b if (("ausgabe" in a or "auszahlung" in a) and b > 0) else b
-
-@st.cache_data(ttl=0)
-def load_data():
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df = conn.read(worksheet="Buchungen", ttl=0)
-        rename_map = {"Spieler": "Name", "Typ": "Aktion", "Zeit": "Zeitstempel"}
-        df = df.rename(columns=rename_map)
-
-        expected_cols = ["Datum", "Name", "Aktion", "Betrag", "Zeitstempel"]
-        for col in expected_cols:
-            if col not in df.columns: df[col] = None
-
-        if not df.empty:
-            df["Betrag"] = pd.to_numeric(df["Betrag"].astype(str).str.replace(',', '.', regex=False), errors='coerce').fillna(0)
-            df['Full_Date'] = pd.to_datetime(df['Datum'] + ' ' + df['Zeitstempel'].fillna('00:00'), format='%d.%m.%Y %H:%M', errors='coerce')
-            df['Full_Date'] = df['Full_Date'].fillna(pd.to_datetime(df['Datum'], format='%d.%m.%Y', errors='coerce'))
-            df["Netto"] = df.apply(calc_netto, axis=1)
-            return df.sort_values("Full_Date", ascending=False).reset_index(drop=True), conn
-    except Exception:
-        pass
-    return pd.DataFrame(columns=["Datum", "Zeitstempel", "Name", "Aktion", "Betrag", "Netto", "Full_Date"]), conn
-
-df, conn = load_data()
-balance = df["Netto"].sum() if not df.empty else 0.0
-
-# --- 4. NAVIGATION ---
-# iPad Webapp Fix: Always visible menu toggle
-if st.session_state.get('_sidebar_collapsed', False):
-    if st.button("☰ Menü", key="ipad_nav_toggle"):
-        st.session_state._sidebar_collapsed = False
-        st.rerun()
-
-with st.sidebar:
-    st.markdown("### ♠️ Navigation")
-    page = st.radio("Go to", ["Übersicht", "Transaktion", "Statistik", "Kassensturz"], label_visibility="collapsed")
-    st.markdown("---")
-    if st.button("🔄 Sync", use_container_width=True):
-        st.cache_data.clear()
-        st.rerun()
-
-# --- HEADER (visible on Overview) ---
-if page == "Übersicht":
-    st.markdown(f"""
-    <div class="vault-display">
-        <div class="vault-label">BANK HOLDINGS</div>
-        <div class="vault-amount">{balance:,.2f} €</div>
-    </div>
+    </style>
     """, unsafe_allow_html=True)
 
-# --- PAGE 1: DASHBOARD ---
-if page == "Übersicht":
-    if df.empty:
-        st.info("Das Casino ist eröffnet. Bitte erste Buchung tätigen.")
-    else:
-        st.markdown("##### 📡 Live Feed")
-        for i, row in df.head(5).iterrows():
-            icon = "📥" if "Einzahlung" in str(row["Aktion"]) else "📤" if "Auszahlung" in str(row["Aktion"]) else "🏦"
-            color = "#10B981" if row["Netto"] > 0 else "#EF4444"
-            sign = "+" if row["Netto"] > 0 else ""
-
-            st.markdown(f"""
-            <div class="glass-card" style="padding: 16px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: center;">
-                <div style="display:flex; align-items:center; gap:15px;">
-                    <div style="font-size:24px;">{icon}</div>
-                    <div>
-                        <div style="font-weight:700; font-size:15px;">{row['Name']}</div>
-                        <div style="font-size:12px; color:#64748B;">{row['Zeitstempel']} • {row['Aktion']}</div>
+    # --- 3. LOGIC & DATA ---
+
+    def get_qr(payload):
+        # PNG-Bytes, lokal erzeugt und gecacht (siehe epc.py)
+        return payload_qr(payload)
+
+    # Alle Ressourcen sind pro Tisch gecacht: 50 Handys am selben Tisch teilen
+    # sich Store, Ledger-Cache, Aggregat-Index, Charts und Notifier
+    @st.cache_resource
+    def get_store(table_id):
+        table = TABLES[table_id]
+        conn = st.connection(table["connection"], type=GSheetsConnection)
+        sheets = GSheetsStore(conn, worksheet=table["worksheet"])
+        # Optional: lokales SQLite als primäres Backend, das Sheet wird nur gespiegelt
+        if table["backend"] == "sqlite":
+            return MirrorStore(SqliteStore(table["sqlite_path"]), mirror=sheets).bootstrap()
+        return sheets
+
+    # Ein Snapshot pro Prozess und Tisch, geteilt von allen Sessions. Neue Zeilen
+    # holt der Poller im Hintergrund, Sessions lesen nur (kein eigenes Nachladen).
+    # Wird der Eintrag verworfen (cache_resource.clear(), geänderter Code), hält
+    # close() Flusher und Poller an.
+    @st.cache_resource(on_release=lambda cache: cache.close())
+    def get_ledger_cache(table_id):
+        table = TABLES[table_id]
+        return LedgerCache(get_store(table_id), max_age=None, journal=Journal(table["journal_path"]),
+                           poll_interval=table["poll_interval"], checkpoints=Checkpoints(table["checkpoints_path"]),
+                           snapshot=LedgerSnapshot(table["snapshot_path"]))
+
+    def load_data():
+        return get_ledger_cache(TABLE_ID).get()
+
+    @st.cache_resource
+    def get_notifier(table_id):
+        return Notifier(TABLES[table_id]["ntfy_url"])
+
+    # Fertige Statistik-Charts, geteilt von allen Sessions (siehe charts.py)
+    @st.cache_resource
+    def get_figure_cache(table_id):
+        return FigureCache()
+
+    # Abrechnungen pro Ledger-Version (siehe settlement.py)
+    @st.cache_resource
+    def get_settlements(table_id):
+        return Settlements()
+
+    # Fertige Berichte pro Ledger-Version (siehe reports.py)
+    @st.cache_resource
+    def get_reports(table_id):
+        return Reports(TABLES[table_id]["name"])
+
+    store = get_store(TABLE_ID)
+    ledger_cache = get_ledger_cache(TABLE_ID)
+    df = load_data()
+    index = ledger_cache.index
+
+    # --- 4. NAVIGATION ---
+    # iPad Webapp Fix: Always visible menu toggle
+    if st.session_state.get('_sidebar_collapsed', False):
+        if st.button("☰ Menü", key="ipad_nav_toggle"):
+            st.session_state._sidebar_collapsed = False
+            st.rerun()
+
+    with st.sidebar:
+        st.markdown("### ♠️ Navigation")
+        if len(TABLES) > 1:
+            st.selectbox("Tisch", list(TABLES), index=list(TABLES).index(TABLE_ID), format_func=lambda t: TABLES[t]["name"],
+                         key="table_select", on_change=switch_table)
+        pages = ["Übersicht", "Transaktion", "Statistik", "Kassensturz"]
+        if st.query_params.get("diag"):
+            # Versteckt, nur über ?diag=1 erreichbar
+            pages.append("Diagnose")
+        page = st.radio("Go to", pages, label_visibility="collapsed")
+        page_run.label = f"Seite {page}"
+        st.markdown("---")
+        if st.button("🔄 Sync", use_container_width=True):
+            # Nächstes get() liest den Tail samt letzter bekannter Zeile: wurde im
+            # Sheet von Hand gelöscht oder geändert, lädt der Cache alles neu
+            ledger_cache.invalidate()
+            st.rerun()
+        cs = ledger_cache.stats()
+        st.caption(f"Cache v{cs['version']} • {cs['rows']} Zeilen • {cs['hits']} Hits / {cs['misses']} Misses • +{cs['last_parsed']} geparst")
+        if isinstance(store, MirrorStore):
+            # Sheet-Spiegel hinter SQLite: Rückstand wird vom Poller nachgereicht
+            ms = store.stats()
+            st.caption(f"Sheet-Spiegel • {ms['backlog']} im Rückstand • {ms['mirror_errors']} Fehler")
+            if ms["behind"]:
+                st.warning(f"⚠️ Sheet hinkt hinterher ({ms['last_error']})")
+                if st.button("🔁 Sheet nachziehen", use_container_width=True):
+                    store.sync(force=True)
+                    st.rerun()
+        if cs["rejected"]:
+            # Fehlerhafte Sheet-Zeilen sichtbar machen statt still als 0 € / ohne Datum zu zählen
+            with st.expander(f"⚠️ {cs['rejected']} fehlerhafte Zeilen im Sheet"):
+                st.dataframe(ledger_cache.rejected, hide_index=True, use_container_width=True)
+        if cs["checkpoint_mismatches"]:
+            # Gespeicherte Kassenstände passen nicht mehr: alte Zeilen im Sheet wurden geändert
+            first = min(ledger_cache.checkpoints.mismatches)
+            st.warning(f"⚠️ Sheet nachträglich geändert: Kassenstand weicht ab Session {datetime.strptime(first, '%Y-%m-%d'):%d.%m.%Y} ab")
+
+    # --- OFFENE BUCHUNGEN ---
+    # Buchungen, die das Sheet (noch) nicht angenommen hat. Sie liegen im Journal,
+    # zählen schon zum Kassenstand und werden automatisch erneut gesendet.
+    for bid, err in list(ledger_cache.errors.items()):
+        rows = ledger_cache.pending.get(bid)
+        if not rows:
+            continue
+        with st.container(border=True):
+            st.warning("⏳ Noch nicht im Sheet: " + ", ".join(f"{r['Spieler']} {r['Typ']} {float(r['Betrag']):.2f}€" for r in rows) + f" ({err})")
+            c1, c2 = st.columns(2)
+            if c1.button("🔁 Erneut senden", key=f"retry_{bid}", use_container_width=True):
+                ledger_cache.retry(bid)
+                st.rerun()
+            if c2.button("🗑️ Verwerfen", key=f"discard_{bid}", use_container_width=True):
+                # Steht die Buchung schon im Sheet, wird sie bestätigt statt verworfen
+                if not ledger_cache.discard(bid) and bid not in ledger_cache.pending:
+                    st.toast("✅ Schon im Sheet – Buchung bleibt gebucht", icon="♠️")
+                st.rerun()
+
+    # --- FRAGMENTE ---
+    # Jeder Block rendert sich selbst neu: ein Chip-Klick läuft nur durch den
+    # Betrag-Picker, nicht durch CSS, load_data() und die anderen Seiten.
+    # Kassenstand, Live Feed und Leaderboard laufen zusätzlich im Takt des Pollers
+    # und lesen den geteilten Snapshot: neue Buchungen anderer Handys erscheinen
+    # ohne Rerun der ganzen Seite und ohne zusätzlichen Remote-Read.
+    @st.fragment(run_every=TABLE["poll_interval"])
+    @timed("Fragment Kassenstand")
+    def vault_fragment():
+        st.markdown(f"""
+        <div class="vault-display">
+            <div class="vault-label">BANK HOLDINGS</div>
+            <div class="vault-amount">{ledger_cache.index.balance:,.2f} €</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    @st.fragment(run_every=TABLE["poll_interval"])
+    @timed("Fragment Live Feed")
+    def feed_fragment():
+        df = ledger_cache.get()
+        if df.empty:
+            st.info("Das Casino ist eröffnet. Bitte erste Buchung tätigen.")
+        else:
+            st.markdown("##### 📡 Live Feed")
+            # Ledger ist aufsteigend sortiert, undatierte Zeilen stehen am Ende
+            dated = int(df["Full_Date"].notna().sum())
+            for i, row in df.iloc[:dated].tail(5).iloc[::-1].iterrows():
+                icon = "📥" if "Einzahlung" in str(row["Aktion"]) else "📤" if "Auszahlung" in str(row["Aktion"]) else "🏦"
+                netto = row["Netto_ct"] / 100
+                color = "#10B981" if netto > 0 else "#EF4444"
+                sign = "+" if netto > 0 else ""
+
+                st.markdown(f"""
+                <div class="glass-card" style="padding: 16px; margin-bottom: 12px; display: flex; justify-content: space-between; align-items: center;">
+                    <div style="display:flex; align-items:center; gap:15px;">
+                        <div style="font-size:24px;">{icon}</div>
+                        <div>
+                            <div style="font-weight:700; font-size:15px;">{row['Name']}</div>
+                            <div style="font-size:12px; color:#64748B;">{row['Full_Date']:%H:%M} • {row['Aktion']}{' • ⏳' if pd.notna(row['Pending']) else ''}</div>
+                        </div>
+                    </div>
+                    <div style="font-family:'JetBrains Mono'; font-weight:700; color:{color}; font-size:16px;">
+                        {sign}{abs(netto):.2f} €
                     </div>
                 </div>
-                <div style="font-family:'JetBrains Mono'; font-weight:700; color:{color}; font-size:16px;">
-                    {sign}{abs(row['Netto']):.2f} €
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
 
-        st.markdown("##### 👑 Leaderboard")
-        df_p = df[~df["Aktion"].str.contains("Bank", case=False, na=False)]
-        if not df_p.empty:
-            lb = df_p.groupby("Name")["Netto"].sum().mul(-1).sort_values(ascending=False).head(3)
+    @st.fragment(run_every=TABLE["poll_interval"])
+    @timed("Fragment Leaderboard")
+    def leaderboard_fragment():
+        lb = ledger_cache.index.player_profit().head(3)
+        if not lb.empty:
+            st.markdown("##### 👑 Leaderboard")
             cols = st.columns(3)
             for idx, (name, val) in enumerate(lb.items()):
                 badges = ["🥇", "🥈", "🥉"]
@@ -338,283 +495,356 @@ if page == "Übersicht":
                     </div>
                     """, unsafe_allow_html=True)
 
-# --- PAGE 2: QUICK TRANSACTION ---
-elif page == "Transaktion":
-    st.markdown("### 🎲 Quick Action")
-
-    # 1. PLAYER SECTION
-    with st.container(border=True):
-        st.caption("👤 SPIELER WÄHLEN")
-        p_sel = st.pills("Name", VALID_PLAYERS + ["Sonstiges"], selection_mode="single", default=VALID_PLAYERS[0], key="player_select", label_visibility="collapsed")
-
-        final_name = p_sel
+    def selected_name():
+        # Aus dem Spieler-Picker (Widget-State), auch wenn nur ein anderes Fragment läuft
+        p_sel = st.session_state.get("player_select")
         if p_sel == "Sonstiges":
-            final_name = st.text_input("Name/Zweck", placeholder="Name oder Zweck eingeben", key="custom_name_input")
-
-    # 2. AMOUNT SECTION
-    with st.container(border=True):
-        st.caption("💰 BETRAG")
-
-        # Chips als Quick-Select
-        cols = st.columns(len(CHIP_VALUES))
-        for i, val in enumerate(CHIP_VALUES):
-            cols[i].button(f"{val}", key=f"btn_{val}", on_click=set_amount, args=(val,), use_container_width=True)
-
-        st.write("")
-        # Input Field (Number)
-        amount = st.number_input("Betrag (€)", key="trans_amount", step=5.0, format="%.2f", label_visibility="collapsed")
-
-    # 3. ACTION SECTION
-    with st.container(border=True):
-        st.caption("⚡ AKTION")
-
-        c1, c2 = st.columns(2)
-
-        action_triggered = False
-        typ = None
-        sign = 0
-        ntfy_tag = "moneybag"
-
-        with c1:
-            if st.button("📥 Einzahlen (Kaufen)", type="primary", use_container_width=True):
-                typ, sign = "Einzahlung", 1
-                ntfy_tag = "moneybag"
-                action_triggered = True
-            if st.button("📈 Bank Gewinn", type="secondary", use_container_width=True):
-                typ, sign = "Bank Einnahme", 1
-                ntfy_tag = "moneybag"
-                action_triggered = True
-
-        with c2:
-            if st.button("📤 Auszahlen (Tauschen)", type="primary", use_container_width=True):
-                typ, sign = "Auszahlung", -1
-                ntfy_tag = "chart_with_downwards_trend"
-                action_triggered = True
-            if st.button("💸 Bank Verlust", type="secondary", use_container_width=True):
-                typ, sign = "Bank Ausgabe", -1
-                ntfy_tag = "chart_with_downwards_trend"
-                action_triggered = True
-
-        # PROCESSING LOGIC
-        if action_triggered:
-            if not final_name:
-                st.error("⚠️ Bitte Name wählen!")
-            elif amount <= 0:
-                st.error("⚠️ Betrag > 0 erforderlich!")
+            return st.session_state.get("custom_name_input", "")
+        return p_sel
+
+    @st.fragment
+    @timed("Fragment Spieler")
+    def player_picker():
+        with st.container(border=True):
+            st.caption("👤 SPIELER WÄHLEN")
+            p_sel = st.pills("Name", VALID_PLAYERS + ["Sonstiges"], selection_mode="single", default=VALID_PLAYERS[0], key="player_select", label_visibility="collapsed")
+
+            if p_sel == "Sonstiges":
+                st.text_input("Name/Zweck", placeholder="Name oder Zweck eingeben", key="custom_name_input")
+
+    @st.fragment
+    @timed("Fragment Betrag")
+    def amount_picker():
+        with st.container(border=True):
+            st.caption("💰 BETRAG")
+
+            # Chips als Quick-Select
+            cols = st.columns(len(CHIP_VALUES))
+            for i, val in enumerate(CHIP_VALUES):
+                cols[i].button(f"{val}", key=f"btn_{val}", on_click=set_amount, args=(val,), use_container_width=True)
+
+            st.write("")
+            # Input Field (Number)
+            st.number_input("Betrag (€)", key="trans_amount", step=5.0, format="%.2f", label_visibility="collapsed")
+
+    @st.fragment
+    @timed("Fragment Aktion")
+    def action_panel(batch_mode):
+        final_name = selected_name()
+        amount = st.session_state.trans_amount
+
+        # 3. ACTION SECTION
+        with st.container(border=True):
+            st.caption("⚡ AKTION")
+
+            c1, c2 = st.columns(2)
+
+            action_triggered = False
+            typ = None
+            sign = 0
+            ntfy_tag = "moneybag"
+
+            with c1:
+                if st.button("📥 Einzahlen (Kaufen)", type="primary", use_container_width=True):
+                    typ, sign = "Einzahlung", 1
+                    ntfy_tag = "moneybag"
+                    action_triggered = True
+                if st.button("📈 Bank Gewinn", type="secondary", use_container_width=True):
+                    typ, sign = "Bank Einnahme", 1
+                    ntfy_tag = "moneybag"
+                    action_triggered = True
+
+            with c2:
+                if st.button("📤 Auszahlen (Tauschen)", type="primary", use_container_width=True):
+                    typ, sign = "Auszahlung", -1
+                    ntfy_tag = "chart_with_downwards_trend"
+                    action_triggered = True
+                if st.button("💸 Bank Verlust", type="secondary", use_container_width=True):
+                    typ, sign = "Bank Ausgabe", -1
+                    ntfy_tag = "chart_with_downwards_trend"
+                    action_triggered = True
+
+            # PROCESSING LOGIC
+            error = validate_entry(final_name, typ, amount) if action_triggered else None
+            if action_triggered and batch_mode:
+                # Nur vormerken, geprüft wird der ganze Batch beim Buchen
+                st.session_state.batch.append({"Spieler": final_name, "Typ": typ, "Betrag": float(amount), "Tag": ntfy_tag})
+                st.session_state.batch_report = []
+                st.session_state.batch_commit = None
+            elif action_triggered:
+                if error:
+                    st.error(error)
+                else:
+                    with st.spinner(f"Buche {typ}..."):
+                        tz = pytz.timezone('Europe/Berlin')
+                        now = datetime.now(tz)
+
+                        new_entry = make_entry(final_name, typ, amount, now)
+
+                        try:
+                            # Sofort lokal buchen, Speichern im Sheet läuft im Hintergrund
+                            _, commit = ledger_cache.book([new_entry])
+                            notify_on_commit(commit, get_notifier(TABLE_ID), final_name, typ, amount, ntfy_tag)
+
+                            st.toast(f"✅ {typ}: {amount:.2f}€", icon="♠️")
+                            if "Einnahme" in typ or "Gewinn" in typ: st.balloons()
+
+                        except Exception as e:
+                            st.error(f"Fehler: {e}")
+
+        # 4. BATCH SECTION
+        if batch_mode or st.session_state.batch_report:
+            with st.container(border=True):
+                st.caption(f"📋 BATCH ({len(st.session_state.batch)} vorgemerkt)")
+                for i, r in enumerate(st.session_state.batch):
+                    c1, c2 = st.columns([5, 1])
+                    c1.markdown(f"**{r['Spieler'] or '—'}** • {r['Typ']} • {r['Betrag']:.2f} €")
+                    c2.button("✖", key=f"batch_rm_{i}", on_click=remove_from_batch, args=(i,), use_container_width=True)
+
+                if st.session_state.batch_report:
+                    batch_report_fragment() if batch_pending() else batch_report()
+
+                if st.session_state.batch:
+                    c1, c2 = st.columns(2)
+                    c1.button("✅ Alle buchen", type="primary", on_click=commit_batch, args=(TABLE_ID,), use_container_width=True)
+                    c2.button("🗑️ Leeren", on_click=clear_batch, use_container_width=True)
+
+    def batch_pending():
+        commit = st.session_state.batch_commit
+        return commit is not None and not commit[1].done()
+
+    def batch_report():
+        status = batch_status(TABLE_ID) if st.session_state.batch_commit is not None else None
+        for r, s in st.session_state.batch_report:
+            st.caption(f"{s or status} — {r['Spieler'] or '—'} • {r['Typ']} • {r['Betrag']:.2f} €")
+
+    # Mit Sekundentakt nur, solange der gebuchte Batch offen ist (siehe Aufruf).
+    # Ist er bestätigt oder verworfen, einmal die ganze Seite neu: danach wird
+    # der Bericht ohne Fragment gezeigt und der Takt endet.
+    @st.fragment(run_every=1)
+    def batch_report_fragment():
+        batch_report()
+        if not batch_pending():
+            st.rerun()
+
+    # --- PAGE 1: DASHBOARD ---
+    if page == "Übersicht":
+        vault_fragment()
+        feed_fragment()
+        leaderboard_fragment()
+
+    # --- PAGE 2: QUICK TRANSACTION ---
+    elif page == "Transaktion":
+        st.markdown("### 🎲 Quick Action")
+        batch_mode = st.toggle("📋 Batch-Modus (Buchungen sammeln, gemeinsam speichern)", key="batch_mode")
+
+        # 1. PLAYER SECTION, 2. AMOUNT SECTION, 3./4. AKTION + BATCH (je ein Fragment)
+        player_picker()
+        amount_picker()
+        action_panel(batch_mode)
+
+    elif page == "Statistik":
+        st.markdown("### 📊 Deep Analytics")
+
+        # 1. Filter bestimmen (Session_Date folgt der 6-Uhr-Regel, siehe sessions.py)
+        filter_options = ["Aktuelle Session", "Gesamt", "Dieser Monat", "Benutzerdefiniert"]
+        scope = st.pills("Zeitraum", filter_options, default="Aktuelle Session")
+
+        # Kalendertage in Berliner Zeit, wie current_session()
+        today = berlin_now().date()
+        # Gleicher Filter für Backend-Query (Timeline) und Aggregat-Index (Performance)
+        scope_filter = {}
+
+        if scope == "Aktuelle Session":
+            # Zeige Daten der letzten berechneten Session (Heute oder Gestern)
+            scope_filter = {"session_from": current_session(), "session_to": current_session()}
+        elif scope == "Dieser Monat":
+            month_start = pd.Timestamp(today).replace(day=1)
+            scope_filter = {"day_from": month_start, "day_to": month_start + pd.offsets.MonthEnd(0)}
+        elif scope == "Benutzerdefiniert":
+            c_date = st.container()
+            d_range = c_date.date_input("Wähle Zeitraum:", value=(today - timedelta(days=7), today), format="DD.MM.YYYY")
+            if isinstance(d_range, tuple) and len(d_range) == 2:
+                scope_filter = {"day_from": d_range[0], "day_to": d_range[1]}
+            elif isinstance(d_range, tuple) and len(d_range) == 1:
+                scope_filter = {"day_from": d_range[0], "day_to": d_range[0]}
+
+        # 2. Charts pro (Ledger-Version, Zeitraum) aus dem Figure-Cache. Die Zeilen
+        # des Zeitraums (inkl. globaler Balance) werden nur bei einem Miss geladen.
+        figures = get_figure_cache(TABLE_ID)
+        key = (ledger_cache.version, scope_key(scope_filter))
+        chart_cfg = st.secrets.get("charts", {})
+        points = int(chart_cfg.get("timeline_points", TIMELINE_POINTS))
+        method = chart_cfg.get("downsample", "lttb")
+
+        t1, t2, t3, t4 = st.tabs(["Performance", "Timeline", "Hall of Fame", "Export"])
+
+        with t1:
+            # Profit pro Spieler
+            fig = figures.get(("performance",) + key, lambda: performance_figure(index.player_profit(**scope_filter)))
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
             else:
-                with st.spinner(f"Buche {typ}..."):
-                    tz = pytz.timezone('Europe/Berlin')
-                    now = datetime.now(tz)
-
-                    new_entry = pd.DataFrame([{
-                        "Datum": now.strftime("%d.%m.%Y"),
-                        "Zeit": now.strftime("%H:%M"),
-                        "Spieler": final_name,
-                        "Typ": typ,
-                        "Betrag": amount
-                    }])
-
-                    try:
-                        raw = conn.read(worksheet="Buchungen", ttl=0)
-                        if not raw.empty:
-                            raw = raw.rename(columns={"Spieler": "Name", "Typ": "Aktion", "Zeit": "Zeitstempel"})
-
-                        # Speichern
-                        raw_save = conn.read(worksheet="Buchungen", ttl=0)
-                        updated_save = pd.concat([raw_save, new_entry], ignore_index=True)
-                        conn.update(worksheet="Buchungen", data=updated_save)
-
-                        # Notify
-                        if "Bank" in typ:
-                            try:
-                                msg = f"{final_name}: {amount}€"
-                                requests.post("https://ntfy.sh/bj-boys-dashboard",
-                                    data=msg.encode('utf-8'),
-                                    headers={"Title": f"{typ}".encode('utf-8'), "Tags": ntfy_tag}, timeout=2)
-                            except: pass
-
-                        st.toast(f"✅ {typ}: {amount:.2f}€", icon="♠️")
-                        if "Einnahme" in typ or "Gewinn" in typ: st.balloons()
-
-                        time.sleep(1)
-                        st.cache_data.clear()
-                        st.rerun()
-
-                    except Exception as e:
-                        st.error(f"Fehler: {e}")
-
-elif page == "Statistik":
-    st.markdown("### 📊 Deep Analytics")
-
-    # 1. Globale Balance-Historie berechnen (BEVOR gefiltert wird)
-    df_calc = df.sort_values("Full_Date").copy()
-    df_calc["Balance"] = df_calc["Netto"].cumsum()
-
-    # 2. Session-Logik korrigieren (Mitternachts-Bug Fix)
-    def get_session_date(dt):
-        if pd.isna(dt): return datetime.now().date()
-        # Verschiebe alles vor 6 Uhr morgens auf den Vortag
-        return dt.date() - timedelta(days=1) if dt.hour < 6 else dt.date()
-
-    df_calc["Session_Date"] = df_calc["Full_Date"].apply(get_session_date)
-
-    # FILTER FIX: Leere Daten abfangen
-    if df_calc.empty:
-        df_calc = pd.DataFrame(columns=["Datum", "Zeitstempel", "Name", "Aktion", "Betrag", "Netto", "Full_Date", "Session_Date", "Balance"])
-
-    # FILTER FIX: Leere Daten abfangen
-    if df_calc.empty:
-        df_calc = pd.DataFrame(columns=["Datum", "Zeitstempel", "Name", "Aktion", "Betrag", "Netto", "Full_Date", "Session_Date", "Balance"])
-
-    # 3. Filter anwenden
-    filter_options = ["Aktuelle Session", "Gesamt", "Dieser Monat", "Benutzerdefiniert"]
-    scope = st.pills("Zeitraum", filter_options, default="Aktuelle Session")
-
-    today = datetime.now().date()
-
-    if scope == "Aktuelle Session":
-        # Zeige Daten der letzten berechneten Session (Heute oder Gestern)
-        current_session_date = get_session_date(datetime.now())
-        df_s = df_calc[df_calc["Session_Date"] == current_session_date]
-    elif scope == "Gesamt":
-        df_s = df_calc
-    elif scope == "Dieser Monat":
-        df_s = df_calc[(df_calc["Full_Date"].dt.month == today.month) & (df_calc["Full_Date"].dt.year == today.year)]
-    elif scope == "Benutzerdefiniert":
-        c_date = st.container()
-        d_range = c_date.date_input("Wähle Zeitraum:", value=(today - timedelta(days=7), today), format="DD.MM.YYYY")
-        if isinstance(d_range, tuple) and len(d_range) == 2:
-            df_s = df_calc[(df_calc["Full_Date"].dt.date >= d_range[0]) & (df_calc["Full_Date"].dt.date <= d_range[1])]
-        elif isinstance(d_range, tuple) and len(d_range) == 1:
-            df_s = df_calc[df_calc["Full_Date"].dt.date == d_range[0]]
-    else:
-        df_s = df_calc
-
-    t1, t2, t3 = st.tabs(["Performance", "Timeline", "Hall of Fame"])
-
-    with t1:
-        # Profit pro Spieler
-        df_p = df_s[~df_s["Aktion"].str.contains("Bank", case=False, na=False)]
-        if not df_p.empty:
-            agg = df_p.groupby("Name")["Netto"].sum().mul(-1).reset_index(name="Profit").sort_values("Profit", ascending=False)
-            agg["Color"] = agg["Profit"].apply(lambda x: '#10B981' if x >= 0 else '#EF4444')
-
-            fig = px.bar(agg, x="Profit", y="Name", orientation='h', text="Profit")
-            fig.update_traces(marker_color=agg["Color"], texttemplate='%{text:+.2f} €', textposition='outside', textfont_family="JetBrains Mono")
-            fig.update_layout(template="plotly_white", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=400, yaxis_title=None, xaxis_title=None)
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("Keine Daten im gewählten Zeitraum.")
-
-    with t2:
-        # Timeline (zeigt nun korrekte absolute Balance)
-        if not df_s.empty:
-            df_h = df_s.sort_values("Full_Date")
-            fig_l = px.area(df_h, x="Full_Date", y="Balance")
-
-            # Y-Achse skalieren für bessere Sichtbarkeit
-            min_y = df_h["Balance"].min()
-            max_y = df_h["Balance"].max()
-            padding = (max_y - min_y) * 0.1 if max_y != min_y else 10
-
-            fig_l.update_yaxes(range=[min_y - padding, max_y + padding])
-            fig_l.update_traces(line_color='#0F172A', fill='tozeroy', fillcolor='rgba(15, 23, 42, 0.1)')
-            fig_l.update_layout(template="plotly_white", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=350, yaxis_title=None, xaxis_title=None)
-            st.plotly_chart(fig_l, use_container_width=True)
-        else:
-            st.info("Keine Transaktionen in diesem Zeitraum.")
-
-    with t3:
-        st.markdown("##### 👤 Spieler-Profil")
-        sel_player = st.selectbox("Spieler wählen", VALID_PLAYERS)
-
-        # Berechnung auf ALLES anwenden, nicht nur gefilterte Ansicht
-        if sel_player and not df_calc.empty:
-            df_play = df_calc[df_calc["Name"] == sel_player].copy()
-            if not df_play.empty:
-                df_play["Player_Profit"] = -df_play["Netto"]
-
-                lifetime = df_play["Player_Profit"].sum()
-
-                # Session-basierte Berechnung (mit Fix für 3 Uhr nachts)
-                df_sess = df_play.groupby("Session_Date")["Player_Profit"].sum().reset_index()
-
-                best_s = df_sess["Player_Profit"].max() if not df_sess.empty else 0
-                worst_s = df_sess["Player_Profit"].min() if not df_sess.empty else 0
-
-                badges = ""
-                if lifetime > 50: badges += "🦈 Hai "
-                if lifetime < -50: badges += "💸 Sponsor "
-                if best_s > 100: badges += "🚀 Moon "
-                if worst_s < -100: badges += "💀 Tilt "
-
-                st.caption(f"Status: {badges}")
-
-                c1, c2, c3 = st.columns(3)
-                col_data = [(c1, "Lifetime", lifetime), (c2, "Best Session", best_s), (c3, "Worst Session", worst_s)]
-                for col, label, val in col_data:
-                    c_color = "#10B981" if val >= 0 else "#EF4444"
-                    with col:
-                        st.markdown(f"""
-                        <div class="glass-card" style="padding:15px; text-align:center;">
-                            <div class="metric-label">{label}</div>
-                            <div class="metric-value" style="color:{c_color}">{val:+.2f} €</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                st.info("Keine Daten im gewählten Zeitraum.")
+
+        with t2:
+            # Timeline (absolute Balance, serverseitig auf `points` Punkte ausgedünnt)
+            fig_l = figures.get(("timeline", points, method) + key,
+                                lambda: timeline_figure(ledger_cache.scope(**scope_filter), points, method))
+            if fig_l is not None:
+                st.plotly_chart(fig_l, use_container_width=True)
             else:
-                st.info("Keine Daten für diesen Spieler.")
-
-# --- PAGE 4: SETTLEMENT (CRASH FIX) ---
-elif page == "Kassensturz":
-    st.markdown("### 🏁 Abrechnung")
-
-    secrets_iban = st.secrets.get("bank", {}).get("iban", "")
-    secrets_owner = st.secrets.get("bank", {}).get("owner", "Bank")
-
-    if not secrets_iban:
-        secrets_iban = st.text_input("IBAN eingeben:", placeholder="DE...")
-        secrets_owner = st.text_input("Empfänger:", value="Casino Bank")
-
-    # Sicherstellen, dass wir gültige Datumsangaben haben
-    df["Full_Date"] = pd.to_datetime(df["Full_Date"], errors='coerce')
-
-    today = datetime.now().date()
-
-    # Filter: NotNa prüft, ob das Datum gültig ist, bevor .dt aufgerufen wird
-    mask_date = (df["Full_Date"].notna()) & (df["Full_Date"].dt.date.isin([today, today - timedelta(days=1)]))
-    mask_name = df["Name"].isin(VALID_PLAYERS)
-
-    df_sess = df[mask_date & mask_name].copy()
+                st.info("Keine Transaktionen in diesem Zeitraum.")
+
+        with t3:
+            st.markdown("##### 👤 Spieler-Profil")
+            sel_player = st.selectbox("Spieler wählen", VALID_PLAYERS)
+
+            # Berechnung auf ALLES anwenden, nicht nur gefilterte Ansicht
+            if sel_player:
+                # Session-basierte Berechnung (mit Fix für 3 Uhr nachts) aus dem Index
+                player_sess = index.player_sessions(sel_player)
+                if not player_sess.empty:
+                    lifetime = player_sess.sum()
+                    best_s = player_sess.max()
+                    worst_s = player_sess.min()
+
+                    badges = ""
+                    if lifetime > 50: badges += "🦈 Hai "
+                    if lifetime < -50: badges += "💸 Sponsor "
+                    if best_s > 100: badges += "🚀 Moon "
+                    if worst_s < -100: badges += "💀 Tilt "
+
+                    st.caption(f"Status: {badges}")
+
+                    c1, c2, c3 = st.columns(3)
+                    col_data = [(c1, "Lifetime", lifetime), (c2, "Best Session", best_s), (c3, "Worst Session", worst_s)]
+                    for col, label, val in col_data:
+                        c_color = "#10B981" if val >= 0 else "#EF4444"
+                        with col:
+                            st.markdown(f"""
+                            <div class="glass-card" style="padding:15px; text-align:center;">
+                                <div class="metric-label">{label}</div>
+                                <div class="metric-value" style="color:{c_color}">{val:+.2f} €</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+                else:
+                    st.info("Keine Daten für diesen Spieler.")
+
+        with t4:
+            # Bericht wird erst beim Klick erzeugt (eigener Thread) und pro Ledger-Version gecacht
+            c1, c2 = st.columns([3, 2])
+            with c1:
+                kind = st.radio("Bericht", list(KINDS), format_func=KINDS.get, horizontal=True)
+            with c2:
+                fmt = st.radio("Format", list(FORMATS), format_func=str.upper, horizontal=True)
+            if kind == "session":
+                sess_now = current_session()
+                sess_range = st.date_input("Sessions", value=(sess_now, sess_now), max_value=sess_now, format="DD.MM.YYYY", key="export_sessions")
+                s_from, s_to = (sess_range[0], sess_range[-1]) if sess_range else (sess_now, sess_now)
+                params = {"session_from": s_from, "session_to": s_to}
+                file_name = f"sessions_{s_from:%Y-%m-%d}_{s_to:%Y-%m-%d}"
+            elif kind == "player":
+                name = st.selectbox("Spieler", VALID_PLAYERS, key="export_player")
+                params = {"name": name}
+                file_name = f"spieler_{name}"
+            else:
+                params = {}
+                file_name = "buchungen"
+            reports = get_reports(TABLE_ID)
+            # Werte binden: der Callable läuft erst beim Klick
+            build = lambda kind=kind, fmt=fmt, params=params: reports.get(ledger_cache, kind, fmt, **params)
+            st.download_button("⬇️ Herunterladen", build,
+                               file_name=f"{TABLE_ID}_{file_name}.{fmt}", mime=FORMATS[fmt], on_click="ignore")
+            if fmt == "html":
+                st.caption("Als PDF: HTML im Browser öffnen und drucken.")
+
+    # --- PAGE 4: SETTLEMENT (CRASH FIX) ---
+    elif page == "Kassensturz":
+        st.markdown("### 🏁 Abrechnung")
+
+        secrets_iban = TABLE["bank"].get("iban", "")
+        secrets_owner = TABLE["bank"].get("owner", "Bank")
+
+        if not secrets_iban:
+            secrets_iban = st.text_input("IBAN eingeben:", placeholder="DE...")
+            secrets_owner = st.text_input("Empfänger:", value="Casino Bank")
+
+        # Session-Bereich (gleiche 6-Uhr-Regel wie in Statistik), Standard: letzte und aktuelle Session
+        sess_now = current_session()
+        c1, c2 = st.columns([3, 2])
+        with c1:
+            sess_range = st.date_input("Sessions", value=(sess_now - timedelta(days=1), sess_now), max_value=sess_now, format="DD.MM.YYYY")
+        with c2:
+            mode = st.radio("Modus", list(MODES), format_func=MODES.get, horizontal=True)
+        sess_from, sess_to = (sess_range[0], sess_range[-1]) if sess_range else (sess_now, sess_now)
 
-    if df_sess.empty:
-        st.info("Keine offenen Sessions für Heute oder Gestern.")
-    else:
-        bilanz = df_sess.groupby("Name")["Netto"].sum().mul(-1)
-        debtors = bilanz[bilanz < -0.01]
+        accounts = {BANK: {"iban": secrets_iban, "owner": secrets_owner}}
+        accounts.update({n: {"iban": iban, "owner": n} for n, iban in TABLE["ibans"].items()})
+        transfers = get_settlements(TABLE_ID).get(index, ledger_cache.version, sess_from, sess_to, mode, VALID_PLAYERS, accounts)
 
-        if debtors.empty:
-            st.balloons()
-            st.success("Niemand hat Schulden! 🎉")
+        if transfers.empty:
+            if index.player_profit(include_bank=True, session_from=sess_from, session_to=sess_to, players=VALID_PLAYERS).empty:
+                st.info("Keine Buchungen in diesen Sessions.")
+            else:
+                st.balloons()
+                st.success("Niemand hat Schulden! 🎉")
         else:
-            st.markdown(f"**Empfänger:** {secrets_owner}<br><span style='font-family:monospace'>{secrets_iban}</span>", unsafe_allow_html=True)
+            st.markdown(f"**Bank:** {secrets_owner}<br><span style='font-family:monospace'>{secrets_iban}</span>", unsafe_allow_html=True)
+            st.caption(f"{len(transfers)} Überweisungen • Sessions {sess_from:%d.%m.%Y} – {sess_to:%d.%m.%Y}")
             st.markdown("---")
 
-            for name, amount in debtors.items():
-                abs_amount = abs(amount)
-                qr = get_qr(secrets_owner, secrets_iban, abs_amount, f"BJ {name}")
-
+            for t in transfers.itertuples():
                 st.markdown(f"""
                 <div class="glass-card" style="padding: 0px; overflow: hidden; margin-bottom: 10px;">
                     <div style="background: rgba(239, 68, 68, 0.1); padding: 15px; border-bottom: 1px solid rgba(255,255,255,0.5);">
-                        <span style="font-weight:bold; font-size:18px;">🔴 {name}</span>
-                        <span style="float:right; font-family:'JetBrains Mono'; font-weight:bold;">{abs_amount:.2f} €</span>
+                        <span style="font-weight:bold; font-size:18px;">🔴 {t.Von} → {t.An}</span>
+                        <span style="float:right; font-family:'JetBrains Mono'; font-weight:bold;">{t.Betrag:.2f} €</span>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
 
-                with st.expander(f"📱 QR Code für {name} anzeigen"):
-                    c1, c2 = st.columns([1, 2])
-                    with c1:
-                        st.image(qr, width=200)
-                    with c2:
-                        st.info("Scanne diesen Code mit deiner Banking App.")
+                if t.EPC:
+                    with st.expander(f"📱 QR Code für {t.Von} anzeigen"):
+                        c1, c2 = st.columns([1, 2])
+                        with c1:
+                            st.image(get_qr(t.EPC), width=200)
+                        with c2:
+                            st.info("Scanne diesen Code mit deiner Banking App.")
+                else:
+                    st.caption(f"Keine IBAN für {t.An} hinterlegt: bar oder manuell überweisen.")
+
+    # --- PAGE 5: DIAGNOSE (versteckt) ---
+    elif page == "Diagnose":
+        st.markdown("### 🩺 Diagnose")
+        st.caption(f"Profil-Modus: {'an' if page_run.profiler else 'aus'} • Seiten und Fragmente messen die Server-Zeit pro Interaktion, Stufen die Spans im Hot Path")
+        stats = TIMINGS.percentiles()
+        is_view = stats["Name"].str.startswith(("Seite", "Fragment"))
+        st.markdown("##### Seiten & Fragmente")
+        st.dataframe(stats[is_view], hide_index=True, use_container_width=True)
+        st.markdown("##### Stufen")
+        st.dataframe(stats[~is_view], hide_index=True, use_container_width=True)
+
+        st.markdown("##### Letzte Reruns")
+        for run in reversed(list(TIMINGS.runs)[-10:]):
+            with st.expander(f"{datetime.fromtimestamp(run['at']):%H:%M:%S} • {run['label']} • {run['ms']:.1f} ms"):
+                st.dataframe(pd.DataFrame(run["spans"], columns=["Stufe", "ms"]), hide_index=True, use_container_width=True)
+
+        st.markdown("##### Checkpoints")
+        cp = ledger_cache.checkpoints
+        st.caption(f"{len(cp.balance)} Sessions • {len(cp.mismatches)} Abweichungen beim letzten Abgleich • {cp.path or 'nur im Speicher'}")
+
+        for prof in reversed(TIMINGS.profiles):
+            with st.expander(f"🔬 cProfile {prof['label']} ({os.path.basename(prof['path'])})"):
+                st.code(prof["text"])
+
+        if st.button("Zurücksetzen"):
+            TIMINGS.reset()
+            st.rerun()
+
+
+# Server-Zeit des ganzen Reruns inkl. aller Stufen (Fragment-Reruns messen sich
+# selbst), optional cProfile (BJ_PROFILE=1 oder [diagnostics] profile = true).
+# PageRun schließt beides auch bei st.rerun()/st.stop() und Fehlern ab.
+with PageRun(os.path.join(LEDGER_DIR, "profiles") if profiling_enabled(st.secrets) else None) as page_run:
+    main(page_run)
@@ -0,0 +1,971 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from checkpoints import Checkpoints
+from charts import FigureCache, downsample, timeline_figure
+from epc import _render, epc_qr
+from ledger import (CsvStore, GSheetsStore, LedgerCache, SqliteStore, calc_netto, calc_netto_vec,
+                    make_entry, normalize, parse_sheet, to_cents)
+from notify import Notifier
+from sessions import current_session, session_dates, with_current
+
+# Benchmarks: python bench.py [name ...]
+
+
+def bench_append():
+    # Append-Latenz darf nicht mit der Ledgergröße wachsen
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvStore(os.path.join(tmp, "Buchungen.csv"))
+        now = datetime(2024, 1, 1, 20, 0)
+        size = 0
+        for target in [1_000, 10_000, 100_000]:
+            store.append([make_entry("Tobi", "Einzahlung", 10.0, now)] * (target - size))
+            size = target
+            # Einmal komplett zählen (wie der erste Flush nach dem Start)
+            store.count()
+            t0 = time.perf_counter()
+            for _ in range(200):
+                # Wie LedgerCache: mit erwarteter Zeilenzahl (CAS)
+                store.append([make_entry("Alex", "Auszahlung", 20.0, now)], expected=size)
+                size += 1
+            dt = (time.perf_counter() - t0) / 200
+            print(f"append @ {target:>7} rows: {dt * 1e6:8.1f} µs/row")
+
+
+def bench_cache():
+    # Cache-Hit vs. Nachladen des Tails vs. kompletter Neuaufbau
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvStore(os.path.join(tmp, "Buchungen.csv"))
+        now = datetime(2024, 1, 1, 20, 0)
+        store.append([make_entry("Tobi", "Einzahlung", 10.0, now)] * 100_000)
+        cache = LedgerCache(store)
+        t0 = time.perf_counter()
+        cache.get()
+        print(f"cold load 100k rows: {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            cache.get()
+        print(f"cache hit:           {(time.perf_counter() - t0) * 1e3:8.3f} µs")
+        store.append([make_entry("Alex", "Auszahlung", 20.0, now)] * 5)
+        cache.invalidate()
+        t0 = time.perf_counter()
+        cache.get()
+        print(f"tail refresh (+5):   {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+        print(cache.stats())
+
+
+AKTIONEN = ["Einzahlung", "Auszahlung", "Bank Einnahme", "Bank Ausgabe", "BANK AUSGABE", "", None, np.nan, 3]
+
+
+def random_ledger(n, rng):
+    return pd.DataFrame({
+        "Aktion": [rng.choice(AKTIONEN) for _ in range(n)],
+        "Betrag": [rng.choice([0.0, -0.0, 5.0, 12.5, -20.0, 100.0]) for _ in range(n)],
+    })
+
+
+def bench_netto():
+    # Zeilenweise vs. vektorisiert; dass beide dasselbe liefern, prüft test_ledger.py
+    rng = random.Random(42)
+    for n in [10_000, 100_000, 1_000_000]:
+        df = random_ledger(n, rng)
+        t0 = time.perf_counter()
+        df.apply(calc_netto, axis=1)
+        t_apply = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        calc_netto_vec(df)
+        t_vec = time.perf_counter() - t0
+        print(f"netto @ {n:>9} rows: apply {t_apply * 1e3:9.1f} ms | vec {t_vec * 1e3:7.2f} ms | x{t_apply / t_vec:6.0f}")
+
+
+def get_session_date(dt):
+    # Alte Zeilen-Variante aus der Statistik-Seite (Referenz)
+    if pd.isna(dt): return datetime.now().date()
+    return dt.date() - timedelta(days=1) if dt.hour < 6 else dt.date()
+
+
+def bench_sessions():
+    rng = np.random.default_rng(7)
+    for n in [10_000, 100_000, 1_000_000]:
+        minutes = rng.integers(0, 5 * 365 * 24 * 60, n)
+        full_date = pd.Series(pd.Timestamp("2020-01-01") + pd.to_timedelta(minutes, unit="min"))
+        full_date[rng.random(n) < 0.01] = pd.NaT
+        t0 = time.perf_counter()
+        ref = full_date.apply(get_session_date)
+        t_apply = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = session_dates(full_date)
+        t_vec = time.perf_counter() - t0
+        valid = full_date.notna()
+        assert (pd.to_datetime(ref[valid]) == got[valid]).all() and got[~valid].isna().all()
+        print(f"sessions @ {n:>9} rows: apply {t_apply * 1e3:9.1f} ms | vec {t_vec * 1e3:7.2f} ms | x{t_apply / t_vec:6.0f}")
+
+
+class SlowNtfy(BaseHTTPRequestHandler):
+    # Lokaler ntfy-Ersatz: 300 ms Antwortzeit, jeder dritte Request 503
+    posts = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        time.sleep(0.3)
+        SlowNtfy.posts.append(body)
+        self.send_response(503 if len(SlowNtfy.posts) % 3 == 0 else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_notify():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowNtfy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    notifier = Notifier(f"http://127.0.0.1:{server.server_port}/test", backoff=0.05)
+    t0 = time.perf_counter()
+    for i in range(20):
+        notifier.send(f"Tobi: {i}€", title="Bank Einnahme", tags="moneybag")
+    print(f"20x send(): {(time.perf_counter() - t0) * 1e3:.2f} ms (blocking post: ~{20 * 300} ms)")
+    notifier.flush()
+    print(f"{len(SlowNtfy.posts)} HTTP posts, {notifier.stats()}")
+    server.shutdown()
+
+
+class SlowStore(CsvStore):
+    # CsvStore mit künstlicher Remote-Latenz pro Request (wie Google Sheets)
+    def __init__(self, path, latency=0.3):
+        super().__init__(path)
+        self.latency = latency
+        self.calls = 0
+
+    def _remote(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def read(self):
+        self._remote()
+        return super().read()
+
+    def read_from(self, start):
+        self._remote()
+        return super().read_from(start)
+
+    def append(self, rows, expected=None):
+        self._remote()
+        super().append(rows, expected)
+
+
+def bench_commit():
+    # Ende-zu-Ende-Latenz einer Buchung bis der neue Kassenstand sichtbar ist
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Buchungen.csv")
+        store = SlowStore(path)
+        now = datetime(2024, 1, 1, 20, 0)
+        CsvStore(path).append([make_entry("Tobi", "Einzahlung", 10.0, now)] * 20_000)
+        cache = LedgerCache(store)
+        cache.get()
+        entry = make_entry("Alex", "Einzahlung", 50.0, now)
+
+        # Vorher: 2x read, concat, kompletter Upload, sleep(1), kompletter Reload
+        t0 = time.perf_counter()
+        store.read()
+        raw = store.read()
+        store._remote()
+        pd.concat([raw, pd.DataFrame([entry])], ignore_index=True).to_csv(path, index=False)
+        time.sleep(1)
+        cache.reset()
+        cache.get()
+        print(f"booking before: {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+        # Nachher: optimistisch lokal, Bestätigung asynchron
+        t0 = time.perf_counter()
+        _, commit = cache.book([entry])
+        balance = cache.index.balance
+        t_visible = time.perf_counter() - t0
+        commit.result()
+        t_confirmed = time.perf_counter() - t0
+        print(f"booking after:  {t_visible * 1e3:8.1f} ms visible, {t_confirmed * 1e3:.1f} ms confirmed (balance {balance:.2f})")
+
+
+def bench_qr():
+    # Nur Laufzeit; Decodieren zurück zum Payload (PNG und SVG) prüft test_epc.py
+    args = ("Casino Bank", "DE89 3704 0044 0532 0130 00", 42.5, "BJ Lüxn")
+    _render.cache_clear()
+    t0 = time.perf_counter()
+    png = epc_qr(*args)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    epc_qr(*args)
+    t_hit = time.perf_counter() - t0
+    print(f"qr encode: cold {t_cold * 1e3:.2f} ms | cached {t_hit * 1e6:.1f} µs | {len(png)} bytes")
+
+
+def bench_batch():
+    # Buchungen pro Sekunde bis zur Bestätigung: einzeln vs. ein Batch
+    players = ["Alex", "Dani", "Domi", "Fabi", "Lüxn", "Schirgi", "Tobi"]
+    now = datetime(2024, 1, 1, 20, 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SlowStore(os.path.join(tmp, "Buchungen.csv"), latency=0.2)
+        cache = LedgerCache(store)
+        cache.get()
+
+        store.calls = 0
+        t0 = time.perf_counter()
+        for p in players:
+            cache.book([make_entry(p, "Einzahlung", 50.0, now)])[1].result()
+        dt = time.perf_counter() - t0
+        print(f"einzeln: {len(players) / dt:6.1f} Buchungen/s ({store.calls} Remote-Calls)")
+
+        store.calls = 0
+        t0 = time.perf_counter()
+        cache.book([make_entry(p, "Einzahlung", 50.0, now) for p in players])[1].result()
+        dt = time.perf_counter() - t0
+        print(f"batch:   {len(players) / dt:6.1f} Buchungen/s ({store.calls} Remote-Calls)")
+        assert len(cache.get()) == 2 * len(players)
+
+
+def synthetic_raw(n, seed=1, days=5 * 365, nights=False):
+    # n Buchungen im Sheet-Format, verteilt über `days` Tage bis heute.
+    # nights=True: wie echte Spielabende, 20 bis 3 Uhr an etwa jedem dritten Tag
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now().floor("min")
+    if nights:
+        picked = rng.choice(days, max(1, days // 3), replace=False)
+        start = end.normalize() - pd.to_timedelta(picked[rng.integers(0, len(picked), n)], unit="D") + pd.Timedelta(hours=20)
+        ts = pd.Series(np.sort(start + pd.to_timedelta(rng.integers(0, 7 * 60, n), unit="min"))).clip(upper=end)
+    else:
+        ts = pd.Series(np.sort(end - pd.to_timedelta(rng.integers(0, days * 24 * 60, n), unit="min")))
+    players = np.array(["Alex", "Dani", "Domi", "Fabi", "Lüxn", "Schirgi", "Tobi"])
+    typs = np.array(["Einzahlung", "Auszahlung", "Bank Einnahme", "Bank Ausgabe"])
+    return pd.DataFrame({
+        "Datum": ts.dt.strftime("%d.%m.%Y"),
+        "Zeit": ts.dt.strftime("%H:%M"),
+        "Spieler": players[rng.integers(0, len(players), n)],
+        "Typ": typs[rng.choice(len(typs), n, p=[0.45, 0.45, 0.05, 0.05])],
+        "Betrag": rng.choice([5.0, 10.0, 20.0, 50.0, 100.0], n),
+        "ID": None,
+    })
+
+
+def bench_scope():
+    # Statistik-Zeiträume bei 1M Zeilen: Pandas-Filter auf dem ganzen Ledger vs. SQLite-Range-Query
+    n = 1_000_000
+    raw = synthetic_raw(n)
+    df = normalize(raw)
+    today = pd.Timestamp.now().normalize()
+    scopes = {
+        "Aktuelle Session": {"session_from": current_session(), "session_to": current_session()},
+        "Dieser Monat": {"day_from": today.replace(day=1), "day_to": today.replace(day=1) + pd.offsets.MonthEnd(0)},
+        "Benutzerdefiniert (7 Tage)": {"day_from": today - pd.Timedelta(days=7), "day_to": today},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SqliteStore(os.path.join(tmp, "buchungen.db"))
+        t0 = time.perf_counter()
+        store.append(raw.to_dict("records"))
+        print(f"sqlite import {n} rows: {time.perf_counter() - t0:.1f} s")
+        cache = LedgerCache(store)
+        for name, f in scopes.items():
+            t0 = time.perf_counter()
+            # Alter Weg: sortieren, kopieren, cumsum, filtern
+            df_calc = df.sort_values("Full_Date").copy()
+            df_calc["Balance"] = (df_calc["Netto_ct"] / 100).cumsum()
+            df_calc["Session_Date"] = with_current(df_calc["Session_Date"])
+            if "session_from" in f:
+                df_s = df_calc[df_calc["Session_Date"] == f["session_from"]]
+            else:
+                df_s = df_calc[(df_calc["Full_Date"] >= f["day_from"]) & (df_calc["Full_Date"] < f["day_to"] + pd.Timedelta(days=1))]
+            t_pd = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            res = cache.scope(**f)
+            t_sql = time.perf_counter() - t0
+            assert len(res) == len(df_s)
+            print(f"{name:<27} {len(res):>6} rows: pandas {t_pd * 1e3:7.1f} ms | sqlite {t_sql * 1e3:7.1f} ms")
+
+
+def legacy_frame(raw):
+    # Alte Darstellung: Strings als object, Beträge als float, Datum doppelt
+    df = raw.rename(columns={"Spieler": "Name", "Typ": "Aktion", "Zeit": "Zeitstempel"})
+    df["Betrag"] = pd.to_numeric(df["Betrag"].astype(str).str.replace(',', '.', regex=False), errors='coerce').fillna(0)
+    df["Full_Date"] = pd.to_datetime(df["Datum"] + " " + df["Zeitstempel"].fillna("00:00"), format="%d.%m.%Y %H:%M", errors="coerce")
+    df["Full_Date"] = df["Full_Date"].fillna(pd.to_datetime(df["Datum"], format="%d.%m.%Y", errors="coerce"))
+    df["Netto"] = calc_netto_vec(df)
+    df["Session_Date"] = session_dates(df["Full_Date"])
+    return df
+
+
+def bench_memory():
+    # Speicherbedarf pro 100k Zeilen: alte Darstellung (+ Statistik-Kopie) vs. kompakter Ledger
+    for n in [100_000, 1_000_000]:
+        raw = synthetic_raw(n)
+        old = legacy_frame(raw)
+        old_copy = old.sort_values("Full_Date", kind="stable")
+        old_copy = old_copy.assign(Balance=old_copy["Netto"].cumsum())
+        cache = LedgerCache(CsvStore(os.devnull))
+        t0 = time.perf_counter()
+        cache._add(normalize(raw).assign(Pending=None))
+        t_load = time.perf_counter() - t0
+        new = cache.df
+        mb = lambda d: d.memory_usage(deep=True).sum() / 2**20 / (n / 100_000)
+        print(f"memory @ {n:>9} rows: alt {mb(old):6.1f} MB (+ Statistik-Kopie {mb(old_copy):6.1f} MB) | "
+              f"kompakt {mb(new):5.1f} MB pro 100k Zeilen | load {t_load * 1e3:6.0f} ms")
+        ref = old_copy["Balance"].to_numpy()
+        assert np.allclose(ref, cache.scope()["Balance"].to_numpy())
+        t0 = time.perf_counter()
+        cache.scope(session_from=current_session(), session_to=current_session())
+        t_scope = time.perf_counter() - t0
+        print(f"  scope (aktuelle Session) ohne Vollkopie: {t_scope * 1e3:6.1f} ms")
+
+
+def dirty_raw(n, rate=0.001, seed=3, nights=False, blank=None):
+    # Wie aus dem Sheet gelesen (Beträge als Text mit Komma), plus kaputte Zeilen.
+    # blank="": leere Zellen (auch die ID) so, wie die Sheets-API sie liefert
+    raw = synthetic_raw(n, seed=seed, nights=nights)
+    raw["Betrag"] = raw["Betrag"].map(lambda b: f"{b:.2f}".replace(".", ","))
+    if blank is not None:
+        raw["ID"] = blank
+    rng = np.random.default_rng(seed)
+    for col, value in [("Betrag", "abc"), ("Betrag", ""), ("Datum", "32.13.2024"), ("Datum", blank),
+                       ("Zeit", "25:99"), ("Zeit", blank), ("Betrag", "12,5,0")]:
+        raw.loc[rng.random(n) < rate, col] = value
+    raw.loc[rng.random(n) < rate, "Datum"] = "2024-01-05"
+    return raw
+
+
+def bench_parse():
+    # Alter Parser (Konkatenation + zweiter Parse + str.replace) vs. parse_sheet
+    for n in [100_000, 1_000_000]:
+        raw = dirty_raw(n)
+        t0 = time.perf_counter()
+        old = legacy_frame(raw)
+        t_old = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        new, rejected = parse_sheet(raw)
+        t_new = time.perf_counter() - t0
+        # Auf allen angenommenen Zeilen mit kanonischem Datum identisch zum alten Parser
+        canon = raw["Datum"].str.match(r"\d\d\.\d\d\.\d{4}$", na=False).to_numpy()[new.index]
+        ref = old.loc[new.index[canon]]
+        assert ref["Full_Date"].astype("datetime64[ns]").reset_index(drop=True).equals(new["Full_Date"][canon].reset_index(drop=True))
+        assert (to_cents(ref["Betrag"]) == new["Betrag_ct"].to_numpy()[canon]).all()
+        # Alter Parser: dieselben Zeilen still als 0 € bzw. NaT
+        dropped = rejected.loc[rejected["Verworfen"], "Zeile"].to_numpy() - 2
+        assert (old["Betrag"].to_numpy()[dropped] == 0).all()
+        print(f"parse @ {n:>9} rows: alt {t_old * 1e3:7.0f} ms | neu {t_new * 1e3:6.0f} ms | x{t_old / t_new:4.1f} | "
+              f"{len(rejected)} gemeldet, {int(rejected['Verworfen'].sum())} verworfen, "
+              f"{int(old['Full_Date'].isna().sum())} NaT alt / {int(new['Full_Date'].isna().sum())} NaT neu")
+    print(rejected.groupby("Grund").size().to_dict())
+
+
+def bench_charts():
+    # Timeline-Payload (JSON an den Browser) und Bauzeit: alle Punkte vs. ausgedünnt vs. Cache-Hit
+    for n in [100_000, 1_000_000]:
+        cache = LedgerCache(CsvStore(os.devnull))
+        cache._add(normalize(synthetic_raw(n)).assign(Pending=None))
+        df_s = cache.scope()
+        figures = FigureCache()
+        for label, points, method in [("alle Punkte", n, "lttb"), ("lttb 1500", 1500, "lttb"), ("session 1500", 1500, "session")]:
+            t0 = time.perf_counter()
+            fig = figures.get((label, cache.version), lambda: timeline_figure(df_s, points, method))
+            payload = len(fig.to_json())
+            t_build = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            figures.get((label, cache.version), lambda: None)
+            t_hit = time.perf_counter() - t0
+            print(f"timeline @ {n:>9} rows, {label:<13}: {len(fig.data[0].x):>7} Punkte | "
+                  f"{payload / 2**10:9.0f} KiB | bauen+JSON {t_build * 1e3:7.0f} ms | Hit {t_hit * 1e6:5.1f} µs")
+    # Form bleibt erhalten: Extremwerte der Originalkurve liegen nahe an der ausgedünnten
+    sampled = downsample(df_s, 1500)
+    span = df_s["Balance"].max() - df_s["Balance"].min()
+    print(f"max/min Abweichung lttb: {abs(sampled['Balance'].max() - df_s['Balance'].max()) / span:.1%} / "
+          f"{abs(sampled['Balance'].min() - df_s['Balance'].min()) / span:.1%} der Spannweite")
+
+
+def bench_viewers():
+    # 50 Sessions lesen 5 s lang jede 0,1 s den Ledger, nebenbei kommt jede Sekunde eine Buchung
+    # von außen. Gezählt werden Remote-Reads und wie lange es dauert, bis sie jeder sieht.
+    for label, kwargs in [("jede Session lädt (ttl=0)", {"max_age": 0}),
+                          ("Poller alle 1 s", {"max_age": None, "poll_interval": 1})]:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SlowStore(os.path.join(tmp, "Buchungen.csv"), latency=0.3)
+            CsvStore.append(store, [make_entry("Tobi", "Einzahlung", 10.0, datetime(2024, 1, 1, 20, 0))] * 1000)
+            cache = LedgerCache(store, **kwargs)
+            cache.get()
+            store.calls = 0
+            stop = time.monotonic() + 5
+            waits = []
+
+            def viewer():
+                while time.monotonic() < stop:
+                    t0 = time.perf_counter()
+                    cache.get()
+                    waits.append(time.perf_counter() - t0)
+                    time.sleep(0.1)
+
+            threads = [threading.Thread(target=viewer) for _ in range(50)]
+            for t in threads:
+                t.start()
+            lag = []
+            while time.monotonic() < stop - 1.5:
+                rows = cache.rows
+                CsvStore.append(store, [make_entry("Alex", "Auszahlung", 5.0, datetime(2024, 1, 1, 21, 0))])
+                t0 = time.perf_counter()
+                while cache.rows == rows and time.perf_counter() - t0 < 3:
+                    time.sleep(0.01)
+                lag.append(time.perf_counter() - t0)
+                time.sleep(1)
+            for t in threads:
+                t.join()
+            print(f"{label:<27}: {store.calls:4d} Remote-Reads in 5 s | get() p95 {np.percentile(waits, 95) * 1e3:6.1f} ms | "
+                  f"sichtbar nach {np.mean(lag):.2f} s")
+
+
+class FakeWorksheet:
+    # Was GSheetsStore von gspread braucht, mit Latenz pro Request und pro Zeile
+    def __init__(self, raw, latency, per_row):
+        self.header = list(raw.columns)
+        self.values = raw.astype(object).where(raw.notna(), "").astype(str).values.tolist()
+        self.latency = latency
+        self.per_row = per_row
+        self.calls = {"row_values": 0, "get": 0, "append_rows": 0, "read": 0, "update_cell": 0}
+        self.rows_read = 0
+        self._lock = threading.Lock()
+
+    def _remote(self, name, rows=0):
+        with self._lock:
+            self.calls[name] += 1
+            self.rows_read += rows if name != "append_rows" else 0
+        time.sleep(self.latency + rows * self.per_row)
+
+    def row_values(self, row):
+        self._remote("row_values")
+        return list(self.header)
+
+    def update_cell(self, row, col, value):
+        # Nur Kopfzellen (Zeile 1), mehr braucht GSheetsStore nicht
+        self._remote("update_cell")
+        with self._lock:
+            self.header += [""] * (col - len(self.header))
+            self.header[col - 1] = str(value)
+
+    def get(self, rng):
+        # "A{zeile}:F" bzw. "A{zeile}:F{bis}" -> Datenzeilen, leere Zellen am Ende fehlen (wie bei der API)
+        first, last = rng.split(":")
+        start = int(first[1:]) - 2
+        stop = int(last[1:]) - 1 if last[1:] else None
+        with self._lock:
+            rows = [list(r) for r in self.values[start:stop]]
+        self._remote("get", len(rows))
+        for r in rows:
+            while r and r[-1] == "":
+                r.pop()
+        return rows
+
+    def append_rows(self, values, value_input_option="RAW"):
+        self._remote("append_rows", len(values))
+        with self._lock:
+            self.values.extend([str(v) for v in row] for row in values)
+
+
+class FakeSheetsConnection:
+    # Lokale Attrappe für st.connection(..., type=GSheetsConnection)
+    def __init__(self, raw, latency=0.3, per_row=5e-6):
+        self.ws = FakeWorksheet(raw, latency, per_row)
+        self.client = self
+
+    def _select_worksheet(self, worksheet=None):
+        return self.ws
+
+    def read(self, worksheet=None, ttl=None):
+        self.ws._remote("read", len(self.ws.values))
+        width = len(self.ws.header)
+        rows = [r + [""] * (width - len(r)) for r in self.ws.values]
+        return pd.DataFrame(rows, columns=self.ws.header).replace("", None)
+
+    def calls(self):
+        return sum(self.ws.calls.values())
+
+
+def app_test(store=None, conn=None):
+    # app.py im AppTest-Harness. Entweder den ganzen Store ersetzen (`store`) oder
+    # nur die Sheets-Verbindung (`conn`, z.B. FakeSheetsConnection): dann läuft
+    # der echte GSheetsStore gegen die Attrappe.
+    import streamlit as st
+    import ledger
+    from streamlit.testing.v1 import AppTest
+    ledger.GSheetsStore = GSheetsStore if store is None else (lambda conn, worksheet="Buchungen": store)
+    st.connection = lambda *a, **k: conn
+    at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), default_timeout=300)
+    at.secrets["bank"] = {"iban": "DE89370400440532013000", "owner": "Casino"}
+    return at
+
+
+def bench_fragments():
+    # Server-Zeit pro Interaktion auf "Transaktion" bei 100k Zeilen: ganzer Rerun
+    # (so lief früher jeder Chip-Klick) vs. das Fragment, das jetzt allein läuft
+    from timing import TIMINGS
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvStore(os.path.join(tmp, "Buchungen.csv"))
+        CsvStore.append(store, synthetic_raw(100_000).drop(columns="ID").to_dict("records"))
+        at = app_test(store)
+        at.run()
+        at.sidebar.radio[0].set_value("Transaktion").run()
+        for val in [5, 10, 20, 50, 100] * 4:
+            at.button(key=f"btn_{val}").click().run()
+        assert at.number_input(key="trans_amount").value == 100.0
+        for name, (n, median, last) in sorted(TIMINGS.summary().items()):
+            print(f"{name:<22} {n:>3}×  Median {median:8.2f} ms")
+
+
+def bench_checkpoints():
+    # Kassenstand aus Checkpoints + Delta vs. komplette Neuberechnung (sortieren + cumsum),
+    # dazu Kaltstart und Buchung bei 1M Zeilen
+    n = 1_000_000
+    raw = synthetic_raw(n)
+    # ein paar Zeilen ohne Datum und eine nachgetragene alte Buchung am Ende
+    raw.loc[raw.sample(50, random_state=2).index, "Datum"] = ""
+    late = raw.iloc[[n // 2]].assign(Betrag=77.0)
+    raw = pd.concat([raw, late], ignore_index=True)
+    today = pd.Timestamp.now().normalize()
+    sess = current_session()
+    scopes = {
+        "Alles": {},
+        "Aktuelle Session": {"session_from": sess, "session_to": sess},
+        "Letzte 30 Sessions": {"session_from": sess - pd.Timedelta(days=30), "session_to": sess},
+        "Vor einem Jahr": {"session_from": sess - pd.Timedelta(days=372), "session_to": sess - pd.Timedelta(days=365)},
+        "Dieser Monat": {"day_from": today.replace(day=1), "day_to": today.replace(day=1) + pd.offsets.MonthEnd(0)},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvStore(os.path.join(tmp, "Buchungen.csv"))
+        CsvStore.append(store, raw.drop(columns="ID").to_dict("records"))
+        path = os.path.join(tmp, "checkpoints.json")
+
+        t0 = time.perf_counter()
+        cache = LedgerCache(store, checkpoints=Checkpoints(path))
+        cache.get()
+        print(f"Kaltstart {len(cache.df)} rows: {(time.perf_counter() - t0) * 1e3:7.0f} ms "
+              f"({len(cache.checkpoints.balance)} Checkpoints)")
+
+        ref = normalize(raw).sort_values("Full_Date", kind="stable", na_position="last")
+        ref = ref.assign(Balance=ref["Netto_ct"].cumsum() / 100, Session_Date=with_current(ref["Session_Date"]))
+        for name, f in scopes.items():
+            t0 = time.perf_counter()
+            res = cache.scope(**f)
+            dt = time.perf_counter() - t0
+            mask = pd.Series(True, index=ref.index)
+            if "session_from" in f:
+                mask &= ref["Session_Date"].between(f["session_from"], f["session_to"])
+            if "day_from" in f:
+                mask &= (ref["Full_Date"] >= f["day_from"]) & (ref["Full_Date"] < f["day_to"] + pd.Timedelta(days=1))
+            exp = ref[mask]
+            assert len(res) == len(exp), (name, len(res), len(exp))
+            assert np.allclose(res["Balance"].to_numpy(), exp["Balance"].to_numpy()), name
+            print(f"  scope {name:<20} {len(res):>7} rows: {dt * 1e3:6.1f} ms (Balance = Neuberechnung)")
+        assert cache.index.balance_ct == ref["Netto_ct"].sum()
+
+        # Buchung: neue Zeilen werden angehängt statt den ganzen Ledger neu zu sortieren
+        times = []
+        for i in range(20):
+            t0 = time.perf_counter()
+            _, commit = cache.book([make_entry("Tobi", "Einzahlung", 10.0, datetime.now())])
+            commit.result(10)
+            cache.scope(session_from=sess, session_to=sess)
+            times.append(time.perf_counter() - t0)
+        print(f"Buchung + Scope @ {len(cache.df)} rows: Median {np.median(times) * 1e3:6.1f} ms")
+
+        # Neustart: gespeicherte Checkpoints stimmen; danach eine alte Zeile im Sheet ändern
+        cache = LedgerCache(store, checkpoints=Checkpoints(path))
+        cache.get()
+        assert cache.checkpoints.mismatches == []
+        df = pd.read_csv(store.path, dtype=str, keep_default_na=False)
+        df.loc[10, "Betrag"] = "999"
+        df.to_csv(store.path, index=False)
+        cache = LedgerCache(store, checkpoints=Checkpoints(path))
+        cache.get()
+        print(f"geänderte Altzeile erkannt: {len(cache.checkpoints.mismatches)} abweichende Checkpoints")
+        assert cache.checkpoints.mismatches
+
+
+def bench_coldstart():
+    # Time-to-first-render eines frischen Prozesses bei 1M Zeilen: ganzes Sheet
+    # lesen und parsen vs. Start aus dem Arrow-Spiegel + Tail-Abgleich
+    import shutil
+    import streamlit as st
+    from snapshot import LedgerSnapshot
+    n = 1_000_000
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ledger", "bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SlowStore(os.path.join(tmp, "Buchungen.csv"))
+        CsvStore.append(store, synthetic_raw(n).drop(columns="ID").to_dict("records"))
+
+        t0 = time.perf_counter()
+        cache = LedgerCache(store, snapshot=LedgerSnapshot(os.path.join(tmp, "snapshot")))
+        cache.get()
+        t_full = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cache = LedgerCache(store, snapshot=LedgerSnapshot(os.path.join(tmp, "snapshot")))
+        t_load = time.perf_counter() - t0
+        cache.get()
+        t_mirror = time.perf_counter() - t0
+        print(f"LedgerCache @ {n} rows: Sheet {t_full * 1e3:6.0f} ms | Spiegel laden {t_load * 1e3:5.0f} ms, "
+              f"+ Tail-Abgleich {t_mirror * 1e3:5.0f} ms")
+
+        try:
+            for mode in ["ohne Spiegel", "mit Spiegel"] * 3:
+                if mode == "ohne Spiegel":
+                    shutil.rmtree(folder, ignore_errors=True)
+                st.cache_resource.clear()
+                at = app_test(store)
+                # Eigener Tisch, damit der Benchmark den echten .ledger-Ordner nicht anfasst
+                at.secrets["tables"] = {"bench": {"name": "Bench", "poll_interval": 3600}}
+                calls = store.calls
+                t0 = time.perf_counter()
+                at.run()
+                assert not at.exception
+                print(f"erster Render {mode:<13}: {(time.perf_counter() - t0) * 1e3:6.0f} ms "
+                      f"({store.calls - calls} Remote-Reads)")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_settlement():
+    # Abrechnung über viele Sessions und Spieler: Salden gegen Neuberechnung aus dem
+    # Ledger prüfen, Anzahl Überweisungen je Modus, Laufzeit mit und ohne Cache
+    from settlement import BANK, Settlements, balances, settle
+    n = 1_000_000
+    raw = synthetic_raw(n)
+    rng = np.random.default_rng(3)
+    players = [f"Spieler{i:02d}" for i in range(60)]
+    raw["Spieler"] = np.array(players)[rng.integers(0, len(players), n)]
+    cache = LedgerCache(CsvStore(os.devnull))
+    cache._add(normalize(raw).assign(Pending=None))
+    df = cache.df.assign(Session_Date=with_current(cache.df["Session_Date"]))
+    sess = current_session()
+    accounts = {BANK: {"iban": "DE89370400440532013000", "owner": "Casino"}, players[0]: {"iban": "DE02120300000000202051"}}
+    settlements = Settlements()
+    for label, days in [("1 Session", 0), ("30 Sessions", 29), ("1 Jahr", 364), ("alles", 5 * 365)]:
+        s_from = sess - pd.Timedelta(days=days)
+        part = df[df["Session_Date"].between(s_from, sess) & df["Name"].isin(players)]
+        ref = -part.groupby("Name", observed=True)["Netto_ct"].sum()
+        ref = ref[ref != 0]
+        for mode in ["bank", "direkt"]:
+            t0 = time.perf_counter()
+            tr = settlements.get(cache.index, cache.version, s_from, sess, mode, players, accounts)
+            t_miss = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            settlements.get(cache.index, cache.version, s_from, sess, mode, players, accounts)
+            t_hit = time.perf_counter() - t0
+            # Jeder Teilnehmer landet nach allen Überweisungen exakt bei 0
+            flow = tr.groupby("An")["Betrag_ct"].sum().sub(tr.groupby("Von")["Betrag_ct"].sum(), fill_value=0)
+            saldo = balances(ref / 100)
+            assert flow.reindex(saldo.index, fill_value=0).astype("int64").equals(saldo), (label, mode)
+            assert (tr["Betrag_ct"] > 0).all() and tr["EPC"].notna().sum() == (tr["An"].isin(accounts)).sum()
+            print(f"{label:<12} {mode:<7} {len(saldo):>3} Salden -> {len(tr):>3} Überweisungen | "
+                  f"{t_miss * 1e3:6.1f} ms, Cache-Treffer {t_hit * 1e3:5.2f} ms")
+    # Worst Case für den greedy-Teil: 5000 Teilnehmer mit zufälligen Salden
+    big = pd.Series(rng.integers(-10_000, 10_000, 5000) / 100, index=[f"P{i}" for i in range(5000)])
+    t0 = time.perf_counter()
+    tr = settle(big, "direkt")
+    print(f"5000 Salden direkt: {len(tr)} Überweisungen in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+    assert len(tr) < len(balances(big))
+
+
+def rss_mb():
+    # Aktueller Speicher des Prozesses (Linux), sonst Spitzenwert
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_loadtest(n=100_000, viewers=24, reruns=10):
+    # Headless-Lasttest von app.py: echter GSheetsStore gegen FakeSheetsConnection
+    # (300 ms pro Request + 5 µs pro Zeile), ntfy gegen einen lokalen Sink. Pro Seite
+    # Server-Zeit (p50/p95), Speicher und Remote-Calls, dann `viewers` Zuschauer-Sessions
+    # reihum (AppTest ist nicht threadsicher; echte Parallelität misst bench_viewers).
+    import shutil
+    import streamlit as st
+    import tenants
+    n = int(os.environ.get("BJ_LOADTEST_ROWS", n))
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ledger", "loadtest")
+    shutil.rmtree(folder, ignore_errors=True)
+
+    class Sink(BaseHTTPRequestHandler):
+        posts = 0
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            Sink.posts += 1
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Sink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tenants.NTFY_SERVER = f"http://127.0.0.1:{server.server_port}"
+
+    conn = FakeSheetsConnection(dirty_raw(n, nights=True, blank=""))
+    secrets = {"tables": {"loadtest": {"name": "Lasttest", "poll_interval": 2}},
+               "bank": {"iban": "DE89370400440532013000", "owner": "Casino"}}
+
+    def new_session():
+        at = app_test(conn=conn)
+        for k, v in secrets.items():
+            at.secrets[k] = v
+        return at
+
+    def measure(label, at, step):
+        calls, t_all = conn.calls(), []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            step(at)
+            t_all.append(time.perf_counter() - t0)
+            assert not at.exception, (label, at.exception)
+        print(f"{label:<28} p50 {np.percentile(t_all, 50) * 1e3:7.1f} ms | p95 {np.percentile(t_all, 95) * 1e3:7.1f} ms | "
+              f"{rss_mb():6.0f} MB RSS | {conn.calls() - calls:3d} Remote-Calls")
+
+    def page(name):
+        return lambda at: at.sidebar.radio[0].set_value(name).run()
+
+    try:
+        st.cache_resource.clear()
+        rss0 = rss_mb()
+        at = new_session()
+        t0 = time.perf_counter()
+        at.run()
+        assert not at.exception, at.exception
+        print(f"{n} Zeilen, erster Render {(time.perf_counter() - t0) * 1e3:.0f} ms | "
+              f"+{rss_mb() - rss0:.0f} MB RSS | Remote-Calls {conn.ws.calls} ({conn.ws.rows_read} Zeilen)")
+
+        measure("Übersicht", at, page("Übersicht"))
+        at.sidebar.radio[0].set_value("Transaktion").run()
+        measure("Transaktion (Chip-Klick)", at, lambda at: at.button(key="btn_20").click().run())
+        measure("Transaktion (Buchung)", at, lambda at: [b for b in at.button if b.label.startswith("📥")][0].click().run())
+        measure("Transaktion (Bank + ntfy)", at, lambda at: [b for b in at.button if b.label.startswith("📈")][0].click().run())
+        at.sidebar.radio[0].set_value("Statistik").run()
+        for scope in ["Aktuelle Session", "Gesamt", "Dieser Monat"]:
+            measure(f"Statistik ({scope})", at, lambda at: at.pills[0].set_value(scope).run())
+        at.sidebar.radio[0].set_value("Kassensturz").run()
+        for mode in ["bank", "direkt"]:
+            measure(f"Kassensturz ({mode})", at, lambda at: [r for r in at.radio if r.label == "Modus"][0].set_value(mode).run())
+
+        # Zuschauer: eigene Sessions (eigener session_state), gemeinsame Caches wie auf
+        # dem Server; Poller und Flusher laufen dabei im Hintergrund weiter
+        sessions = [new_session() for _ in range(viewers)]
+        calls, waits = conn.calls(), []
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            for v in sessions:
+                t1 = time.perf_counter()
+                v.run()
+                waits.append(time.perf_counter() - t1)
+                assert not v.exception, v.exception
+        print(f"{viewers} Zuschauer × {reruns} Reruns in {time.perf_counter() - t0:.1f} s: p50 {np.percentile(waits, 50) * 1e3:.1f} ms | "
+              f"p95 {np.percentile(waits, 95) * 1e3:.1f} ms | {rss_mb():.0f} MB RSS | {conn.calls() - calls} Remote-Calls")
+        time.sleep(0.5)
+        print(f"Remote gesamt: {conn.ws.calls} ({conn.ws.rows_read} Zeilen gelesen) | {Sink.posts} ntfy-Posts")
+    finally:
+        server.shutdown()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_writers():
+    # Viele parallele Schreiber auf einem Backend: 4 Prozesse (eigene LedgerCache +
+    # eigenes Store-Objekt) × 8 Threads × 25 Buchungen. Keine Buchung darf fehlen
+    # oder doppelt sein, alle Caches müssen denselben Kassenstand sehen.
+    procs, threads_per, per_thread = 4, 8, 25
+    total = procs * threads_per * per_thread
+    now = datetime(2024, 1, 1, 20, 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Vorher: read -> concat -> kompletter Upload, wie früher pro Handy
+        path = os.path.join(tmp, "legacy.csv")
+        CsvStore(path).append([make_entry("Tobi", "Einzahlung", 10.0, now)])
+
+        broken = []
+
+        def legacy_writer(t):
+            for i in range(per_thread):
+                try:
+                    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+                except pd.errors.EmptyDataError:
+                    # Mitten in den Upload eines anderen gelesen: Fehler am Handy
+                    broken.append(t)
+                    continue
+                row = make_entry("Alex", "Einzahlung", 1.0, now)
+                row["ID"] = f"legacy-{t}-{i}"
+                time.sleep(0.002)
+                pd.concat([raw, pd.DataFrame([row])], ignore_index=True).to_csv(path, index=False)
+
+        workers = [threading.Thread(target=legacy_writer, args=(t,)) for t in range(procs * threads_per)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        got = len(CsvStore(path).read()) - 1
+        print(f"read+concat+upload  : {got:4d}/{total} Buchungen im Store, {total - got} verloren "
+              f"({len(broken)} davon mit Lesefehler)")
+
+        conn = FakeSheetsConnection(dirty_raw(1000, rate=0, nights=True, blank=""), latency=0.005, per_row=0)
+        backends = {
+            "CsvStore (flock)": lambda: CsvStore(os.path.join(tmp, "Buchungen.csv")),
+            "SqliteStore": lambda: SqliteStore(os.path.join(tmp, "buchungen.db")),
+            "GSheetsStore (Fake)": lambda: GSheetsStore(conn),
+        }
+        runs = [(label, make, procs, threads_per) for label, make in backends.items()]
+        # Referenz: derselbe Umfang von einem einzigen Schreiber nacheinander
+        runs.insert(0, ("SqliteStore seriell", lambda: SqliteStore(os.path.join(tmp, "seriell.db")), 1, 1))
+        for label, make_store, procs, threads_per in runs:
+            per_thread = total // (procs * threads_per)
+            caches = [LedgerCache(make_store(), max_age=0) for _ in range(procs)]
+            for c in caches:
+                c.get()
+            base = caches[0].index.balance_ct
+            futures = []
+            lock = threading.Lock()
+
+            def writer(cache, p, t):
+                for i in range(per_thread):
+                    # Cent-Beträge eindeutig pro Buchung, damit die Summe jede einzelne prüft
+                    amount = (p * 10_000 + t * 100 + i + 1) / 100
+                    _, f = cache.book([make_entry("Dani", "Einzahlung", amount, now)])
+                    with lock:
+                        futures.append(f)
+
+            t0 = time.perf_counter()
+            workers = [threading.Thread(target=writer, args=(c, p, t)) for p, c in enumerate(caches) for t in range(threads_per)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            ok = sum(f.result(120) for f in futures)
+            dt = time.perf_counter() - t0
+
+            ids = make_store().read()["ID"]
+            ids = ids[ids.notna() & (ids != "")]
+            expected_ct = sum(p * 10_000 + t * 100 + i + 1 for p in range(procs) for t in range(threads_per) for i in range(per_thread))
+            for c in caches:
+                c.invalidate()
+                c.get()
+                assert c.index.balance_ct == base + expected_ct, (label, c.index.balance_ct - base, expected_ct)
+            assert ok == total and len(ids) == total and ids.is_unique, (label, ok, len(ids))
+            stats = [c.stats() for c in caches]
+            print(f"{label:<20}: {len(ids):4d}/{total} Buchungen, 0 verloren, 0 doppelt | {total / dt:6.0f} Buchungen/s | "
+                  f"{sum(s['appends'] for s in stats)} Appends, {sum(s['conflicts'] for s in stats)} Konflikte")
+
+
+def bench_reports(n=1_000_000):
+    # Export: naiv (Vollkopie mit Kassenstand, formatiert, ein to_csv) vs. blockweise,
+    # Spitzenspeicher über tracemalloc, Inhalt gegen den Ledger geprüft, Cache-Treffer
+    import io
+    import tracemalloc
+    from reports import Reports, booking_rows
+    raw = synthetic_raw(n)
+    cache = LedgerCache(CsvStore(os.devnull))
+    cache._add(normalize(raw).assign(Pending=None))
+
+    def naive(c):
+        full = c.scope()
+        return booking_rows(full, full["Balance"].to_numpy() * 100).to_csv(index=False, sep=";", decimal=",", float_format="%.2f").encode()
+
+    # Spitzenspeicher auf 200k Zeilen (tracemalloc bremst stark), Laufzeit auf allen
+    small = LedgerCache(CsvStore(os.devnull))
+    small._add(cache.df.iloc[-200_000:])
+    reports = Reports("Bench")
+    for label, build in [("naiv", naive), ("blockweise", lambda c: reports.build(c, "ledger", "csv"))]:
+        tracemalloc.start()
+        size = len(build(small))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        t0 = time.perf_counter()
+        data = build(cache)
+        t = time.perf_counter() - t0
+        print(f"ledger.csv {label:<10}: {n} Zeilen in {t * 1e3:6.0f} ms ({len(data) / 2**20:5.1f} MB) | "
+              f"200k Zeilen: Spitze {peak / 2**20:5.1f} MB für {size / 2**20:4.1f} MB Datei")
+    body = data.decode("utf-8-sig").split("\nBuchungen\n", 1)[1]
+    out = pd.read_csv(io.StringIO(body), sep=";", decimal=",")
+    assert len(out) == n and round(out["Netto"].sum(), 2) == cache.index.balance
+    assert out["Kassenstand"].iloc[-1] == cache.index.balance
+
+    sess = current_session()
+    for kind, params in [("session", {"session_from": sess - pd.Timedelta(days=30), "session_to": sess}),
+                         ("player", {"name": "Tobi"}), ("ledger", {})]:
+        for fmt in ["csv", "html"]:
+            t0 = time.perf_counter()
+            data = reports.get(cache, kind, fmt, **params)
+            t_miss = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            assert reports.get(cache, kind, fmt, **params) is data
+            t_hit = time.perf_counter() - t0
+            print(f"{kind:<8} {fmt:<4}: {len(data) / 2**20:6.1f} MB in {t_miss * 1e3:6.0f} ms, Treffer {t_hit * 1e6:5.1f} µs")
+    # Spielerbericht: Summe der Sessions = Gewinn laut Index
+    data = reports.get(cache, "player", "csv", name="Tobi").decode("utf-8-sig")
+    sessions = pd.read_csv(io.StringIO(data.split("\nSessions\n", 1)[1].split("\n\n", 1)[0]), sep=";", decimal=",")
+    assert round(sessions["Gewinn"].sum(), 2) == round(-cache.df.loc[cache.df["Name"] == "Tobi", "Netto_ct"].sum() / 100, 2)
+    # Neue Buchung = neue Version = neuer Bericht
+    cache._add(normalize(pd.DataFrame([make_entry("Tobi", "Einzahlung", 10.0, datetime.now())])).assign(Pending=None))
+    reports.get(cache, "ledger", "csv")
+    print(reports.stats())
+
+
+def bench_stages():
+    # Wohin geht die Zeit? Stufen-Spans für Kaltstart, Tail, Buchung und Charts bei 1M Zeilen,
+    # dazu der Overhead eines leeren Spans
+    from timing import TIMINGS, span
+    TIMINGS.reset()
+    t0 = time.perf_counter()
+    for _ in range(100_000):
+        with span("noop"):
+            pass
+    print(f"span overhead: {(time.perf_counter() - t0) / 100_000 * 1e6:.2f} µs")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CsvStore(os.path.join(tmp, "Buchungen.csv"))
+        CsvStore.append(store, synthetic_raw(1_000_000).drop(columns="ID").to_dict("records"))
+        TIMINGS.reset()
+        cache = LedgerCache(store)
+        cache.get()
+        store.append([make_entry("Alex", "Auszahlung", 20.0, datetime.now())] * 5)
+        cache.invalidate()
+        cache.get()
+        _, commit = cache.book([make_entry("Tobi", "Einzahlung", 10.0, datetime.now())])
+        commit.result(10)
+        cache.index.player_profit()
+        timeline_figure(cache.scope())
+        print(TIMINGS.percentiles().to_string(index=False, float_format="%.1f"))
+
+
+BENCHES = {
+    "append": bench_append,
+    "cache": bench_cache,
+    "netto": bench_netto,
+    "sessions": bench_sessions,
+    "notify": bench_notify,
+    "commit": bench_commit,
+    "qr": bench_qr,
+    "batch": bench_batch,
+    "scope": bench_scope,
+    "memory": bench_memory,
+    "parse": bench_parse,
+    "charts": bench_charts,
+    "viewers": bench_viewers,
+    "fragments": bench_fragments,
+    "stages": bench_stages,
+    "checkpoints": bench_checkpoints,
+    "coldstart": bench_coldstart,
+    "settlement": bench_settlement,
+    "loadtest": bench_loadtest,
+    "writers": bench_writers,
+    "reports": bench_reports,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHES:
+        BENCHES[name]()
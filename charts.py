@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from lru import VersionedLRU
+from timing import timed
+
+# Punktbudget der Timeline: mehr Punkte sieht man auf einem Handy eh nicht
+TIMELINE_POINTS = 1500
+LAYOUT = dict(template="plotly_white", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', yaxis_title=None, xaxis_title=None)
+
+
+class FigureCache(VersionedLRU):
+    # Fertige Plotly-Figuren, Schlüssel z.B. (Tab, Ledger-Version, Zeitraum).
+    # Neue Buchung = neue Version = neue Figur; alles andere (Tab-Wechsel,
+    # Spieler-Auswahl in der Hall of Fame) ist ein Treffer.
+    pass
+
+
+def lttb(x, y, n):
+    # Largest-Triangle-Three-Buckets: Indizes von n Punkten, die die Form der
+    # Kurve erhalten (erster und letzter Punkt bleiben immer drin)
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(size - 1, size)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def session_points(df):
+    # Pro Session Anfang, Ende, Tief- und Höchststand des Kassenstands
+    g = df.reset_index(drop=True).groupby("Session_Date", sort=False)["Balance"]
+    keep = np.concatenate([g.idxmin(), g.idxmax(), g.head(1).index, g.tail(1).index])
+    return np.unique(keep)
+
+
+def downsample(df, points=TIMELINE_POINTS, method="lttb"):
+    # df aufsteigend nach Full_Date; liefert höchstens `points` Zeilen
+    if len(df) <= points:
+        return df
+    if method == "session":
+        df = df.iloc[session_points(df)]
+        if len(df) <= points:
+            return df
+    x = df["Full_Date"].to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+    return df.iloc[lttb(x, df["Balance"].to_numpy(dtype=float), points)]
+
+
+@timed("chart.performance")
+def performance_figure(profit):
+    # Balken: Gewinn pro Spieler (aus dem Aggregat-Index)
+    if profit.empty:
+        return None
+    agg = profit.reset_index(name="Profit")
+    agg["Color"] = np.where(agg["Profit"] >= 0, '#10B981', '#EF4444')
+
+    fig = px.bar(agg, x="Profit", y="Name", orientation='h', text="Profit")
+    fig.update_traces(marker_color=agg["Color"], texttemplate='%{text:+.2f} €', textposition='outside', textfont_family="JetBrains Mono")
+    fig.update_layout(height=400, **LAYOUT)
+    return fig
+
+
+@timed("chart.timeline")
+def timeline_figure(df_s, points=TIMELINE_POINTS, method="lttb"):
+    # Fläche: absoluter Kassenstand über die Zeit, serverseitig ausgedünnt
+    df_h = df_s[df_s["Full_Date"].notna()]
+    if df_h.empty:
+        return None
+    df_h = downsample(df_h[["Full_Date", "Session_Date", "Balance"]], points, method)
+    fig = px.area(df_h, x="Full_Date", y="Balance")
+
+    # Y-Achse skalieren für bessere Sichtbarkeit
+    min_y = df_h["Balance"].min()
+    max_y = df_h["Balance"].max()
+    padding = (max_y - min_y) * 0.1 if max_y != min_y else 10
+
+    fig.update_yaxes(range=[min_y - padding, max_y + padding])
+    fig.update_traces(line_color='#0F172A', fill='tozeroy', fillcolor='rgba(15, 23, 42, 0.1)')
+    fig.update_layout(height=350, **LAYOUT)
+    return fig
+
+
+def scope_key(scope_filter):
+    # Hashbarer Schlüssel für einen Statistik-Zeitraum
+    return tuple(sorted((k, pd.Timestamp(v)) for k, v in scope_filter.items()))
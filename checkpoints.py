@@ -0,0 +1,87 @@
+import json
+import os
+
+import pandas as pd
+
+from sessions import current_session
+from timing import timed
+
+
+class Checkpoints:
+    # Kassenstand-Checkpoints am Ende jeder Session: kumulierter Kassenstand
+    # und kumulierte Summen pro Spieler (alles in Cent). Abgeleitet aus den
+    # Zellen des AggregateIndex (ein paar tausend Zeilen statt der ganzen
+    # Historie), einmal pro Ledger-Version.
+    #
+    # Abgeschlossene Sessions werden neben dem Ledger gespeichert. Beim Start
+    # werden sie gegen die frisch berechneten verglichen: Abweichungen heißen,
+    # dass jemand alte Zeilen im Sheet geändert hat (`mismatches`).
+
+    def __init__(self, path=None):
+        self.path = path
+        self.version = None
+        self.balance = pd.Series(dtype="int64")
+        self.players = pd.DataFrame()
+        self.mismatches = []
+        self._saved = self._load()
+
+    def update(self, index, version):
+        if version == self.version:
+            return
+        c = index.cells
+        c = c[c["Session_Date"].notna()] if not c.empty else c
+        if c.empty:
+            self.balance = pd.Series(dtype="int64")
+            self.players = pd.DataFrame()
+        else:
+            self.balance = c.groupby("Session_Date")["Netto_ct"].sum().sort_index().cumsum().astype("int64")
+            # Sessions, in denen keine Zeile einen Spieler hat, fehlen im groupby
+            # über Name: auf die Sessions des Kassenstands auffüllen
+            per = c.groupby(["Session_Date", "Name"])["Netto_ct"].sum().unstack(fill_value=0)
+            self.players = per.reindex(self.balance.index, fill_value=0).cumsum().astype("int64")
+        self.version = version
+
+    def before(self, session):
+        # Kumulierter Kassenstand (Cent) aller Sessions vor `session`
+        b = self.balance
+        i = b.index.searchsorted(pd.Timestamp(session))
+        return int(b.iloc[i - 1]) if i else 0
+
+    def _completed(self):
+        # Nur abgeschlossene Sessions sind stabil genug zum Speichern
+        done = self.balance.index < current_session()
+        return self.balance[done], self.players[done] if not self.players.empty else self.players
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {cp["session"]: cp for cp in json.load(f)["sessions"]}
+        except (ValueError, KeyError):
+            return {}
+
+    @timed("checkpoints.verify")
+    def verify(self):
+        # Gespeicherte Checkpoints gegen die Neuberechnung prüfen, dann
+        # (falls sich etwas geändert hat) neu speichern
+        balance, players = self._completed()
+        fresh = {}
+        for s, b in balance.items():
+            row = players.loc[s]
+            fresh[s.strftime("%Y-%m-%d")] = {"session": s.strftime("%Y-%m-%d"), "balance_ct": int(b),
+                                             "players": {n: int(v) for n, v in row.items() if v}}
+        self.mismatches = [s for s, cp in self._saved.items() if fresh.get(s) != cp]
+        if fresh != self._saved:
+            self._save(fresh)
+        return not self.mismatches
+
+    def _save(self, fresh):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sessions": list(fresh.values())}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._saved = fresh
@@ -0,0 +1,33 @@
+import io
+from functools import lru_cache
+
+import segno
+
+from timing import timed
+
+# EPC069-12 "GiroCode" (BCD/002, UTF-8, SEPA Credit Transfer)
+
+
+def epc_payload(name, iban, amount, purpose):
+    return f"BCD\n002\n1\nSCT\n\n{name}\n{iban.replace(' ', '')}\nEUR{amount:.2f}\n\n\n{purpose}"
+
+
+@lru_cache(maxsize=256)
+def _render(payload, kind, scale):
+    # Lokal rendern: keine IBAN/Beträge an externe QR-Dienste
+    qr = segno.make(payload, error='m', encoding='utf-8', micro=False)
+    buf = io.BytesIO()
+    qr.save(buf, kind=kind, scale=scale, border=4)
+    return buf.getvalue()
+
+
+@timed("epc.qr")
+def epc_qr(name, iban, amount, purpose, kind="png", scale=6):
+    # Cache-Key ist (owner, iban, amount, purpose) über den fertigen Payload
+    return _render(epc_payload(name, iban, round(float(amount), 2), purpose), kind, scale)
+
+
+@timed("epc.qr")
+def payload_qr(payload, kind="png", scale=6):
+    # Für fertige Payloads (z.B. aus settlement.py)
+    return _render(payload, kind, scale)
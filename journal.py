@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    # Lokales Write-Ahead-Journal (JSONL). Jede Buchung landet hier, bevor
+    # sie ins Sheet geschrieben wird, und bleibt "offen" bis ein done- oder
+    # discard-Eintrag folgt. So überlebt sie Abstürze und Sheets-Ausfälle.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _write(self, rec):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def book(self, bid, rows):
+        self._write({"op": "book", "id": bid, "rows": rows})
+
+    def done(self, bid):
+        self._write({"op": "done", "id": bid})
+
+    def discard(self, bid):
+        self._write({"op": "discard", "id": bid})
+
+    def replay(self):
+        # Offene Buchungen in Journal-Reihenfolge: {id: rows}
+        pending = {}
+        if not os.path.exists(self.path):
+            return pending
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Abgeschnittene letzte Zeile nach einem Absturz
+                    continue
+                if rec["op"] == "book":
+                    pending[rec["id"]] = rec["rows"]
+                else:
+                    pending.pop(rec["id"], None)
+        return pending
+
+    def compact(self, pending):
+        # Journal auf die noch offenen Buchungen eindampfen (atomar ersetzen)
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for bid, rows in pending.items():
+                    f.write(json.dumps({"op": "book", "id": bid, "rows": rows}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
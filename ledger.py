@@ -0,0 +1,1159 @@
+import csv
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from aggregates import AggregateIndex
+from checkpoints import Checkpoints
+from snapshot import raw_key
+from sessions import SESSION_CUTOFF, current_session, session_dates, session_of, with_current
+from timing import span, timed
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: CsvStore sperrt dann nur innerhalb des Prozesses
+    fcntl = None
+
+# Spalten so wie sie im Sheet "Buchungen" stehen. "ID" ist die Buchungs-ID
+# (für Dedup beim Nachsenden aus dem Journal), alte Zeilen haben keine.
+SHEET_COLS = ["Datum", "Zeit", "Spieler", "Typ", "Betrag", "ID"]
+RENAME_MAP = {"Spieler": "Name", "Typ": "Aktion", "Zeit": "Zeitstempel"}
+# Kompakter Ledger im Speicher: ein Zeitstempel, kategoriale Texte und
+# Beträge als ganze Cent (int64), damit Summen nicht driften
+LEDGER_DTYPES = {
+    "Full_Date": "datetime64[ns]",
+    "Session_Date": "datetime64[ns]",
+    "Name": "category",
+    "Aktion": "category",
+    "Betrag_ct": "int64",
+    "Netto_ct": "int64",
+}
+LEDGER_COLS = list(LEDGER_DTYPES)
+CATEGORY_COLS = ["Name", "Aktion", "Pending"]
+
+BOOKING_TYPES = ["Einzahlung", "Auszahlung", "Bank Einnahme", "Bank Ausgabe"]
+
+
+def validate_entry(name, typ, amount):
+    # Fehlermeldung für die UI oder None wenn die Buchung gültig ist
+    if not name:
+        return "⚠️ Bitte Name wählen!"
+    if typ not in BOOKING_TYPES:
+        return f"⚠️ Unbekannte Aktion: {typ}"
+    if amount is None or amount <= 0:
+        return "⚠️ Betrag > 0 erforderlich!"
+    return None
+
+
+def make_entry(name, typ, amount, now):
+    return {
+        "Datum": now.strftime("%d.%m.%Y"),
+        "Zeit": now.strftime("%H:%M"),
+        "Spieler": name,
+        "Typ": typ,
+        "Betrag": amount,
+    }
+
+
+def calc_netto(row):
+    b = row["Betrag"]
+    a = str(row["Aktion"]).lower()
+    return -b if (("ausgabe" in a or "auszahlung" in a) and b > 0) else b
+
+
+def aktion_signs(aktion):
+    # Pro Kategorie einmal prüfen statt pro Zeile: True = Abgang (Vorzeichen -).
+    # Code -1 (NaN/None) landet auf dem letzten Eintrag der Lookup-Tabelle.
+    codes, uniques = pd.factorize(aktion)
+    lookup = [("ausgabe" in a or "auszahlung" in a) for a in (str(u).lower() for u in uniques)]
+    return np.array(lookup + [False], dtype=bool)[codes]
+
+
+def calc_netto_vec(df):
+    # Vektorisierte Variante von calc_netto, liefert identische Ergebnisse
+    b = df["Betrag"].to_numpy(dtype=float)
+    return np.where(aktion_signs(df["Aktion"]) & (b > 0), -b, b)
+
+
+def to_cents(euros):
+    return np.rint(np.asarray(euros, dtype=float) * 100).astype(np.int64)
+
+
+def empty_ledger():
+    return pd.DataFrame({c: pd.Series(dtype=t) for c, t in LEDGER_DTYPES.items()})
+
+
+def _as_category(col):
+    # Kategorien immer als object, sonst scheitert union_categoricals an
+    # leeren oder rein numerischen Kategorien (z.B. Aktion = 3)
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    cats = col.cat.categories
+    if cats.dtype == object:
+        return col
+    # set_categories ignoriert einen reinen dtype-Wechsel (z.B. str aus Arrow)
+    return pd.Series(pd.Categorical.from_codes(col.cat.codes, pd.Index(cats, dtype=object)), index=col.index, name=col.name)
+
+
+def concat_ledgers(frames):
+    # Wie pd.concat, aber kategoriale Spalten bleiben kategorial
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return empty_ledger()
+    # Kategoriale Spalten nicht durch pd.concat schicken: bei unterschiedlichen
+    # Kategorien würde daraus erst eine String-Spalte mit einer Zelle pro Zeile
+    cats = [c for c in CATEGORY_COLS if c in frames[0].columns]
+    out = pd.concat([f.drop(columns=cats) for f in frames], ignore_index=True)
+    for col in cats:
+        out[col] = _as_category(pd.Series(union_categoricals([_as_category(f[col]) for f in frames], ignore_order=True)))
+    return out[frames[0].columns]
+
+
+# Formate in Probier-Reihenfolge, das kanonische zuerst (so schreibt make_entry)
+DATE_FORMATS = ["%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d", "%d/%m/%Y"]
+TIME_FORMATS = ["%H:%M", "%H:%M:%S", "%H.%M"]
+# Zuletzt erkanntes Format pro Spalte, wird beim nächsten Tail zuerst probiert
+_detected = {}
+# Status pro Zelle
+OK, MISSING, INVALID = 0, 1, 2
+
+
+def _parse_uniques(col, formats, key):
+    # Jeder eindeutige Wert wird genau einmal geparst: ein paar tausend Tage
+    # und höchstens 1440 Uhrzeiten, egal wie lang der Ledger ist
+    codes, uniques = pd.factorize(col)
+    text = pd.Index(uniques, dtype=object).astype(str).str.strip()
+    parsed = np.full(len(text), np.datetime64("NaT"), dtype="datetime64[ns]")
+    todo = np.asarray(text != "")
+    status = np.where(todo, INVALID, MISSING)
+    best = None
+    first = _detected.get(key)
+    for fmt in ([first] if first else []) + [f for f in formats if f != first]:
+        if not todo.any():
+            break
+        got = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+        hit = np.asarray(got.notna())
+        if hit.any():
+            pos = np.flatnonzero(todo)[hit]
+            parsed[pos] = got[hit].to_numpy()
+            status[pos] = OK
+            todo[pos] = False
+            if best is None or hit.sum() > best[1]:
+                best = (fmt, hit.sum())
+    if best is not None:
+        _detected[key] = best[0]
+    missing = codes < 0
+    codes = np.where(missing, 0, codes)
+    values = parsed[codes] if len(parsed) else np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]")
+    values[missing] = np.datetime64("NaT")
+    return values, np.where(missing, MISSING, status[codes] if len(status) else MISSING)
+
+
+def _parse_amounts(col):
+    # Zahlen direkt übernehmen, Texte ("12,50") einmal pro eindeutigem Wert
+    if pd.api.types.is_numeric_dtype(col):
+        b = col.to_numpy(dtype=float)
+        return b, np.where(np.isnan(b), MISSING, OK)
+    codes, uniques = pd.factorize(col)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    num = pd.to_numeric(text.str.replace(",", ".", regex=False), errors="coerce").to_numpy(dtype=float)
+    status = np.where(text.to_numpy() == "", MISSING, np.where(np.isnan(num), INVALID, OK))
+    missing = codes < 0
+    codes = np.where(missing, 0, codes)
+    if not len(num):
+        return np.full(len(codes), np.nan), np.full(len(codes), MISSING)
+    return np.where(missing, np.nan, num[codes]), np.where(missing, MISSING, status[codes])
+
+
+def parse_sheet(raw, start=0):
+    # Rohdaten aus dem Sheet -> (kompakter Ledger plus ID, Fehlerbericht).
+    # Ein Durchlauf, keine String-Konkatenation. Zeilen ohne gültigen Betrag
+    # werden verworfen (zählten früher still als 0), Zeilen mit kaputtem
+    # Datum bleiben undatiert (zählen zur aktuellen Session) und werden gemeldet.
+    # "Zeile" im Bericht ist die Sheet-Zeile (Kopfzeile = 1).
+    df = raw.rename(columns=RENAME_MAP)
+    for col in ["Datum", "Name", "Aktion", "Betrag", "Zeitstempel", "ID"]:
+        if col not in df.columns: df[col] = None
+    if df.empty:
+        return empty_ledger().assign(ID=pd.Series(dtype=object)), empty_report()
+
+    with span("parse.dates"):
+        day, day_st = _parse_uniques(df["Datum"], DATE_FORMATS, "Datum")
+        tod, tod_st = _parse_uniques(df["Zeitstempel"], TIME_FORMATS, "Zeit")
+    with span("parse.betrag"):
+        betrag, betrag_st = _parse_amounts(df["Betrag"])
+
+    # Ohne (gültige) Uhrzeit zählt der Tag ab 00:00 wie bisher
+    offset = np.where(tod_st == OK, tod - np.datetime64("1900-01-01"), np.timedelta64(0, "ns"))
+    full_date = pd.Series(day + offset, index=df.index)
+
+    reasons = [
+        (betrag_st == MISSING, "Betrag fehlt"),
+        (betrag_st == INVALID, "Betrag ungültig"),
+        (day_st == MISSING, "Datum fehlt"),
+        (day_st == INVALID, "Datum ungültig"),
+        ((day_st == OK) & (tod_st == INVALID), "Zeit ungültig"),
+    ]
+    bad = np.zeros(len(df), dtype=bool)
+    for m, _ in reasons:
+        bad |= m
+    report = empty_report()
+    if bad.any():
+        grund = np.array([", ".join(r for m, r in reasons if m[i]) for i in np.flatnonzero(bad)], dtype=object)
+        report = pd.DataFrame({
+            "Zeile": start + np.flatnonzero(bad) + 2,
+            "Grund": grund,
+            "Verworfen": betrag_st[bad] != OK,
+        }).join(raw.iloc[np.flatnonzero(bad)].reset_index(drop=True))
+
+    keep = betrag_st == OK
+    betrag_ct = to_cents(betrag[keep])
+    aktion = df["Aktion"][keep]
+    with span("parse.netto"):
+        netto_ct = np.where(aktion_signs(aktion) & (betrag_ct > 0), -betrag_ct, betrag_ct)
+    out = pd.DataFrame({
+        "Full_Date": full_date[keep].astype("datetime64[ns]"),
+        "Session_Date": session_dates(full_date[keep]).astype("datetime64[ns]"),
+        "Name": df["Name"][keep].astype("category"),
+        "Aktion": aktion.astype("category"),
+        "Betrag_ct": betrag_ct,
+        "Netto_ct": netto_ct,
+        "ID": df["ID"][keep].astype(object),
+    })
+    return out, report
+
+
+def empty_report():
+    return pd.DataFrame({"Zeile": pd.Series(dtype="int64"), "Grund": pd.Series(dtype=object),
+                         "Verworfen": pd.Series(dtype=bool)})
+
+
+def normalize(raw):
+    # Wie parse_sheet, nur der Ledger (fortlaufend nummeriert)
+    return parse_sheet(raw)[0].reset_index(drop=True)
+
+
+class Conflict(Exception):
+    # append(expected=n): der Store hat nicht mehr genau n Datenzeilen, jemand
+    # anderes hat dazwischen geschrieben. Es wurde nichts geschrieben.
+    # count = tatsächliche Zeilenzahl, falls der Store sie kennt (weniger als
+    # erwartet = Zeilen wurden gelöscht, kein fremder Schreiber)
+
+    def __init__(self, message, count=None):
+        super().__init__(message)
+        self.count = count
+
+
+class LedgerStore:
+    # Minimales Storage-Interface: alles lesen, neue Zeilen anhängen.
+    # append() darf nie die bestehende Historie neu lesen oder hochladen.
+    #
+    # expected = Anzahl Datenzeilen, die der Schreiber kennt (Compare-and-Swap):
+    # hat der Store inzwischen andere, wird Conflict geworfen statt zu schreiben.
+
+    def read(self):
+        raise NotImplementedError
+
+    def read_from(self, start):
+        # Rohzeilen ab Datenzeile `start` (0-basiert, ohne Header)
+        return self.read().iloc[start:].reset_index(drop=True)
+
+    def append(self, rows, expected=None):
+        raise NotImplementedError
+
+    def query(self, session_from=None, session_to=None, day_from=None, day_to=None, names=None):
+        # Range-Query im Backend. None = kein Pushdown möglich, der Aufrufer
+        # filtert dann den Ledger im Speicher.
+        return None
+
+    def source(self):
+        # Kennung für den lokalen Spiegel (snapshot.py): anderes Backend = neu laden
+        return f"{type(self).__name__}:{getattr(self, 'worksheet', getattr(self, 'path', ''))}"
+
+    def sync(self):
+        # Liegengebliebenes nachreichen (MirrorStore), der Poller ruft das regelmäßig
+        return True
+
+
+class GSheetsStore(LedgerStore):
+    def __init__(self, conn, worksheet="Buchungen"):
+        self.conn = conn
+        self.worksheet = worksheet
+        self._handle = None
+        self._header = None
+        self._missing = []
+
+    def _ws(self):
+        if self._handle is None:
+            self._handle = self.conn.client._select_worksheet(worksheet=self.worksheet)
+        return self._handle
+
+    def read(self):
+        return self.conn.read(worksheet=self.worksheet, ttl=0)
+
+    def _columns(self):
+        if self._header is None:
+            # Fehlende Spalten (z.B. "ID" in alten Sheets) hängen hinten dran,
+            # ihre Kopfzellen schreibt der nächste append()
+            header = self._ws().row_values(1)
+            self._missing = [c for c in SHEET_COLS if c not in header]
+            self._header = header + self._missing
+        return self._header
+
+    def read_from(self, start):
+        header = self._columns()
+        # Zeile 1 ist der Header, Datenzeile 0 liegt also in Zeile 2
+        values = self._ws().get(f"A{start + 2}:{chr(ord('A') + len(header) - 1)}")
+        rows = [v + [None] * (len(header) - len(v)) for v in values]
+        return pd.DataFrame(rows, columns=header)
+
+    def append(self, rows, expected=None):
+        if not rows:
+            return
+        ws = self._ws()
+        if expected is not None:
+            # Sheets kennt kein echtes CAS: vorher prüfen, ob hinter der letzten
+            # bekannten Zeile schon etwas steht (eine Zeile, ein kleiner Request).
+            # Das Restfenster ist unkritisch, append_rows überschreibt nie.
+            row = expected + 2
+            probe = ws.get(f"A{row}:{chr(ord('A') + len(self._columns()) - 1)}{row}")
+            if any(v for r in probe for v in r):
+                raise Conflict(f"Sheet hat mehr als {expected} Zeilen")
+        header = self._columns()
+        if self._missing:
+            # Ohne Kopfzelle fände read_from() die IDs nicht wieder
+            first = len(header) - len(self._missing) + 1
+            for i, c in enumerate(self._missing):
+                ws.update_cell(1, first + i, c)
+            self._missing = []
+        # Werte in der Reihenfolge der echten Kopfzeile, fremde Spalten bleiben leer
+        values = [[r.get(c, "") for c in header] for r in rows]
+        # Ein einziger append-Request statt read + concat + kompletter Upload
+        ws.append_rows(values, value_input_option="USER_ENTERED")
+
+
+class CsvStore(LedgerStore):
+    # Lokaler Ersatz für das Sheet (Tests, Benchmarks, Offline-Betrieb)
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Zuletzt gezählt: (Inode, Bytes, Zeilenumbrüche)
+        self._counted = (None, 0, 0)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=SHEET_COLS)
+        return pd.read_csv(self.path, dtype=str, keep_default_na=False, na_values=[""])
+
+    def read_from(self, start):
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=SHEET_COLS)
+        return pd.read_csv(self.path, dtype=str, keep_default_na=False, na_values=[""],
+                           skiprows=range(1, start + 1))
+
+    def count(self):
+        # Nur die seit dem letzten Mal angehängten Bytes zählen. Ist die Datei
+        # ersetzt, kürzer oder endet die gezählte Stelle nicht mehr auf einem
+        # Zeilenumbruch (von Hand bearbeitet), wird von vorne gezählt.
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._counted = (None, 0, 0)
+            return 0
+        inode, size, lines = self._counted
+        with open(self.path, "rb") as f:
+            if inode != st.st_ino or st.st_size < size:
+                size = lines = 0
+            elif size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    size = lines = 0
+            f.seek(size)
+            data = f.read()
+        self._counted = (st.st_ino, size + len(data), lines + data.count(b"\n"))
+        return max(0, self._counted[2] - 1)
+
+    def append(self, rows, expected=None):
+        if not rows:
+            return
+        # Prüfen und Anhängen unter einem Lock, auch gegen andere Prozesse
+        with self._lock, open(self.path, "a", newline="", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            count = self.count() if expected is not None else None
+            if count is not None and count != expected:
+                raise Conflict(f"{self.path} hat {count} statt {expected} Zeilen", count)
+            w = csv.writer(f)
+            if os.fstat(f.fileno()).st_size == 0:
+                w.writerow(SHEET_COLS)
+            for r in rows:
+                w.writerow([r.get(c, "") for c in SHEET_COLS])
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buchungen (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    Datum TEXT, Zeit TEXT, Spieler TEXT, Typ TEXT, Betrag_ct INTEGER, ID TEXT,
+    Netto_ct INTEGER, Full_Date TEXT, Session_Date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_name ON buchungen(Spieler);
+CREATE INDEX IF NOT EXISTS idx_session ON buchungen(Session_Date);
+CREATE INDEX IF NOT EXISTS idx_full_date ON buchungen(Full_Date, Netto_ct);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_id ON buchungen(ID);
+-- Laufende Gesamtsumme, damit der Kassenstand vor einem Zeitraum nur die
+-- (meist kurze) Historie danach scannen muss
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), netto_ct INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES (0, (SELECT COALESCE(SUM(Netto_ct), 0) FROM buchungen));
+CREATE TRIGGER IF NOT EXISTS trg_totals AFTER INSERT ON buchungen
+BEGIN UPDATE totals SET netto_ct = netto_ct + COALESCE(NEW.Netto_ct, 0) WHERE id = 0; END;
+"""
+
+
+def _iso(ts, fmt):
+    return None if pd.isna(ts) else pd.Timestamp(ts).strftime(fmt)
+
+
+class SqliteStore(LedgerStore):
+    # Eingebettetes Backend. Full_Date, Session_Date und Netto_ct werden beim
+    # Schreiben berechnet und indiziert, damit Statistik und Kassensturz
+    # ihre Zeiträume als Range-Query abfragen können. Doppelte IDs werden
+    # ignoriert (idempotentes Nachsenden aus dem Journal).
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SQLITE_SCHEMA)
+
+    def _conn(self):
+        # sqlite3-Verbindungen dürfen nicht zwischen Threads geteilt werden
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM buchungen").fetchone()[0]
+
+    def read(self):
+        return self.read_from(0)
+
+    def read_from(self, start):
+        cur = self._conn().execute(
+            "SELECT Datum, Zeit, Spieler, Typ, Betrag_ct / 100.0, ID FROM buchungen ORDER BY seq LIMIT -1 OFFSET ?", (start,))
+        return pd.DataFrame(cur.fetchall(), columns=SHEET_COLS)
+
+    def append(self, rows, expected=None):
+        if not rows:
+            return
+        raw = pd.DataFrame(rows).reindex(columns=SHEET_COLS)
+        # Zeilen ohne gültigen Betrag lassen sich nicht in Cent ablegen
+        df, _ = parse_sheet(raw)
+        raw = raw.loc[df.index]
+        full_date = df["Full_Date"].dt.strftime("%Y-%m-%d %H:%M:%S").astype(object)
+        session = df["Session_Date"].dt.strftime("%Y-%m-%d").astype(object)
+        values = zip(raw["Datum"].astype(object), raw["Zeit"].astype(object), df["Name"].astype(object),
+                     df["Aktion"].astype(object), df["Betrag_ct"].tolist(), df["ID"], df["Netto_ct"].tolist(),
+                     full_date.where(full_date.notna(), None), session.where(session.notna(), None))
+        conn = self._conn()
+        with conn:
+            # Schreibsperre vor dem Zählen: Prüfen und Einfügen sind eine Transaktion
+            conn.execute("BEGIN IMMEDIATE")
+            count = self.count() if expected is not None else None
+            if count is not None and count != expected:
+                raise Conflict(f"buchungen hat {count} statt {expected} Zeilen", count)
+            conn.executemany(
+                "INSERT OR IGNORE INTO buchungen (Datum, Zeit, Spieler, Typ, Betrag_ct, ID, Netto_ct, Full_Date, Session_Date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+
+    def query(self, session_from=None, session_to=None, day_from=None, day_to=None, names=None):
+        where, args = [], []
+        if session_from is not None or session_to is not None:
+            cond, cargs = [], []
+            if session_from is not None:
+                cond.append("Session_Date >= ?")
+                cargs.append(_iso(session_from, "%Y-%m-%d"))
+            if session_to is not None:
+                cond.append("Session_Date <= ?")
+                cargs.append(_iso(session_to, "%Y-%m-%d"))
+            cond = " AND ".join(cond)
+            # Zeilen ohne Datum gehören zur aktuellen Session
+            cur_s = current_session()
+            if (session_from is None or pd.Timestamp(session_from) <= cur_s) and (session_to is None or cur_s <= pd.Timestamp(session_to)):
+                cond = f"(({cond}) OR Session_Date IS NULL)"
+            where.append(cond)
+            args += cargs
+        if day_from is not None:
+            where.append("Full_Date >= ?")
+            args.append(_iso(day_from, "%Y-%m-%d"))
+        if day_to is not None:
+            where.append("Full_Date < ?")
+            args.append(_iso(pd.Timestamp(day_to) + pd.Timedelta(days=1), "%Y-%m-%d"))
+        if names is not None:
+            where.append(f"Spieler IN ({', '.join('?' * len(names))})")
+            args += list(names)
+        sql = ("SELECT Full_Date, Session_Date, Spieler, Typ, Betrag_ct, Netto_ct FROM buchungen"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY Full_Date IS NULL, Full_Date, seq")
+        df = pd.DataFrame(self._conn().execute(sql, args).fetchall(), columns=LEDGER_COLS)
+        return df.astype(LEDGER_DTYPES | {"Full_Date": object, "Session_Date": object}).assign(
+            Full_Date=pd.to_datetime(df["Full_Date"], format="%Y-%m-%d %H:%M:%S").astype("datetime64[ns]"),
+            Session_Date=pd.to_datetime(df["Session_Date"], format="%Y-%m-%d").astype("datetime64[ns]"))
+
+    def netto_before(self, ts):
+        # Summe (Cent) aller datierten Buchungen vor ts = Gesamt - ab ts - undatiert
+        cur = self._conn().execute(
+            "SELECT (SELECT netto_ct FROM totals WHERE id = 0)"
+            " - (SELECT COALESCE(SUM(Netto_ct), 0) FROM buchungen WHERE Full_Date >= ?)"
+            " - (SELECT COALESCE(SUM(Netto_ct), 0) FROM buchungen WHERE Full_Date IS NULL)",
+            (_iso(ts, "%Y-%m-%d %H:%M:%S"),))
+        return cur.fetchone()[0]
+
+    def netto_dated(self):
+        # Summe (Cent) aller datierten Buchungen = Kassenstand vor den undatierten
+        cur = self._conn().execute(
+            "SELECT (SELECT netto_ct FROM totals WHERE id = 0)"
+            " - (SELECT COALESCE(SUM(Netto_ct), 0) FROM buchungen WHERE Full_Date IS NULL)")
+        return cur.fetchone()[0]
+
+
+class MirrorStore(LedgerStore):
+    # Primäres Backend (z.B. SQLite) plus Spiegel (z.B. das Google Sheet).
+    # Gelesen und abgefragt wird nur das primäre Backend, der Spiegel ist
+    # reines Export-Ziel. Was der Spiegel nicht annimmt, bleibt im Rückstand
+    # (backlog) und wird mit dem nächsten append() bzw. sync() nachgereicht.
+
+    def __init__(self, primary, mirror, retry_interval=15):
+        self.primary = primary
+        self.mirror = mirror
+        self.retry_interval = retry_interval
+        self.mirror_errors = 0
+        self.last_error = None
+        self.backlog = []
+        # True = Stand des Spiegels unbekannt, vor dem Schreiben über die IDs abgleichen
+        self._unchecked = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def bootstrap(self):
+        # Leeres primäres Backend einmalig aus dem Spiegel befüllen. Sonst
+        # nachreichen, was der Spiegel (z.B. vor einem Neustart) verpasst hat.
+        if self.primary.count() == 0:
+            raw = self.mirror.read()
+            if not raw.empty:
+                raw = raw.reindex(columns=SHEET_COLS).astype(object).where(raw.notna(), None)
+                self.primary.append(raw.to_dict("records"))
+        else:
+            self._unchecked = True
+            self.sync(force=True)
+        return self
+
+    @staticmethod
+    def _missing(raw, mirrored):
+        # Zeilen des primären Backends, deren ID der Spiegel nicht hat
+        ids = set(mirrored["ID"].dropna().astype(str)) if "ID" in mirrored else set()
+        raw = raw[raw["ID"].notna() & ~raw["ID"].astype(str).isin(ids)]
+        return raw.astype(object).where(raw.notna(), None).to_dict("records")
+
+    def sync(self, force=False):
+        # Rückstand in den Spiegel schreiben, nach einem Fehler frühestens nach
+        # retry_interval. Ein Fehler kann auch nach dem Schreiben kommen
+        # (Timeout): dann vor dem nächsten Versuch abgleichen, was schon drin steht.
+        with self._lock:
+            if not self.backlog and not self._unchecked:
+                return True
+            if not force and self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return False
+            try:
+                if self._unchecked:
+                    self.backlog = self._missing(self.primary.read(), self.mirror.read())
+                    self._unchecked = False
+                if self.backlog:
+                    self.mirror.append(self.backlog)
+                    self.backlog = []
+            except Exception as e:
+                self.mirror_errors += 1
+                self.last_error = str(e)
+                self._failed_at = time.monotonic()
+                self._unchecked = True
+                return False
+            self._failed_at = None
+            return True
+
+    def stats(self):
+        return {"backlog": len(self.backlog), "behind": bool(self.backlog) or self._unchecked,
+                "mirror_errors": self.mirror_errors, "last_error": self.last_error}
+
+    def read(self):
+        return self.primary.read()
+
+    def read_from(self, start):
+        return self.primary.read_from(start)
+
+    def query(self, **filters):
+        return self.primary.query(**filters)
+
+    def netto_before(self, ts):
+        return self.primary.netto_before(ts)
+
+    def netto_dated(self):
+        return self.primary.netto_dated()
+
+    def source(self):
+        return self.primary.source()
+
+    def append(self, rows, expected=None):
+        self.primary.append(rows, expected)
+        with self._lock:
+            self.backlog.extend(rows)
+        self.sync()
+
+
+class LedgerCache:
+    # Prozessweiter Cache für den geparsten Ledger. Es werden nur Zeilen
+    # nachgeladen und geparst, die seit dem letzten Sync dazugekommen sind
+    # (High-Water-Mark = Anzahl bekannter Rohzeilen).
+    #
+    # Buchungen laufen optimistisch: book() schreibt sie zuerst ins Journal,
+    # trägt sie sofort lokal ein (Spalte "Pending" = Buchungs-ID) und ein
+    # Flusher-Thread schreibt sie im Hintergrund in den Store. Schlägt das
+    # fehl, bleibt die Buchung offen (Fehler in `errors`) und wird später
+    # erneut gesendet. Zeilen, die schon im Store sind, erkennt der Cache an
+    # der ID und schreibt sie nicht doppelt.
+    #
+    # Mit poll_interval holt ein Poller-Thread neue Zeilen im Hintergrund:
+    # ein Remote-Read pro Intervall, egal wie viele Sessions zuschauen. Die
+    # Sessions lesen dann nur noch den Snapshot (max_age=None = nie abgelaufen).
+    #
+    # Jeder Tail-Read liest die letzte bekannte Zeile mit und vergleicht sie:
+    # passt sie nicht mehr (Zeile im Sheet gelöscht/geändert), wird alles neu
+    # geladen statt ab einer falschen High-Water-Mark weiterzulesen.
+    #
+    # Mit snapshot (siehe snapshot.py) startet der Cache aus dem lokalen
+    # Arrow-Spiegel und gleicht beim ersten Sync nur den Tail mit dem Store ab.
+    #
+    # Schreiben: ein Schreiber pro Ledger (_write_lock), alle offenen Buchungen
+    # gehen gebündelt in einem append() raus, mit expected = bekannte Zeilen.
+    # Hat ein anderer Prozess dazwischen geschrieben (Conflict), wird erst der
+    # Tail nachgeladen (erledigt ggf. schon angekommene Buchungen) und dann
+    # erneut versucht, bis zu max_retries mal mit zufälligem Backoff.
+
+    def __init__(self, store, max_age=30, journal=None, retry_interval=15, poll_interval=None, checkpoints=None,
+                 snapshot=None, snapshot_interval=30, max_retries=8, backoff=0.05):
+        self.store = store
+        self.checkpoints = checkpoints or Checkpoints()
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._verified = None
+        self.max_age = max_age
+        self.poll_interval = poll_interval
+        self.journal = journal
+        self.retry_interval = retry_interval
+        self.df = self._empty()
+        self.dated = 0
+        self.index = AggregateIndex()
+        self.rows = 0
+        self.version = 0
+        self.synced_at = None
+        self.stale = True
+        self.hits = 0
+        self.misses = 0
+        self.last_parsed = 0
+        self.total_parsed = 0
+        self.polls = 0
+        self.conflicts = 0
+        self.appends = 0
+        self.reloads = 0
+        self.pending = {}
+        self.errors = {}
+        # Fehlerhafte Sheet-Zeilen (siehe parse_sheet), wächst mit jedem Tail
+        self.rejected = empty_report()
+        self._futures = {}
+        self._unconfirmed = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        # Letzte Rohzeile im Store und Stempel des geladenen Spiegels
+        self._last_raw = None
+        self._stamp = None
+        self._saved_at = None
+        self._saved_rows = 0
+        self.restored = 0
+
+        if snapshot is not None:
+            self._restore()
+        if journal is not None:
+            # Offene Buchungen aus dem letzten Lauf: sofort sichtbar, ob sie
+            # schon im Sheet sind, klärt der erste Sync über die IDs
+            for bid, rows in journal.replay().items():
+                self.pending[bid] = rows
+                self._unconfirmed.add(bid)
+                self._add(normalize(pd.DataFrame(rows)).assign(Pending=bid))
+            if self.pending:
+                self._wake.set()
+
+        self._threads = [threading.Thread(target=self._run, name="ledger-flusher", daemon=True)]
+        if poll_interval:
+            self._threads.append(threading.Thread(target=self._poll, name="ledger-poller", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    @staticmethod
+    def _empty():
+        return empty_ledger().assign(Pending=pd.Series(dtype="category"))
+
+    def close(self, timeout=5):
+        # Flusher und Poller anhalten (z.B. wenn st.cache_resource den Cache
+        # verwirft). Offene Buchungen bleiben im Journal, der nächste Cache
+        # spielt sie wieder ein; zwei Flusher auf einem Journal gibt es so nicht.
+        self._closed.set()
+        self._wake.set()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout)
+
+    def invalidate(self):
+        # Nur markieren: beim nächsten get() wird ab High-Water-Mark nachgeladen
+        self.stale = True
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.df = self._empty()
+        self.dated = 0
+        self.index = AggregateIndex()
+        self.rows = 0
+        self.rejected = empty_report()
+        self.stale = True
+        self._last_raw = None
+        self._stamp = None
+        self._saved_at = None
+        for bid, rows in self.pending.items():
+            self._add(normalize(pd.DataFrame(rows)).assign(Pending=bid))
+
+    def _restore(self):
+        # Kaltstart aus dem Spiegel; geprüft wird er erst beim ersten Sync
+        loaded = self.snapshot.load(self.store.source())
+        if loaded is None:
+            return
+        df, cells, meta = loaded
+        for col in ("Name", "Aktion"):
+            df[col] = _as_category(df[col])
+        self._set(df.assign(Pending=pd.Series(None, index=df.index, dtype="category")))
+        self.index.cells = cells.assign(Name=cells["Name"].astype(object))
+        self.index.balance_ct = meta["balance_ct"]
+        self.index.rows = len(df)
+        self.rows = meta["rows"]
+        self.rejected = meta["rejected"] if not meta["rejected"].empty else empty_report()
+        self._last_raw = self._stamp = meta["last"]
+        self._saved_at, self._saved_rows = time.monotonic(), self.rows
+        self.restored = len(df)
+
+    def _save_snapshot(self, force=False):
+        # Höchstens alle snapshot_interval Sekunden, nur bestätigte Zeilen
+        if self.snapshot is None or self._last_raw is None or self._stamp is not None or self.rows == self._saved_rows:
+            return
+        if not force and self._saved_at is not None and time.monotonic() - self._saved_at < self.snapshot_interval:
+            return
+        pending = self.df["Pending"].notna().to_numpy()
+        index = self.index
+        if pending.any():
+            # Offene Buchungen stecken im Index, gehören aber nicht in den Spiegel
+            index = AggregateIndex()
+            index.cells, index.balance_ct = self.index.cells, self.index.balance_ct
+            index.update(self.df[pending], sign=-1)
+        df = self.df[~pending].drop(columns="Pending")
+        try:
+            self.snapshot.save(df, index.cells, self.rows, self._last_raw, self.rejected, self.store.source(),
+                               index.balance_ct)
+        except OSError:
+            return
+        self._saved_at, self._saved_rows = time.monotonic(), self.rows
+
+    def _expired(self):
+        if self.stale or self.synced_at is None:
+            return True
+        return self.max_age is not None and time.monotonic() - self.synced_at > self.max_age
+
+    def get(self):
+        # Treffer ohne Lock: ein laufender Sync blockiert keine Leser
+        if not self._expired():
+            self.hits += 1
+            return self.df
+        with self._lock:
+            if not self._expired():
+                self.hits += 1
+                return self.df
+            self.misses += 1
+            try:
+                self._refresh()
+            except Exception:
+                # Remote nicht erreichbar: letzten Stand weiter anzeigen
+                pass
+            return self.df
+
+    @timed("ledger.scope")
+    def scope(self, session_from=None, session_to=None, day_from=None, day_to=None):
+        # Buchungen eines Zeitraums, aufsteigend sortiert, mit globalem
+        # Kassenstand "Balance" (Euro). Kann das Backend Range-Queries, wird
+        # der Filter dorthin durchgereicht, sonst wird der Cache per Binärsuche
+        # geschnitten. Der Kassenstand vor dem Ausschnitt kommt aus den
+        # Session-Checkpoints plus den Zeilen davor in derselben Session,
+        # nie aus einer cumsum über die ganze Historie.
+        # Offene Buchungen kennt nur der Cache: solange es welche gibt, kein Pushdown
+        filters = dict(session_from=session_from, session_to=session_to, day_from=day_from, day_to=day_to)
+        df = self.store.query(**filters) if not self.pending else None
+        if df is not None:
+            # Datierte Zeilen ab dem Kassenstand davor, undatierte (stehen am Ende)
+            # ab der Summe aller datierten, wie im Speicher-Pfad unten
+            netto = df["Netto_ct"].to_numpy()
+            d = int(df["Full_Date"].notna().sum())
+            first = df["Full_Date"].iloc[0] if d else None
+            balance = [self.store.netto_before(first) + np.cumsum(netto[:d])] if d else []
+            if len(df) > d:
+                balance.append(self.store.netto_dated() + np.cumsum(netto[d:]))
+            bal = np.concatenate(balance) if balance else np.zeros(0, dtype=np.int64)
+            return df.assign(Session_Date=with_current(df["Session_Date"]), Balance=bal / 100)
+
+        df, dated = self.df, self.dated
+        self.checkpoints.update(self.index, self.version)
+        ts = df["Full_Date"].to_numpy()[:dated]
+        netto = df["Netto_ct"].to_numpy()
+        # Session s = [s + 6h, s + 1 Tag + 6h), Tag d = [d, d + 1 Tag)
+        lo, hi = [], []
+        if session_from is not None:
+            lo.append(pd.Timestamp(session_from) + SESSION_CUTOFF)
+        if session_to is not None:
+            hi.append(pd.Timestamp(session_to) + pd.Timedelta(days=1) + SESSION_CUTOFF)
+        if day_from is not None:
+            lo.append(pd.Timestamp(day_from))
+        if day_to is not None:
+            hi.append(pd.Timestamp(day_to) + pd.Timedelta(days=1))
+        i0 = ts.searchsorted(np.datetime64(max(lo)), "left") if lo else 0
+        i1 = max(i0, ts.searchsorted(np.datetime64(min(hi)), "left") if hi else dated)
+
+        # Zeilen ohne Datum zählen zur aktuellen Session, nie zu einem Tagesfilter
+        undated = day_from is None and day_to is None
+        if undated and (session_from is not None or session_to is not None):
+            cur_s = current_session()
+            undated = ((session_from is None or pd.Timestamp(session_from) <= cur_s)
+                       and (session_to is None or cur_s <= pd.Timestamp(session_to)))
+
+        balance = []
+        if i1 > i0:
+            first_s = session_of(ts[i0])
+            j0 = ts.searchsorted(np.datetime64(first_s + SESSION_CUTOFF), "left")
+            before = self.checkpoints.before(first_s) + int(netto[j0:i0].sum())
+            balance.append(before + np.cumsum(netto[i0:i1]))
+        rows = np.arange(i0, i1)
+        if undated and len(df) > dated:
+            total = int(self.checkpoints.balance.iloc[-1]) if len(self.checkpoints.balance) else 0
+            balance.append(total + np.cumsum(netto[dated:]))
+            rows = np.concatenate([rows, np.arange(dated, len(df))])
+        part = df.iloc[rows]
+        bal = np.concatenate(balance) if balance else np.zeros(0, dtype=np.int64)
+        return part.assign(Session_Date=with_current(part["Session_Date"]), Balance=bal / 100)
+
+    def book(self, rows):
+        # Erst Journal (durabel), dann lokal sichtbar, Store kommt asynchron.
+        # Das Future liefert True sobald die Buchung im Store bestätigt ist.
+        bid = uuid.uuid4().hex
+        rows = [dict(r, ID=f"{bid}-{i}") for i, r in enumerate(rows)]
+        future = Future()
+        with self._lock:
+            if self.journal is not None:
+                self.journal.book(bid, rows)
+            self.pending[bid] = rows
+            self._futures[bid] = future
+            self._add(normalize(pd.DataFrame(rows)).assign(Pending=bid))
+        self._wake.set()
+        return bid, future
+
+    def retry(self, bid=None):
+        self._wake.set()
+
+    def discard(self, bid):
+        # Nie parallel zu einem Flush. Kann ein Versuch doch angekommen sein
+        # (z.B. Timeout nach dem Schreiben), erst im Store nachsehen: stehen die
+        # IDs schon drin, ist die Buchung gebucht und wird bestätigt statt
+        # verworfen. Ist der Store nicht erreichbar, bleibt sie offen.
+        with self._write_lock, self._lock:
+            if bid not in self.pending:
+                return False
+            if bid in self._unconfirmed:
+                try:
+                    self._refresh()
+                except Exception as e:
+                    self.errors[bid] = f"Verwerfen erst nach Prüfung im Store möglich: {e}"
+                    return False
+                if bid not in self.pending:
+                    return False
+            self._drop(bid)
+            self.errors.pop(bid, None)
+            self._unconfirmed.discard(bid)
+            if self.journal is not None:
+                self.journal.discard(bid)
+            self._resolve(bid, False)
+            return True
+
+    def flush(self):
+        with self._write_lock:
+            bids = list(self.pending)
+            if bids:
+                self._commit(bids)
+        return not self.pending
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.retry_interval if self.pending else None)
+            self._wake.clear()
+            if not self._closed.is_set():
+                self.flush()
+
+    def _commit(self, bids):
+        # Nur mit _write_lock aufrufen
+        if any(bid in self._unconfirmed for bid in bids):
+            # Vorheriger Versuch evtl. doch angekommen: erst Tail lesen,
+            # _refresh() erledigt Buchungen, deren IDs schon alle da sind
+            with self._lock:
+                try:
+                    self._refresh()
+                except Exception as e:
+                    for bid in bids:
+                        self.errors[bid] = str(e)
+                    return False
+        for attempt in range(self.max_retries):
+            bids = [bid for bid in bids if bid in self.pending]
+            if not bids:
+                return True
+            rows = [r for bid in bids for r in self.pending[bid]]
+            self._unconfirmed.update(bids)
+            try:
+                with span("store.append"):
+                    self.store.append(rows, expected=self.rows)
+                self.appends += 1
+                break
+            except Conflict as e:
+                # Nichts geschrieben: fremde Zeilen holen, dann neu versuchen. Hat
+                # der Store weniger Zeilen als bekannt, wurde im Sheet gelöscht:
+                # dann hilft kein Tail, sondern nur komplett neu laden.
+                self.conflicts += 1
+                self._unconfirmed.difference_update(bids)
+                with self._lock:
+                    try:
+                        if e.count is not None and e.count < self.rows:
+                            self._reload()
+                        else:
+                            self._refresh()
+                    except Exception:
+                        self.stale = True
+                time.sleep(self.backoff * random.random() * 2 ** min(attempt, 4))
+            except Exception as e:
+                for bid in bids:
+                    self.errors[bid] = str(e)
+                return False
+        else:
+            for bid in bids:
+                self.errors[bid] = f"Konflikt: nach {self.max_retries} Versuchen nicht gebucht"
+            return False
+        with self._lock:
+            # Echte Zeilen mit dem Tail vom Store holen, _apply() erledigt die
+            # Buchungen über die IDs und entfernt erst dann die lokalen Kopien.
+            # Bestätigt wird nur, was dabei wirklich gelesen wurde; der Rest
+            # bleibt offen (unbestätigt) und wird beim nächsten Flush geklärt.
+            try:
+                self._refresh()
+            except Exception:
+                self.stale = True
+        return not any(bid in self.pending for bid in bids)
+
+    def _confirm(self, bid):
+        if bid not in self.pending:
+            return
+        self._drop(bid)
+        self.errors.pop(bid, None)
+        self._unconfirmed.discard(bid)
+        if self.journal is not None:
+            self.journal.done(bid)
+            if not self.pending:
+                self.journal.compact({})
+        self._resolve(bid, True)
+
+    def _resolve(self, bid, ok):
+        future = self._futures.pop(bid, None)
+        if future is not None:
+            future.set_result(ok)
+
+    def _set(self, df):
+        # df ist aufsteigend nach Zeit sortiert, undatierte Zeilen am Ende
+        self.df = df.reset_index(drop=True)
+        self.dated = int(self.df["Full_Date"].notna().sum())
+        self.version += 1
+
+    def _settle(self, done, new):
+        # Stimmen die Zeilen im Store mit den lokalen Kopien überein, bleiben
+        # die Kopien stehen und verlieren nur ihre Markierung: kein concat, kein
+        # Index-Update. Weicht der Store ab (z.B. vom Sheet umformatiert),
+        # werden die Kopien durch die echten Zeilen ersetzt (-> replace).
+        ids = {r["ID"] for bid in done for r in self.pending[bid]}
+        mine = new["ID"].isin(ids).to_numpy()
+        mask = self.df["Pending"].isin(done).to_numpy()
+        cols = ["Full_Date", "Session_Date", "Name", "Aktion", "Betrag_ct", "Netto_ct"]
+        local = sorted(self.df.loc[mask, cols].itertuples(index=False, name=None), key=repr)
+        stored = sorted(new.loc[mine, cols].itertuples(index=False, name=None), key=repr)
+        if local != stored:
+            return new, done
+        df = self.df.copy(deep=False)
+        df["Pending"] = df["Pending"].cat.remove_categories([bid for bid in done if bid in df["Pending"].cat.categories])
+        self.df = df
+        self.version += 1
+        return new[~mine], []
+
+    @timed("ledger.add")
+    def _add(self, new, replace=()):
+        # replace: Buchungs-IDs, deren lokale Kopie durch `new` ersetzt wird
+        if new.empty and not replace:
+            return
+        new = new.drop(columns="ID", errors="ignore").sort_values("Full_Date", kind="stable", na_position="last")
+        df = self.df
+        if replace:
+            mask = df["Pending"].isin(replace).to_numpy()
+            self.index.update(df[mask], sign=-1)
+            df = df[~mask]
+        d = int(df["Full_Date"].notna().sum())
+        nd = int(new["Full_Date"].notna().sum())
+        if not d or not nd or new["Full_Date"].iloc[0] >= df["Full_Date"].iloc[d - 1]:
+            # Normalfall: neue Zeilen sind jünger als alles Bekannte -> nur anhängen
+            merged = concat_ledgers([df.iloc[:d], new.iloc[:nd], df.iloc[d:], new.iloc[nd:]])
+        else:
+            merged = concat_ledgers([df, new]).sort_values("Full_Date", kind="stable", na_position="last")
+        self._set(merged)
+        self.index.update(new)
+
+    def _drop(self, bid):
+        rows = self.pending.pop(bid, None)
+        if rows is None:
+            return
+        mask = (self.df["Pending"] == bid).to_numpy()
+        if mask.any():
+            self.index.update(self.df[mask], sign=-1)
+            self._set(self.df[~mask])
+
+    def _poll(self):
+        while not self._closed.wait(self.poll_interval):
+            self.store.sync()
+            # Remote-Read außerhalb des Locks, angewendet wird nur, wenn
+            # in der Zwischenzeit niemand sonst nachgeladen hat
+            start = self.rows
+            try:
+                tail = self._read_tail()
+            except Exception:
+                continue
+            with self._lock:
+                if start == self.rows:
+                    self._stamp = None
+                    try:
+                        self._apply(tail) if tail is not None else self._reload()
+                    except Exception:
+                        self.stale = True
+            self.polls += 1
+
+    def _read_tail(self):
+        # Tail ab High-Water-Mark, inklusive der letzten bekannten Zeile. Das
+        # Sheet wird von Hand bearbeitet: stimmt diese Zeile nicht mehr (Zeilen
+        # gelöscht oder geändert), ist die Zeilenzahl nichts mehr wert -> None.
+        # Nach einem Start aus dem Spiegel wird gegen dessen Stempel geprüft.
+        start, last = self.rows, self._stamp if self._stamp is not None else self._last_raw
+        if not start or last is None:
+            with span("store.read"):
+                return self.store.read_from(start)
+        with span("store.read"):
+            tail = self.store.read_from(start - 1)
+        if tail.empty or raw_key(tail.reindex(columns=SHEET_COLS).iloc[0]) != last:
+            return None
+        return tail.iloc[1:].reset_index(drop=True)
+
+    def _refresh(self):
+        tail = self._read_tail()
+        self._stamp = None
+        if tail is None:
+            self._reload()
+        else:
+            self._apply(tail)
+
+    def _reload(self):
+        # Alles neu laden; offene Buchungen bleiben sichtbar und werden über
+        # ihre IDs erledigt, falls sie schon im Store stehen
+        self.reloads += 1
+        self._clear()
+        with span("store.read"):
+            tail = self.store.read_from(0)
+        self._apply(tail)
+
+    def _apply(self, tail):
+        self.synced_at = time.monotonic()
+        self.stale = False
+        self.last_parsed = len(tail)
+        if tail.empty:
+            self._save_snapshot()
+            return
+        self.total_parsed += len(tail)
+        with span("parse"):
+            new, rejected = parse_sheet(tail, start=self.rows)
+        new = new.assign(Pending=None)
+        if not rejected.empty:
+            self.rejected = pd.concat([self.rejected, rejected], ignore_index=True)
+        # Offene Buchungen, deren Zeilen jetzt im Store stehen, sind erledigt.
+        # Bestätigt (Future, Journal) wird erst, wenn der neue Stand sichtbar ist.
+        seen = set(new["ID"].dropna())
+        done = [bid for bid, rows in self.pending.items() if seen and all(r["ID"] in seen for r in rows)]
+        new, replace = self._settle(done, new) if done else (new, [])
+        self._add(new, replace=replace)
+        self.rows += len(tail)
+        self._last_raw = raw_key(tail.reindex(columns=SHEET_COLS).iloc[-1])
+        # Gespeicherte Checkpoints nach dem ersten Sync und bei jeder neu
+        # abgeschlossenen Session gegen den aktuellen Stand prüfen
+        if self._verified != current_session():
+            self.checkpoints.update(self.index, self.version)
+            self.checkpoints.verify()
+            self._verified = current_session()
+        for bid in done:
+            self._confirm(bid)
+        self._save_snapshot()
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "rows": self.rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_parsed": self.last_parsed,
+            "total_parsed": self.total_parsed,
+            "polls": self.polls,
+            "appends": self.appends,
+            "conflicts": self.conflicts,
+            "reloads": self.reloads,
+            "pending": len(self.pending),
+            "errors": len(self.errors),
+            "rejected": len(self.rejected),
+            "checkpoints": len(self.checkpoints.balance),
+            "checkpoint_mismatches": len(self.checkpoints.mismatches),
+            "restored": self.restored,
+        }
@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+# Fertige Ergebnisse (Figuren, Abrechnungen, Berichte), deren Schlüssel die
+# Ledger-Version enthält: neue Buchung = neue Version = neu bauen, alles
+# andere (weitere Zuschauer, Tab-Wechsel, Umschalten) ist ein Treffer. Alte
+# Versionen werden nie mehr getroffen und fallen als älteste hinten raus.
+
+
+class VersionedLRU:
+    # Begrenzt nach Anzahl (maxsize) und optional nach Größe (max_bytes, gemessen
+    # mit sizeof; der neueste Eintrag bleibt immer drin). Gebaut wird außerhalb
+    # des Locks, parallele Misses bauen also höchstens doppelt.
+
+    def __init__(self, maxsize=32, max_bytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+        value = build()
+        with self._lock:
+            self.misses += 1
+            self._items[key] = value
+            while len(self._items) > self.maxsize or self._too_big():
+                self._items.popitem(last=False)
+        return value
+
+    def _too_big(self):
+        return self.max_bytes is not None and len(self._items) > 1 and self.size() > self.max_bytes
+
+    def __len__(self):
+        return len(self._items)
+
+    def size(self):
+        return sum(self.sizeof(v) for v in list(self._items.values()))
+
+    def stats(self):
+        stats = {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+        if self.max_bytes is not None:
+            stats["bytes"] = self.size()
+        return stats
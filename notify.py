@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from timing import span
+
+NTFY_SERVER = "https://ntfy.sh"
+NTFY_URL = f"{NTFY_SERVER}/bj-boys-dashboard"
+
+
+class Notifier:
+    # Verschickt ntfy-Nachrichten im Hintergrund, damit eine langsame
+    # Gegenstelle keine Buchung mehr ausbremst. Nachrichten, die kurz
+    # hintereinander kommen, werden (pro Titel/Tags) zu einem Post gebündelt.
+
+    def __init__(self, url=NTFY_URL, maxsize=100, retries=3, backoff=0.5, batch_window=0.2, timeout=5,
+                 max_wait=30):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._run, name="ntfy-dispatcher", daemon=True)
+        self._thread.start()
+
+    def send(self, msg, title="", tags=""):
+        with self._lock:
+            try:
+                self._queue.put_nowait((msg, title, tags))
+                self.queued += 1
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+    def flush(self, timeout=10):
+        # Wartet, bis alles verschickt (oder endgültig fehlgeschlagen) ist
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < end:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stats(self):
+        return {"queued": self.queued, "sent": self.sent, "failed": self.failed,
+                "dropped": self.dropped, "pending": self._queue.qsize()}
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Burst abwarten und alles mitnehmen, was in der Zwischenzeit ankommt
+            end = time.monotonic() + self.batch_window
+            while True:
+                left = end - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for msg, title, tags in batch:
+                groups.setdefault((title, tags), []).append(msg)
+            for (title, tags), msgs in groups.items():
+                if self._post("\n".join(msgs), title, tags):
+                    self.sent += len(msgs)
+                else:
+                    self.failed += len(msgs)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _post(self, body, title, tags):
+        for attempt in range(self.retries):
+            wait = self.backoff * 2 ** attempt
+            try:
+                with span("ntfy.post"):
+                    r = self._session.post(self.url, data=body.encode('utf-8'),
+                                           headers={"Title": title.encode('utf-8'), "Tags": tags}, timeout=self.timeout)
+                if r.status_code == 429:
+                    # Rate-Limit: nochmal versuchen, so spät wie der Server es sagt
+                    wait = _retry_after(r.headers.get("Retry-After"), wait)
+                elif r.status_code < 500:
+                    return r.ok
+            except requests.RequestException:
+                pass
+            # Nach dem letzten Versuch nicht mehr warten
+            if attempt < self.retries - 1:
+                time.sleep(min(wait, self.max_wait))
+        return False
+
+
+def _retry_after(value, default):
+    # Retry-After kommt als Sekunden oder als HTTP-Datum
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,179 @@
+import html
+import io
+
+import numpy as np
+import pandas as pd
+
+from lru import VersionedLRU
+from timing import timed
+
+# Berichte zum Herunterladen, aufgebaut wie die Statistik-Seite: Summen aus
+# dem AggregateIndex, Buchungen aus dem kompakten Ledger.
+#
+#   "session"  Sessions von..bis: Spieler, Sessions mit Kassenstand, Buchungen
+#   "player"   ein Spieler: Gewinn pro Session (kumuliert), alle Buchungen
+#   "ledger"   alle Buchungen mit Kassenstand
+#
+# Geschrieben wird blockweise (CHUNK_ROWS Zeilen): pro Block entsteht nur ein
+# kleiner formatierter Frame, nie eine zweite Kopie des ganzen Ledgers.
+# HTML bringt ein Druck-Stylesheet mit, PDF = im Browser "Als PDF drucken".
+CHUNK_ROWS = 20_000
+KINDS = {"session": "Sessions", "player": "Spieler", "ledger": "Gesamter Ledger"}
+FORMATS = {"csv": "text/csv", "html": "text/html"}
+CENTS = np.array([f",{i:02d}" for i in range(100)], dtype=object)
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="de"><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: Inter, sans-serif; color: #0F172A; margin: 24px; }}
+h1 {{ font-size: 20px; }} h2 {{ font-size: 16px; margin-top: 24px; }}
+table {{ border-collapse: collapse; font-size: 12px; }}
+th, td {{ padding: 3px 8px; border-bottom: 1px solid #E2E8F0; text-align: left; }}
+td.n {{ text-align: right; font-family: 'JetBrains Mono', monospace; }}
+td.neg {{ color: #EF4444; }}
+thead {{ display: table-header-group; }}
+@media print {{ body {{ margin: 0; }} tr {{ page-break-inside: avoid; }} }}
+</style></head><body>
+<h1>{title}</h1>
+"""
+
+
+def _strftime(values, fmt):
+    # Nur die verschiedenen Werte formatieren (ein paar hundert Tage bzw. Uhrzeiten pro Block)
+    codes, uniques = pd.factorize(values)
+    return np.append(uniques.strftime(fmt).to_numpy(dtype=object), "")[codes]
+
+
+def booking_rows(part, balance_ct):
+    # Block des kompakten Ledgers -> Tabellenzeilen (Kassenstand in Cent übergeben)
+    ts = part["Full_Date"].dt.floor("min")
+    return pd.DataFrame({
+        "Datum": _strftime(ts.dt.normalize(), "%d.%m.%Y"),
+        "Zeit": _strftime(ts - ts.dt.normalize() + pd.Timestamp(0), "%H:%M"),
+        "Spieler": part["Name"].astype(object),
+        "Aktion": part["Aktion"].astype(object),
+        "Betrag": part["Betrag_ct"].to_numpy() / 100,
+        "Netto": part["Netto_ct"].to_numpy() / 100,
+        "Kassenstand": balance_ct / 100,
+    })
+
+
+def ledger_chunks(df, names=None, chunk=CHUNK_ROWS):
+    # Bestätigte Buchungen blockweise. Der Kassenstand läuft über alle Zeilen
+    # (wie in LedgerCache.scope); hat df schon eine Spalte "Balance" (Ausschnitt
+    # aus scope()), wird die übernommen. Offene Buchungen und andere Spieler
+    # fallen erst danach raus.
+    if "Balance" in df:
+        balance = (df["Balance"].to_numpy() * 100).round().astype("int64")
+    else:
+        balance = np.cumsum(df["Netto_ct"].to_numpy())
+    pending = df["Pending"].notna().to_numpy() if "Pending" in df else np.zeros(len(df), dtype=bool)
+    for i in range(0, len(df), chunk):
+        part = df.iloc[i:i + chunk]
+        keep = ~pending[i:i + chunk]
+        if names is not None:
+            keep &= part["Name"].isin(names).to_numpy()
+        if keep.any():
+            yield booking_rows(part[keep], balance[i:i + chunk][keep])
+
+
+def session_sections(index, df_s, session_from, session_to):
+    sp = index.session_players(session_from, session_to)
+    players = sp.groupby("Name", as_index=False)[["Buchungen", "Gewinn"]].sum().sort_values("Gewinn", ascending=False)
+    per = sp.groupby("Session_Date")["Buchungen"].sum()
+    kasse = index.session_balance().reindex(per.index)
+    sessions = pd.DataFrame({"Session": per.index.strftime("%d.%m.%Y"), "Buchungen": per.to_numpy(),
+                             "Kassenstand": kasse.to_numpy()})
+    return [("Spieler", iter([players.rename(columns={"Name": "Spieler"})])),
+            ("Sessions", iter([sessions])),
+            ("Buchungen", ledger_chunks(df_s))]
+
+
+def player_sections(index, df, name):
+    sp = index.session_players(players=[name]).sort_values("Session_Date")
+    sessions = pd.DataFrame({"Session": sp["Session_Date"].dt.strftime("%d.%m.%Y"), "Buchungen": sp["Buchungen"],
+                             "Gewinn": sp["Gewinn"], "Kumuliert": sp["Gewinn"].cumsum()})
+    return [("Sessions", iter([sessions])), ("Buchungen", ledger_chunks(df, names=[name]))]
+
+
+def _euro(col):
+    # Euro -> "1234,56" über ganze Cent; viel schneller als to_csv(decimal=",", float_format=...)
+    ct = (col.to_numpy() * 100).round().astype("int64")
+    a = np.abs(ct)
+    s = (a // 100).astype(str).astype(object) + CENTS[a % 100]
+    return np.where(ct < 0, "-" + s, s)
+
+
+def _td(col):
+    # Zellen einer Spalte; Beträge rechtsbündig, negative rot
+    if pd.api.types.is_float_dtype(col):
+        cls = np.where(col.to_numpy() < 0, "<td class='n neg'>", "<td class='n'>")
+        return (cls + _euro(col) + "</td>").tolist()
+    return [f"<td>{html.escape(str(v))}</td>" for v in col]
+
+
+def iter_html(title, sections):
+    yield HTML_HEAD.format(title=html.escape(title))
+    for name, chunks in sections:
+        yield f"<h2>{html.escape(name)}</h2>\n<table>\n"
+        header = True
+        for part in chunks:
+            if header:
+                yield "<thead><tr>" + "".join(f"<th>{html.escape(c)}</th>" for c in part.columns) + "</tr></thead>\n<tbody>\n"
+                header = False
+            yield "".join("<tr>" + "".join(r) + "</tr>\n" for r in zip(*(_td(part[c]) for c in part.columns)))
+        yield "</tbody></table>\n" if not header else "<tr><td>Keine Einträge</td></tr></table>\n"
+    yield "</body></html>\n"
+
+
+def iter_csv(title, sections):
+    # Deutsches Excel: Semikolon, Dezimalkomma; Abschnitte durch Leerzeile getrennt
+    yield f"{title}\n"
+    for name, chunks in sections:
+        yield f"\n{name}\n"
+        header = True
+        for part in chunks:
+            amounts = {c: _euro(part[c]) for c in part.columns if pd.api.types.is_float_dtype(part[c])}
+            yield part.assign(**amounts).to_csv(header=header, index=False, sep=";")
+            header = False
+
+
+class Reports:
+    # Fertige Berichte (Bytes) pro (Ledger-Version, Art, Parameter, Format).
+    # Der Download-Button ruft get() erst beim Klick auf; jeder weitere Klick
+    # und jeder weitere Zuschauer ist ein Treffer, bis eine neue Buchung kommt.
+    # Neben der Anzahl ist auch die Größe begrenzt (ganzer Ledger als HTML).
+
+    def __init__(self, title="", maxsize=16, max_bytes=64 * 2**20):
+        self.title = title
+        self.reports = VersionedLRU(maxsize, max_bytes)
+
+    def get(self, cache, kind, fmt, **params):
+        # Erst die Version, dann der Ledger: der Bericht ist nie älter als sein Schlüssel
+        key = (cache.version, kind, fmt, tuple(sorted((k, str(v)) for k, v in params.items())))
+        return self.reports.get(key, lambda: self.build(cache, kind, fmt, **params))
+
+    @timed("report.build")
+    def build(self, cache, kind, fmt, **params):
+        if kind == "session":
+            s_from, s_to = pd.Timestamp(params["session_from"]), pd.Timestamp(params["session_to"])
+            title = f"Sessions {s_from:%d.%m.%Y} – {s_to:%d.%m.%Y}"
+            sections = session_sections(cache.index, cache.scope(session_from=s_from, session_to=s_to), s_from, s_to)
+        elif kind == "player":
+            title = f"Spieler {params['name']}"
+            sections = player_sections(cache.index, cache.df, params["name"])
+        else:
+            title = "Alle Buchungen"
+            sections = [("Buchungen", ledger_chunks(cache.df))]
+        title = f"{self.title} – {title}" if self.title else title
+        render = iter_csv if fmt == "csv" else iter_html
+        # utf-8-sig, damit Excel die Umlaute erkennt. BytesIO gibt seinen Puffer
+        # am Ende ohne Kopie heraus, es liegt also nur der fertige Bericht im Speicher.
+        out = io.BytesIO()
+        out.write(("\ufeff" if fmt == "csv" else "").encode())
+        for part in render(title, sections):
+            out.write(part.encode("utf-8"))
+        return out.getvalue()
+
+    def stats(self):
+        return self.reports.stats()
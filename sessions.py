@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+# Eine Session läuft von 6 Uhr morgens bis 6 Uhr am nächsten Morgen.
+# Session-ID = Datum (00:00) des Abends, an dem die Session begonnen hat.
+SESSION_CUTOFF = pd.Timedelta(hours=6)
+# Buchungen werden in Berliner Zeit gestempelt (siehe make_entry), also auch
+# "jetzt" in Berliner Zeit rechnen, egal in welcher Zone der Server läuft
+TZ = pytz.timezone('Europe/Berlin')
+
+
+def session_dates(full_date):
+    # Vektorisiert: alles vor 6 Uhr gehört zum Vortag. NaT bleibt NaT.
+    return (pd.to_datetime(full_date, errors='coerce') - SESSION_CUTOFF).dt.normalize()
+
+
+def session_of(dt):
+    return (pd.Timestamp(dt) - SESSION_CUTOFF).normalize()
+
+
+def berlin_now():
+    # Naiv wie die Zeitstempel im Ledger
+    return datetime.now(TZ).replace(tzinfo=None)
+
+
+def current_session(now=None):
+    return session_of(now or berlin_now())
+
+
+def with_current(session_col, now=None):
+    # Zeilen ohne gültiges Datum zählen (wie bisher) zur aktuellen Session
+    return session_col.fillna(current_session(now))
@@ -0,0 +1,106 @@
+import heapq
+
+import pandas as pd
+
+from epc import epc_payload
+from lru import VersionedLRU
+from timing import timed
+
+# Abrechnung über einen Session-Bereich: wer überweist wem wie viel.
+# Gerechnet wird in ganzen Cent. Jeder Spieler hat einen offenen Saldo
+# (Gewinn > 0 = bekommt Geld, < 0 = schuldet), die Bank hält die Gegenseite.
+#
+#   "bank"    jeder Schuldner zahlt an die Bank, die Bank zahlt jeden Gewinner aus
+#             (ein Konto, einfach nachzuvollziehen, bis zu n Überweisungen)
+#   "direkt"  minimale Cash-Flows: Schuldner zahlen direkt an Gewinner, die Bank
+#             ist nur ein weiterer Teilnehmer (höchstens n-1 Überweisungen)
+BANK = "Bank"
+MODES = {"bank": "Über die Bank", "direkt": "Direkt (wenigste Überweisungen)"}
+TRANSFER_COLS = ["Von", "An", "Betrag_ct"]
+
+
+def balances(profit):
+    # Gewinn pro Spieler (Euro, siehe AggregateIndex.player_profit) -> Saldo in Cent inkl. Bank
+    ct = (profit * 100).round().astype("int64")
+    ct = ct[ct != 0]
+    bank = -int(ct.sum())
+    if bank:
+        ct = pd.concat([ct, pd.Series({BANK: bank}, dtype="int64")])
+    return ct
+
+
+def via_bank(saldo):
+    rows = [(name, BANK, -ct) for name, ct in saldo.items() if name != BANK and ct < 0]
+    rows += [(BANK, name, ct) for name, ct in saldo.items() if name != BANK and ct > 0]
+    return rows
+
+
+def min_cash_flow(saldo):
+    # Gleiche Beträge zuerst paarweise (eine Überweisung erledigt zwei Salden),
+    # dann greedy: größter Schuldner an größten Gläubiger. Exakt minimal ist
+    # NP-schwer (Subset-Sum), greedy bleibt bei höchstens n-1 Überweisungen.
+    rows = []
+    debt = {}
+    for name, ct in saldo.items():
+        if ct < 0:
+            debt.setdefault(-ct, []).append(name)
+    creditors = []
+    for name, ct in saldo.items():
+        if ct > 0:
+            if debt.get(ct):
+                rows.append((debt[ct].pop(), name, ct))
+            else:
+                creditors.append((-ct, name))
+    debtors = [(-ct, name) for ct, names in debt.items() for name in names]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    while debtors and creditors:
+        d, dn = heapq.heappop(debtors)
+        c, cn = heapq.heappop(creditors)
+        amount = min(-d, -c)
+        rows.append((dn, cn, amount))
+        if -d > amount:
+            heapq.heappush(debtors, (d + amount, dn))
+        if -c > amount:
+            heapq.heappush(creditors, (c + amount, cn))
+    return rows
+
+
+@timed("settlement.settle")
+def settle(profit, mode="bank"):
+    saldo = balances(profit)
+    rows = via_bank(saldo) if mode == "bank" else min_cash_flow(saldo)
+    out = pd.DataFrame(rows, columns=TRANSFER_COLS).astype({"Betrag_ct": "int64"})
+    return out.sort_values(["Von", "Betrag_ct"], ascending=[True, False], ignore_index=True)
+
+
+def with_payloads(transfers, accounts, purpose="BJ"):
+    # EPC-Payload pro Überweisung; ohne IBAN des Empfängers None (bar zahlen)
+    def payload(row):
+        acc = accounts.get(row["An"])
+        if not acc or not acc.get("iban"):
+            return None
+        return epc_payload(acc.get("owner", row["An"]), acc["iban"], row["Betrag_ct"] / 100, f"{purpose} {row['Von']}")
+    return transfers.assign(Betrag=transfers["Betrag_ct"] / 100,
+                            EPC=pd.Series([payload(r) for r in transfers.to_dict("records")], index=transfers.index, dtype=object))
+
+
+class Settlements:
+    # Fertige Abrechnungen pro (Ledger-Version, Session-Bereich, Modus).
+    # Neue Buchung = neue Version; Umschalten von Bereich/Modus und jeder
+    # weitere Zuschauer sind Treffer.
+
+    def __init__(self, maxsize=32):
+        self.results = VersionedLRU(maxsize)
+
+    def get(self, index, version, session_from, session_to, mode, players, accounts, purpose="BJ"):
+        key = (version, pd.Timestamp(session_from), pd.Timestamp(session_to), mode, tuple(players),
+               tuple(sorted((k, v.get("iban", ""), v.get("owner", "")) for k, v in accounts.items())))
+
+        def build():
+            profit = index.player_profit(include_bank=True, session_from=session_from, session_to=session_to, players=players)
+            return with_payloads(settle(profit, mode), accounts, purpose)
+        return self.results.get(key, build)
+
+    def stats(self):
+        return self.results.stats()
@@ -0,0 +1,76 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from timing import timed
+
+# Lokaler Spiegel des geparsten Ledgers für den Kaltstart. Zwei Arrow-IPC-
+# Dateien (unkomprimiert, werden beim Lesen gemappt statt geparst):
+#
+#   ledger.arrow   bestätigte Zeilen im kompakten Format (siehe ledger.py)
+#   index.arrow    Zellen des AggregateIndex
+#
+# Im Schema von ledger.arrow steht der Quell-Stempel: Anzahl Rohzeilen im
+# Store und die letzte Rohzeile. Beim Start wird ab dieser Zeile gelesen;
+# stimmt sie noch, wird nur der Tail dahinter geparst, sonst alles neu.
+FORMAT = 1
+
+
+def raw_key(row):
+    # Vergleichbare Form einer Rohzeile (Sheet liefert Strings, CSV auch NaN)
+    return ["" if pd.isna(v) else str(v) for v in row]
+
+
+class LedgerSnapshot:
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.saves = 0
+        self.loads = 0
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    @timed("snapshot.load")
+    def load(self, source):
+        # -> (df, cells, meta) oder None, wenn es keinen passenden Spiegel gibt
+        try:
+            ledger = pa.ipc.open_file(pa.memory_map(self._path("ledger.arrow"))).read_all()
+            index = pa.ipc.open_file(pa.memory_map(self._path("index.arrow"))).read_all()
+        except (OSError, pa.ArrowInvalid):
+            return None
+        meta = json.loads(ledger.schema.metadata[b"bj"])
+        token = json.loads(index.schema.metadata[b"bj"])["token"]
+        # Halb geschriebener Spiegel oder anderes Backend/Format: ignorieren
+        if meta["format"] != FORMAT or meta["source"] != source or token != meta["token"]:
+            return None
+        self.loads += 1
+        rejected = pd.DataFrame(meta["rejected"])
+        return ledger.to_pandas(), index.to_pandas(), dict(meta, rejected=rejected)
+
+    @timed("snapshot.save")
+    def save(self, df, cells, rows, last_raw, rejected, source, balance_ct):
+        os.makedirs(self.folder, exist_ok=True)
+        token = uuid.uuid4().hex
+        meta = {"format": FORMAT, "source": source, "token": token, "rows": rows, "last": last_raw,
+                "balance_ct": balance_ct, "rejected": json.loads(rejected.to_json(orient="records", date_format="iso"))}
+        # Erst der Index, dann der Ledger: load() akzeptiert nur Paare mit gleichem Token
+        self._write("index.arrow", cells, {"token": token})
+        self._write("ledger.arrow", df, meta)
+        self.saves += 1
+
+    def _write(self, name, df, meta):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"bj": json.dumps(meta).encode()})
+        tmp = self._path(name + ".tmp")
+        feather.write_feather(table, tmp, compression="uncompressed")
+        os.replace(tmp, self._path(name))
+
+    def clear(self):
+        for name in ("ledger.arrow", "index.arrow"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
@@ -0,0 +1,53 @@
+import os
+
+from notify import NTFY_SERVER
+
+# Ein Deployment, mehrere Tische. Jeder Tisch hat eigenes Sheet (bzw.
+# eigenes SQLite/Journal), eigene Spieler und ein eigenes ntfy-Topic:
+#
+#   [tables.boys]
+#   name = "BJ Boys"
+#   worksheet = "Buchungen"
+#   players = ["Tobi", "Alex"]
+#   ntfy_topic = "bj-boys-dashboard"
+#   backend = "sqlite"            # optional, sonst nur das Sheet
+#   connection = "gsheets"        # optional, andere Spreadsheet-Verbindung
+#   poll_interval = 5             # Sekunden zwischen zwei Reads im Hintergrund
+#   bank = { iban = "DE...", owner = "Casino" }   # optional, sonst [bank]
+#   ibans = { Tobi = "DE..." }    # optional, sonst [ibans]; für Auszahlungen im Kassensturz
+#
+# Ohne [tables] gibt es genau einen Tisch mit den bisherigen Werten.
+DEFAULT_TABLE = "default"
+DEFAULT_PLAYERS = ["Tobi", "Alex", "Dani", "Fabi", "Schirgi", "Lüxn", "Domi"]
+DEFAULT_WORKSHEET = "Buchungen"
+DEFAULT_TOPIC = "bj-boys-dashboard"
+DEFAULT_POLL_INTERVAL = 5
+
+
+def load_tables(secrets, ledger_dir):
+    legacy = dict(secrets.get("ledger", {}))
+    bank = dict(secrets.get("bank", {}))
+    ibans = dict(secrets.get("ibans", {}))
+    configured = dict(secrets.get("tables", {}))
+    tables = {}
+    for tid, cfg in (configured or {DEFAULT_TABLE: legacy}).items():
+        cfg = dict(cfg)
+        # Der Standard-Tisch behält .ledger/ direkt, damit Journal und SQLite erhalten bleiben
+        folder = os.path.join(ledger_dir, tid) if configured else ledger_dir
+        tables[tid] = {
+            "id": tid,
+            "name": cfg.get("name", tid),
+            "connection": cfg.get("connection", "gsheets"),
+            "worksheet": cfg.get("worksheet", DEFAULT_WORKSHEET),
+            "players": sorted(cfg.get("players", DEFAULT_PLAYERS)),
+            "ntfy_url": f"{NTFY_SERVER}/{cfg.get('ntfy_topic', DEFAULT_TOPIC)}",
+            "backend": cfg.get("backend", "sheets"),
+            "poll_interval": float(cfg.get("poll_interval", DEFAULT_POLL_INTERVAL)),
+            "sqlite_path": cfg.get("path", os.path.join(folder, "buchungen.db")),
+            "journal_path": os.path.join(folder, "journal.jsonl"),
+            "checkpoints_path": os.path.join(folder, "checkpoints.json"),
+            "snapshot_path": os.path.join(folder, "snapshot"),
+            "bank": {**bank, **dict(cfg.get("bank", {}))},
+            "ibans": {**ibans, **dict(cfg.get("ibans", {}))},
+        }
+    return tables
@@ -0,0 +1,66 @@
+import re
+
+import cv2
+import numpy as np
+import pytest
+
+from epc import _render, epc_payload, epc_qr, payload_qr
+
+# Erzeugte QR-Codes zurück lesen: der Payload muss exakt wieder herauskommen
+CASES = [
+    (("Casino Bank", "DE89 3704 0044 0532 0130 00", 42.5, "BJ Lüxn"), "EUR42.50"),
+    (("Jörg Müßig", "DE02120300000000202051", 0.1 + 0.2, "BJ Schirgi → Bank"), "EUR0.30"),
+    (("Bank", "DE02 1203 0000 0000 2020 51", 19.999, "BJ Tobi"), "EUR20.00"),
+    (("Ärzte & Söhne", "DE89370400440532013000", 1234.004, "Kassensturz 24.12."), "EUR1234.00"),
+]
+
+
+def decode(img):
+    # Mit Rand hochskaliert, damit der Detektor die Finder-Muster sicher findet
+    img = np.pad(img, 40, constant_values=255)
+    data, _, _ = cv2.QRCodeDetector().detectAndDecode(img)
+    return data
+
+
+def decode_png(png):
+    return decode(cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE))
+
+
+def decode_svg(svg):
+    # segno zeichnet die Module als Pfad aus horizontalen Linien (M/m/h, Mitte der Zeile)
+    text = svg.decode()
+    size = int(re.search(r'width="(\d+)"', text).group(1))
+    scale = re.search(r'scale\((\d+)\)', text)
+    size //= int(scale.group(1)) if scale else 1
+    img = np.full((size, size), 255, np.uint8)
+    x = y = 0.0
+    for cmd, a, b in re.findall(r"([Mmh])(-?[\d.]+)(?:\s(-?[\d.]+))?", re.search(r' d="([^"]+)"', text).group(1)):
+        if cmd == "M":
+            x, y = float(a), float(b)
+        elif cmd == "m":
+            x, y = x + float(a), y + float(b)
+        else:
+            img[int(y), int(x):int(x + float(a))] = 0
+            x += float(a)
+    return decode(np.kron(img, np.ones((8, 8), np.uint8)))
+
+
+@pytest.mark.parametrize("args, amount", CASES)
+def test_png_roundtrip(args, amount):
+    payload = epc_payload(*args[:2], round(float(args[2]), 2), args[3])
+    assert payload.split("\n")[7] == amount
+    assert decode_png(epc_qr(*args)) == payload
+
+
+@pytest.mark.parametrize("args, amount", CASES)
+def test_svg_roundtrip(args, amount):
+    payload = epc_payload(*args[:2], round(float(args[2]), 2), args[3])
+    assert decode_svg(epc_qr(*args, kind="svg")) == payload
+    assert decode_svg(payload_qr(payload, kind="svg")) == payload
+
+
+def test_cache_hit():
+    _render.cache_clear()
+    epc_qr(*CASES[0][0])
+    epc_qr(*CASES[0][0])
+    assert _render.cache_info().hits == 1
@@ -0,0 +1,313 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import BOOKING_TYPES, CsvStore, LedgerCache, SqliteStore, calc_netto, calc_netto_vec, make_entry
+from sessions import current_session
+
+# Invarianten des Ledgers bei kleinen Größen; Laufzeiten misst bench.py
+
+
+def entries(now, n=12):
+    spec = [("Tobi", "Einzahlung", 50.0), ("Alex", "Auszahlung", 20.0), ("Dani", "Bank Einnahme", 5.0),
+            ("Tobi", "Auszahlung", 80.0)]
+    return [make_entry(*spec[i % len(spec)], now - timedelta(hours=10 * i)) for i in range(n)]
+
+
+class OfflineStore(SqliteStore):
+    # Nimmt nichts an: Buchungen bleiben offen
+    def append(self, rows, expected=None):
+        raise OSError("offline")
+
+
+class TimeoutStore(SqliteStore):
+    # Schreibt, meldet aber einen Timeout (Antwort ging verloren)
+    def append(self, rows, expected=None):
+        super().append(rows, expected)
+        raise TimeoutError("timeout")
+
+
+@pytest.fixture
+def undated():
+    # Aktuelle Session enthält nur die undatierte Zeile
+    rows = entries(datetime.now() - timedelta(days=1))
+    rows.append(dict(make_entry("Fabi", "Einzahlung", 7.0, datetime.now()), Datum=None, Zeit=None))
+    return rows
+
+
+def scopes():
+    s = current_session()
+    return [{}, dict(session_from=s, session_to=s), dict(session_from=s - timedelta(days=3), session_to=s),
+            dict(day_from=s - timedelta(days=2), day_to=s)]
+
+
+def test_scope_pushdown_matches_memory(tmp_path, undated):
+    mem = CsvStore(str(tmp_path / "b.csv"))
+    mem.append(undated)
+    sql = SqliteStore(str(tmp_path / "b.db"))
+    sql.append(undated)
+    a, b = LedgerCache(mem), LedgerCache(sql)
+    a.get(), b.get()
+    for f in scopes():
+        ra, rb = a.scope(**f), b.scope(**f)
+        assert ra["Balance"].tolist() == rb["Balance"].tolist(), f
+
+
+def test_scope_pushdown_includes_pending(tmp_path, undated):
+    sql = OfflineStore(str(tmp_path / "b.db"))
+    SqliteStore.append(sql, undated)
+    cache = LedgerCache(sql)
+    cache.get()
+    cache.book([make_entry("Alex", "Einzahlung", 30.0, datetime.now())])
+    full = cache.scope()
+    assert len(full) == len(undated) + 1
+    assert full["Balance"].iloc[-1] == cache.index.balance
+
+
+def test_close_stops_threads(tmp_path):
+    cache = LedgerCache(CsvStore(str(tmp_path / "b.csv")), poll_interval=0.05)
+    cache.close()
+    assert not any(t.is_alive() for t in cache._threads)
+
+
+def test_calc_netto_vec_matches_rowwise():
+    # Vektorisierte Vorzeichen müssen zeilenweise calc_netto entsprechen, auch
+    # bei Groß/Klein, fehlenden Aktionen, 0, -0.0 und negativen Beträgen
+    rng = np.random.default_rng(3)
+    aktionen = BOOKING_TYPES + ["auszahlung", "BANK AUSGABE", "Korrektur", "", None, np.nan]
+    for n in (1, 7, 60, 500):
+        df = pd.DataFrame({
+            "Aktion": [aktionen[i] for i in rng.integers(0, len(aktionen), n)],
+            "Betrag": rng.choice([0.0, -0.0, -5.0, 0.01, 12.5, 1e6], n) * rng.integers(1, 4, n),
+        })
+        for aktion in (df["Aktion"], df["Aktion"].astype("category")):
+            part = df.assign(Aktion=aktion)
+            ref = part.apply(calc_netto, axis=1).to_numpy(dtype=float)
+            got = calc_netto_vec(part)
+            assert np.array_equal(ref, got) and np.array_equal(np.signbit(ref), np.signbit(got))
+
+
+def recompute(cache):
+    # Checkpoints aus dem kompletten Ledger, ohne AggregateIndex
+    df = cache.df[cache.df["Session_Date"].notna()]
+    balance = df.groupby("Session_Date")["Netto_ct"].sum().sort_index().cumsum()
+    players = df.groupby(["Session_Date", "Name"], observed=True)["Netto_ct"].sum().unstack(fill_value=0)
+    return balance, players.reindex(balance.index, fill_value=0).cumsum()
+
+
+@pytest.mark.parametrize("names", [["Tobi", "", "Alex"], [""]])
+def test_checkpoints_match_recompute(tmp_path, names):
+    # Eine abgeschlossene Session ganz ohne Spieler (leere Spalte im Sheet) darf
+    # weder die Checkpoints noch den Spiegel lahmlegen
+    from checkpoints import Checkpoints
+    from snapshot import LedgerSnapshot
+    store = CsvStore(str(tmp_path / "b.csv"))
+    now = datetime.now()
+    store.append([make_entry(names[(i // 3) % len(names)], "Einzahlung", 10.0 + i, now - timedelta(days=i // 3 + 1))
+                  for i in range(12)])
+    cache = LedgerCache(store, checkpoints=Checkpoints(str(tmp_path / "cp.json")),
+                        snapshot=LedgerSnapshot(str(tmp_path / "snapshot")), snapshot_interval=0)
+    cache.get()
+    cp = cache.checkpoints
+    cp.update(cache.index, cache.version)
+    balance, players = recompute(cache)
+    assert cp.balance.tolist() == balance.tolist()
+    assert cp.players.reindex(columns=players.columns).equals(players.astype("int64"))
+    assert cp.verify() and os.path.exists(cp.path)
+    assert cache.snapshot.saves == 1
+
+
+def test_csv_count_follows_edits(tmp_path):
+    # Der inkrementelle Zähler muss Anhängen, Löschen und Ersetzen erkennen
+    store = CsvStore(str(tmp_path / "b.csv"))
+    assert store.count() == 0
+    store.append(entries(datetime.now()))
+    assert store.count() == 12
+    store.append(entries(datetime.now(), 3), expected=12)
+    assert store.count() == 15
+    delete_rows_csv(store, 5)
+    assert store.count() == 10
+    with open(store.path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(store.path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:3] + [lines[3].replace("Tobi", "Tobias")] + lines[4:] * 2)
+    assert store.count() == len(CsvStore(store.path).read()) == 17
+    os.replace(str(tmp_path / "b.csv"), str(tmp_path / "alt.csv"))
+    store.append(entries(datetime.now(), 2))
+    assert store.count() == 2
+
+
+def delete_rows_csv(store, n):
+    with open(store.path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(store.path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:1] + lines[1 + n:])
+
+
+def delete_rows_sheet(conn, n):
+    del conn.ws.values[:n]
+
+
+def test_sheet_append_follows_header():
+    # Altes Sheet: eigene Reihenfolge, Zusatzspalte "Notiz", noch keine "ID"
+    from bench import FakeSheetsConnection
+    from ledger import GSheetsStore
+    raw = pd.DataFrame(entries(datetime.now(), 4)).drop(columns="ID", errors="ignore").assign(Notiz="alt")
+    conn = FakeSheetsConnection(raw[["Spieler", "Notiz", "Datum", "Zeit", "Typ", "Betrag"]], latency=0, per_row=0)
+    cache = LedgerCache(GSheetsStore(conn))
+    cache.get()
+    booked = [cache.book([make_entry("Alex", "Auszahlung", 30.0, datetime.now())]) for _ in range(2)]
+    assert all(f.result(timeout=5) for _, f in booked)
+    cache.close()
+    sheet = conn.read()
+    assert conn.ws.header == ["Spieler", "Notiz", "Datum", "Zeit", "Typ", "Betrag", "ID"]
+    assert sheet["ID"].dropna().tolist() == [f"{bid}-0" for bid, _ in booked]
+    new = sheet.iloc[4:]
+    assert new["Spieler"].tolist() == ["Alex"] * 2 and new["Typ"].tolist() == ["Auszahlung"] * 2
+    assert new["Notiz"].isna().all() and conn.ws.calls["update_cell"] == 1
+    assert len(cache.df) == 6 and not cache.pending
+
+
+@pytest.mark.parametrize("kind", ["csv", "sheet"])
+def test_book_after_deletion(tmp_path, kind):
+    # Im Sheet wurden Zeilen von Hand gelöscht, dann wird gebucht: die Buchung
+    # muss genau einmal im Store landen und erst danach als bestätigt gelten
+    from bench import FakeSheetsConnection, dirty_raw
+    from ledger import GSheetsStore
+    if kind == "csv":
+        store = CsvStore(str(tmp_path / "b.csv"))
+        store.append(entries(datetime.now()))
+        delete, read = (lambda n: delete_rows_csv(store, n)), store.read
+    else:
+        conn = FakeSheetsConnection(dirty_raw(12, rate=0, blank=""), latency=0, per_row=0)
+        store = GSheetsStore(conn)
+        delete, read = (lambda n: delete_rows_sheet(conn, n)), conn.read
+    cache = LedgerCache(store)
+    cache.get()
+    delete(3)
+    bid, future = cache.book([make_entry("Alex", "Einzahlung", 30.0, datetime.now())])
+    assert future.result(timeout=5)
+    cache.close()
+    ids = read()["ID"].tolist()
+    assert ids.count(f"{bid}-0") == 1
+    assert not cache.pending and len(cache.df) == len(ids) == 10
+    fresh = LedgerCache(store)
+    fresh.get()
+    fresh.close()
+    assert cache.index.balance_ct == fresh.index.balance_ct
+
+
+@pytest.mark.parametrize("kind", ["csv", "sqlite"])
+def test_parallel_writers(tmp_path, kind):
+    # Wie bench_writers, nur klein: 3 Caches (eigene Store-Objekte) × 3 Threads.
+    # Keine Buchung darf fehlen oder doppelt sein, alle sehen denselben Kassenstand.
+    path = str(tmp_path / ("b.csv" if kind == "csv" else "b.db"))
+    make = (lambda: CsvStore(path)) if kind == "csv" else (lambda: SqliteStore(path))
+    make().append(entries(datetime.now(), 4))
+    caches = [LedgerCache(make(), max_age=0, backoff=0.001, max_retries=50) for _ in range(3)]
+    for c in caches:
+        c.get()
+    futures = []
+
+    def writer(cache, t):
+        for i in range(3):
+            futures.append(cache.book([make_entry("Alex", "Einzahlung", 1.0 + t, datetime.now())]))
+
+    workers = [threading.Thread(target=writer, args=(c, t)) for c in caches for t in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert all(f.result(timeout=10) for _, f in futures)
+    for c in caches:
+        c.close()
+        c.get()
+    ids = make().read()["ID"].dropna().tolist()
+    assert sorted(ids) == sorted(f"{bid}-0" for bid, _ in futures)
+    assert len({c.index.balance_ct for c in caches}) == 1
+    assert all(len(c.df) == 4 + len(futures) and not c.pending for c in caches)
+
+
+
+@pytest.mark.parametrize("store_cls, discarded", [(TimeoutStore, False), (OfflineStore, True)])
+def test_discard_checks_store(tmp_path, store_cls, discarded):
+    # Verwerfen nach einem Fehler: steht die Buchung doch im Store, gilt sie als gebucht
+    store = store_cls(str(tmp_path / "b.db"))
+    SqliteStore.append(store, entries(datetime.now(), 4))
+    cache = LedgerCache(store)
+    cache.get()
+    cache.close()
+    balance = cache.index.balance_ct
+    bid, future = cache.book([make_entry("Alex", "Einzahlung", 30.0, datetime.now())])
+    assert not cache.flush() and bid in cache.errors
+    assert cache.discard(bid) is discarded
+    assert future.result(timeout=1) is not discarded
+    assert not cache.pending and not cache.errors
+    assert cache.index.balance_ct == balance + (0 if discarded else 3000)
+    assert len(store.read()) == (4 if discarded else 5)
+
+
+class FlakyStore(CsvStore):
+    # Spiegel, der die nächsten `fail` Appends ablehnt; after_write: erst schreiben, dann Fehler
+    fail, after_write = 0, False
+
+    def append(self, rows, expected=None):
+        if self.fail and not self.after_write:
+            self.fail -= 1
+            raise OSError("Sheet nicht erreichbar")
+        super().append(rows, expected)
+        if self.fail:
+            self.fail -= 1
+            raise TimeoutError("timeout")
+
+
+def test_mirror_catches_up(tmp_path):
+    from ledger import MirrorStore
+    mirror = FlakyStore(str(tmp_path / "sheet.csv"))
+    mirror.append(entries(datetime.now(), 4))
+    primary = SqliteStore(str(tmp_path / "b.db"))
+    store = MirrorStore(primary, mirror, retry_interval=0).bootstrap()
+    assert primary.count() == 4
+    booking = lambda i: [dict(make_entry("Alex", "Einzahlung", 5.0, datetime.now()), ID=f"b{i}-0")]
+    mirror.fail = 1
+    store.append(booking(1))
+    assert store.stats()["backlog"] == 1 and store.stats()["mirror_errors"] == 1
+    mirror.fail, mirror.after_write = 1, True
+    store.append(booking(2))
+    assert store.stats()["behind"] and store.stats()["mirror_errors"] == 2
+    assert store.sync() and not store.stats()["behind"]
+    assert mirror.read()["ID"].dropna().tolist() == ["b1-0", "b2-0"]
+    # Neustart: was nur im primären Backend steht, reicht bootstrap() nach
+    primary.append(booking(3))
+    MirrorStore(primary, mirror).bootstrap()
+    assert mirror.read()["ID"].dropna().tolist() == ["b1-0", "b2-0", "b3-0"]
+
+
+def test_index_matches_rebuild(tmp_path):
+    # Bestätigen (in place), Verwerfen und fremde Zeilen: der fortgeschriebene
+    # Index muss dem aus dem kompletten Ledger neu aufgebauten entsprechen
+    from aggregates import AggregateIndex
+    store = SqliteStore(str(tmp_path / "b.db"))
+    store.append(entries(datetime.now(), 100))
+    cache = LedgerCache(store)
+    cache.get()
+    cache.close()
+    for i in range(5):
+        cache.book([make_entry("Alex", "Auszahlung", 12.34 + i, datetime.now()), make_entry("Dani", "Bank Ausgabe", 1.0, datetime.now())])
+        cache.flush()
+    store.append(entries(datetime.now(), 3))
+    bid, _ = cache.book([make_entry("Tobi", "Einzahlung", 99.0, datetime.now())])
+    cache.discard(bid)
+    cache.invalidate()
+    cache.get()
+    fresh = AggregateIndex()
+    fresh.update(cache.df)
+    key = ["Name", "Session_Date", "Day", "Bank"]
+    assert cache.df["Pending"].isna().all() and len(cache.df) == 113
+    assert cache.index.balance_ct == fresh.balance_ct and cache.index.rows == fresh.rows
+    pd.testing.assert_frame_equal(cache.index.cells.sort_values(key).reset_index(drop=True),
+                                  fresh.cells.sort_values(key).reset_index(drop=True))
@@ -0,0 +1,21 @@
+from lru import VersionedLRU
+
+
+def test_hits_and_eviction():
+    lru = VersionedLRU(maxsize=2)
+    built = []
+    build = lambda key: lambda: built.append(key) or key
+    for key in [(1, "a"), (1, "a"), (1, "b"), (2, "a"), (1, "a")]:
+        assert lru.get(key, build(key)) == key
+    # (1, "a") fiel als ältester raus und wurde neu gebaut
+    assert built == [(1, "a"), (1, "b"), (2, "a"), (1, "a")]
+    assert lru.stats() == {"entries": 2, "hits": 1, "misses": 4}
+
+
+def test_max_bytes_keeps_newest():
+    lru = VersionedLRU(maxsize=10, max_bytes=10)
+    lru.get(1, lambda: b"x" * 6)
+    lru.get(2, lambda: b"x" * 6)
+    assert len(lru) == 1 and lru.get(2, lambda: None) == b"x" * 6
+    lru.get(3, lambda: b"x" * 20)
+    assert len(lru) == 1 and lru.stats()["bytes"] == 20
@@ -0,0 +1,151 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+# Profil-Modus: Umgebungsvariable BJ_PROFILE=1 (oder [diagnostics] profile = true)
+PROFILE_ENV = "BJ_PROFILE"
+
+
+class Timings:
+    # Server-Zeit pro Interaktion: ganzer Rerun ("Seite ...") oder einzelnes
+    # Fragment. Pro Name die letzten `maxlen` Messungen, prozessweit.
+    #
+    # Dazu Spans für die Stufen im Hot Path (store.read, parse, aggregate.*,
+    # chart.*, store.append, ntfy.post ...). Spans, die während eines Reruns
+    # im Script-Thread laufen, landen zusätzlich im Ringpuffer `runs`
+    # (letzte `max_runs` Reruns mit ihren Stufen).
+
+    def __init__(self, maxlen=200, max_runs=50):
+        self.maxlen = maxlen
+        self._runs = {}
+        self.runs = deque(maxlen=max_runs)
+        self.profiles = deque(maxlen=10)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._runs.setdefault(name, deque(maxlen=self.maxlen)).append(seconds)
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((name, seconds))
+
+    def begin_run(self):
+        self._local.spans = []
+
+    def end_run(self, label, seconds):
+        spans = getattr(self._local, "spans", None) or []
+        self._local.spans = None
+        self.record(label, seconds)
+        with self._lock:
+            self.runs.append({"label": label, "at": time.time(), "ms": seconds * 1e3,
+                              "spans": [(n, s * 1e3) for n, s in spans]})
+
+    def summary(self):
+        # {name: (Anzahl, Median ms, letzte ms)}
+        with self._lock:
+            runs = {k: list(v) for k, v in self._runs.items()}
+        return {k: (len(v), float(np.median(v)) * 1e3, v[-1] * 1e3) for k, v in runs.items()}
+
+    def percentiles(self):
+        # Eine Zeile pro Name mit p50/p95/max in ms
+        with self._lock:
+            runs = {k: np.array(v) * 1e3 for k, v in self._runs.items()}
+        rows = [(k, len(v), np.percentile(v, 50), np.percentile(v, 95), v.max()) for k, v in runs.items()]
+        return pd.DataFrame(rows, columns=["Name", "n", "p50 ms", "p95 ms", "max ms"]).sort_values("Name", ignore_index=True)
+
+    def reset(self):
+        with self._lock:
+            self._runs.clear()
+            self.runs.clear()
+
+
+TIMINGS = Timings()
+
+
+@contextmanager
+def span(name, timings=TIMINGS):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, time.perf_counter() - t0)
+
+
+def timed(name, timings=TIMINGS):
+    # Dekorator für Fragmente und Stufen: misst jeden Lauf der Funktion
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings.record(name, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+
+def profiling_enabled(secrets=None):
+    if os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return True
+    return bool(secrets and secrets.get("diagnostics", {}).get("profile", False))
+
+
+class RunProfiler:
+    # cProfile um einen ganzen Rerun. Die .prof-Datei landet in `folder`
+    # (z.B. für snakeviz), die Top 25 nach kumulierter Zeit als Text in
+    # timings.profiles für die Diagnose-Seite.
+
+    def __init__(self, folder, timings=TIMINGS):
+        self.folder = folder
+        self.timings = timings
+        self._prof = cProfile.Profile()
+
+    def start(self):
+        self._prof.enable()
+        return self
+
+    def stop(self, label):
+        self._prof.disable()
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, f"{time.strftime('%Y%m%d-%H%M%S')}-{label.replace(' ', '_')}.prof")
+        self._prof.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self._prof, stream=out).sort_stats("cumulative").print_stats(25)
+        self.timings.profiles.append({"label": label, "path": path, "text": out.getvalue()})
+        return path
+
+
+class PageRun:
+    # Ein Rerun der ganzen Seite: Server-Zeit samt Stufen und optional cProfile
+    # (profile_folder). Als Kontextmanager, damit beides auch abgeschlossen
+    # wird, wenn der Lauf per st.rerun()/st.stop() oder mit einem Fehler endet.
+    # `label` setzt die Seite, sobald sie feststeht.
+
+    def __init__(self, profile_folder=None, timings=TIMINGS):
+        self.label = "Seite –"
+        self.timings = timings
+        self.profiler = RunProfiler(profile_folder, timings) if profile_folder else None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        self.timings.begin_run()
+        if self.profiler:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.end_run(self.label, time.perf_counter() - self._t0)
+        if self.profiler:
+            self.profiler.stop(self.label)
+        return False